@@ -1,3 +1,4 @@
+import secrets
 from typing import Annotated
 
 import jwt
@@ -20,6 +21,9 @@ reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.API_V1_STR}/login/access-token", auto_error=False
+)
 
 
 def get_current_user(session: SessionDep, token: TokenDep) -> User:
@@ -44,9 +48,45 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUserDep = Annotated[User, Depends(get_current_user)]
 
 
+def get_token_user(session: Session, token: str) -> User | None:
+    """
+    校验访问令牌，返回其中的用户，用于无法使用依赖注入的WebSocket连接；
+    令牌无效、已过期或用户不存在、未启用时返回None
+    """
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        )
+        token_data = TokenPayload(**payload)
+    except (InvalidTokenError, ValidationError):
+        return None
+    user = session.get(User, token_data.sub)
+    if not user or not user.is_active:
+        return None
+    return user
+
+
 def get_current_active_superuser(current_user: CurrentUserDep) -> User:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+def require_metrics_access(
+    session: SessionDep,
+    token: Annotated[str | None, Depends(optional_oauth2)],
+) -> None:
+    """/metrics 的访问控制：令牌与 METRICS_TOKEN 一致，或为超级用户的访问令牌"""
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if settings.METRICS_TOKEN and secrets.compare_digest(
+        token.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        return
+    get_current_active_superuser(get_current_user(session, token))
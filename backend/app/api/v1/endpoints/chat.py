@@ -3,14 +3,20 @@
 处理用户与Agent的实时对话交互
 """
 
+import math
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from pydantic import BaseModel
 from sqlmodel import Session
 
-from app.api.v1.dependencies import get_current_user, SessionDep
+from app.api.v1.dependencies import (
+    get_current_active_superuser,
+    get_current_user,
+    SessionDep,
+)
+from app.core.metrics import chat_stage_seconds, chat_turns_total
 from app.db.repository import (
     create_conversation,
     create_message,
@@ -18,10 +24,18 @@ from app.db.repository import (
     get_conversation_by_id,
     get_model_by_id,
     get_messages_by_conversation,
+    hard_delete_message,
 )
-from app.models import User
+from app.models import Agent, Conversation, User
 from app.schemas import ConversationCreate, MessageCreate
+from app.services.admission import (
+    AdmissionRejectedError,
+    admission_controller,
+    admission_weight,
+    resolve_provider,
+)
 from app.services.agent_service import agent_dialogue_service
+from app.services.cancellation import DEADLINE_EXCEEDED, CancelToken, resolve_deadline
 
 router = APIRouter()
 
@@ -46,6 +60,8 @@ class ChatResponse(BaseModel):
     events_summary: dict | None = None
     session_id: str | None = None
     autoagent_info: dict | None = None
+    # 超过时限时为True，response为已产生的部分回复
+    deadline_exceeded: bool = False
 
 
 @router.post("/", response_model=ChatResponse)
@@ -54,8 +70,17 @@ async def chat_with_agent(
     session: Annotated[Session, Depends(SessionDep)],
     current_user: Annotated[User, Depends(get_current_user)],
     chat_request: ChatRequest,
+    x_request_deadline: Annotated[float | None, Header()] = None,
 ) -> ChatResponse:
-    """与Agent进行对话"""
+    """
+    与Agent进行对话
+
+    请求头 X-Request-Deadline 指定本次对话的时限（毫秒），未指定时使用服务端默认时限；
+    超过时限时返回已产生的部分回复。同一对话中发给同一Agent的进行中的相同消息只处理一次，
+    重复的请求直接返回首个请求的结果
+    """
+    # 时限从收到请求开始计算，包含排队时间
+    cancel_token = CancelToken(deadline=resolve_deadline(x_request_deadline))
 
     # 1. 验证Agent存在且为系统Agent
     agent = get_agent_by_id(session=session, agent_id=chat_request.agent_id)
@@ -67,43 +92,58 @@ async def chat_with_agent(
             status_code=status.HTTP_403_FORBIDDEN, detail="只能与系统Agent对话"
         )
 
-    # 2. 处理对话
-    conversation = None
-    if chat_request.conversation_id:
-        # 使用现有对话
-        conversation = get_conversation_by_id(
-            session=session, conversation_id=chat_request.conversation_id
+    # 2. 处理对话，新对话在通过准入控制后才创建
+    if not chat_request.conversation_id:
+        # 新建的对话不会有重复提交
+        return await _run_chat_turn(
+            session, current_user, chat_request, agent, None, cancel_token
         )
-        if not conversation:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="对话不存在"
-            )
 
-        if conversation.user_id != current_user.user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail="无权访问此对话"
-            )
-    else:
-        # 创建新对话
-        conversation_create = ConversationCreate(title="新对话")
-        conversation = create_conversation(
-            session=session,
-            conversation_create=conversation_create,
-            user_id=current_user.user_id,
+    # 使用现有对话
+    conversation = get_conversation_by_id(
+        session=session, conversation_id=chat_request.conversation_id
+    )
+    if not conversation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="对话不存在")
+
+    if conversation.user_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="无权访问此对话"
         )
 
-    # 3. 创建用户消息
-    user_message = create_message(
-        session=session,
-        message_create=MessageCreate(
-            role="user",
-            content=chat_request.message,
-            conversation_id=conversation.conversation_id,
-            agent_id=chat_request.agent_id,
-        ),
+    # 重复提交的请求共享首个请求的结果，不再保存消息
+    response, _ = await agent_dialogue_service.run_coalesced_turn(
+        str(conversation.conversation_id),
+        str(current_user.user_id),
+        str(chat_request.agent_id),
+        chat_request.message,
+        _run_chat_turn,
+        session,
+        current_user,
+        chat_request,
+        agent,
+        conversation,
+        cancel_token,
     )
+    return response
 
-    # 4. 获取模型信息（如果指定了模型）
+
+async def _run_chat_turn(
+    session: Session,
+    current_user: User,
+    chat_request: ChatRequest,
+    agent: Agent,
+    conversation: Conversation | None,
+    cancel_token: CancelToken,
+) -> ChatResponse:
+    """
+    完整的一轮对话：保存用户消息、调用智能体、保存助手回复
+
+    conversation 为None时在通过准入控制后创建新对话；被拒绝的请求不写入任何数据，
+    服务繁忙或超时未产生回复时删除已保存的用户消息
+    """
+
+    # 3. 获取模型信息（如果指定了模型）
     model = None
     if chat_request.model_id:
         model = get_model_by_id(session=session, model_id=chat_request.model_id)
@@ -112,50 +152,118 @@ async def chat_with_agent(
                 status_code=status.HTTP_404_NOT_FOUND, detail="模型不存在"
             )
 
-    # 5. 获取对话历史
-    conversation_history = get_messages_by_conversation(
-        session=session, conversation_id=conversation.conversation_id
-    )
+    # 4. 先经过按用户和提供商的准入控制，通过后再保存消息并调用智能体对话服务
+    try:
+        async with admission_controller.admit(
+            user_id=current_user.user_id,
+            provider=resolve_provider(session, model),
+            weight=admission_weight(current_user.is_superuser),
+            queue_timeout=cancel_token.remaining(),
+        ):
+            if conversation is None:
+                conversation = create_conversation(
+                    session=session,
+                    conversation_create=ConversationCreate(title="新对话"),
+                    user_id=current_user.user_id,
+                )
 
-    # 6. 调用智能体对话服务，使用AutoAgent
-    session_id = str(conversation.conversation_id)
-    dialogue_result = await agent_dialogue_service.process_agent_dialogue(
-        session=session,
-        agent=agent,
-        user_message=chat_request.message,
-        conversation_history=conversation_history[:-1],  # 排除刚创建的用户消息
-        session_id=session_id,
-    )
+            # 5. 创建用户消息
+            with chat_stage_seconds.time("persist_user_message"):
+                user_message = create_message(
+                    session=session,
+                    message_create=MessageCreate(
+                        role="user",
+                        content=chat_request.message,
+                        conversation_id=conversation.conversation_id,
+                        agent_id=chat_request.agent_id,
+                    ),
+                )
+
+            # 6. 获取对话历史并调用智能体对话服务，使用AutoAgent
+            with chat_stage_seconds.time("load_history"):
+                conversation_history = get_messages_by_conversation(
+                    session=session, conversation_id=conversation.conversation_id
+                )
+            session_id = str(conversation.conversation_id)
+            dialogue_result = await agent_dialogue_service.process_agent_dialogue(
+                session=session,
+                agent=agent,
+                user_message=chat_request.message,
+                conversation_history=conversation_history[:-1],  # 排除刚创建的用户消息
+                session_id=session_id,
+                user_id=current_user.user_id,
+                model=model,
+                cancel_token=cancel_token,
+            )
+    except AdmissionRejectedError as e:
+        if e.reason == DEADLINE_EXCEEDED:
+            chat_turns_total.inc("http", "deadline_exceeded")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e)
+            )
+        chat_turns_total.inc("http", "rejected")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+            if e.retry_after
+            else None,
+        )
+
+    if dialogue_result.get("busy"):
+        chat_turns_total.inc("http", "busy")
+        hard_delete_message(session=session, message_id=user_message.message_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=dialogue_result.get("error", "服务繁忙，请稍后再试"),
+        )
+
+    deadline_exceeded = bool(dialogue_result.get("deadline_exceeded"))
+    if deadline_exceeded and not dialogue_result.get("response"):
+        chat_turns_total.inc("http", "deadline_exceeded")
+        hard_delete_message(session=session, message_id=user_message.message_id)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="对话超过时限，没有产生回复",
+        )
 
-    if not dialogue_result["success"]:
+    if not dialogue_result["success"] and not deadline_exceeded:
+        chat_turns_total.inc("http", "failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"对话处理失败: {dialogue_result.get('error', '未知错误')}",
         )
 
     # 7. 创建助手消息
-    assistant_message = create_message(
-        session=session,
-        message_create=MessageCreate(
-            role="assistant",
-            content=dialogue_result["response"],
-            conversation_id=conversation.conversation_id,
-            agent_id=chat_request.agent_id,
-            model_metadata={
-                "model_id": str(chat_request.model_id)
-                if chat_request.model_id
-                else None,
-                "model_name": model.name if model else None,
-                "events": dialogue_result.get("events", []),
-                "events_summary": dialogue_result.get("events_summary", {}),
-                "session_id": dialogue_result.get("session_id"),
-                "autoagent_info": {
-                    "agent_name": dialogue_result.get("agent_name"),
-                    "raw_result": dialogue_result.get("raw_result"),
-                    "autoagent_messages": dialogue_result.get("autoagent_messages", []),
+    with chat_stage_seconds.time("persist_assistant_message"):
+        assistant_message = create_message(
+            session=session,
+            message_create=MessageCreate(
+                role="assistant",
+                content=dialogue_result["response"],
+                conversation_id=conversation.conversation_id,
+                agent_id=chat_request.agent_id,
+                model_metadata={
+                    "model_id": str(chat_request.model_id)
+                    if chat_request.model_id
+                    else None,
+                    "model_name": model.name if model else None,
+                    "events": dialogue_result.get("events", []),
+                    "events_summary": dialogue_result.get("events_summary", {}),
+                    "session_id": dialogue_result.get("session_id"),
+                    "deadline_exceeded": deadline_exceeded,
+                    "autoagent_info": {
+                        "agent_name": dialogue_result.get("agent_name"),
+                        "raw_result": dialogue_result.get("raw_result"),
+                        "autoagent_messages": dialogue_result.get(
+                            "autoagent_messages", []
+                        ),
+                    },
                 },
-            },
-        ),
+            ),
+        )
+    chat_turns_total.inc(
+        "http", "deadline_exceeded" if deadline_exceeded else "completed"
     )
 
     return ChatResponse(
@@ -170,4 +278,11 @@ async def chat_with_agent(
             "agent_name": dialogue_result.get("agent_name"),
             "context_variables": dialogue_result.get("context_variables", {}),
         },
+        deadline_exceeded=deadline_exceeded,
     )
+
+
+@router.get("/runtime-stats", dependencies=[Depends(get_current_active_superuser)])
+def get_runtime_stats() -> dict:
+    """获取智能体对话服务的运行指标（仅超级用户）"""
+    return agent_dialogue_service.get_runtime_stats()
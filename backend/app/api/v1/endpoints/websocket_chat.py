@@ -4,13 +4,28 @@ WebSocket聊天端点
 """
 
 import asyncio
-import json
 import logging
 import uuid
+import zlib
+from collections.abc import Awaitable, Callable
 from datetime import datetime
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 
+from app.api.v1.dependencies import (
+    CurrentUserDep,
+    get_current_active_superuser,
+    get_token_user,
+)
+from app.core.config import settings
+from app.core.metrics import chat_stage_seconds, chat_turns_total, metrics_registry
 from app.db.repository import (
     create_conversation,
     create_message,
@@ -18,27 +33,190 @@ from app.db.repository import (
     get_conversation_by_id,
     get_model_by_id,
     get_messages_by_conversation,
+    hard_delete_message,
 )
 from app.schemas import ConversationCreate, MessageCreate
+from app.services.admission import (
+    AdmissionRejectedError,
+    admission_controller,
+    admission_weight,
+    resolve_provider,
+)
 from app.services.agent_service import agent_dialogue_service
+from app.services.cancellation import DEADLINE_EXCEEDED, CancelToken, resolve_deadline
+from app.services.payload_store import payload_store
+from app.services.session_store import session_store
+from app.services.ws_replay import ReplayBuffer
+from app.services.ws_send_queue import BoundedSendQueue, SlowConsumerError
+from app.services.ws_serialization import (
+    MessageDecodeError,
+    WebSocketSerializer,
+    get_available_encodings,
+    json_serializer,
+    select_serializer,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# 批量推送的帧数，frame为single或event_batch
+websocket_frames_total = metrics_registry.counter(
+    "alma_websocket_frames_total",
+    "WebSocket frames sent by frame kind",
+    ("frame",),
+)
+
+# 发送的字节数，按编码区分
+websocket_bytes_sent_total = metrics_registry.counter(
+    "alma_websocket_bytes_sent_total",
+    "Bytes sent over chat WebSockets by encoding",
+    ("encoding",),
+)
+
+# 压缩帧压缩前后的字节数，stage为raw或compressed
+websocket_compression_bytes_total = metrics_registry.counter(
+    "alma_websocket_compression_bytes_total",
+    "Bytes of compressed WebSocket frames before and after compression",
+    ("stage",),
+)
+
+# 开启压缩的连接发送的二进制帧首字节，标明帧内容是否经过压缩
+FRAME_FLAG_PLAIN = b"\x00"
+FRAME_FLAG_DEFLATE = b"\x01"
+
+# 发送队列满时丢弃的消息数和断开的慢客户端数
+websocket_send_queue_overflow_total = metrics_registry.counter(
+    "alma_websocket_send_queue_overflow_total",
+    "Messages dropped or connections closed because a send queue was full",
+    ("action",),
+)
+
+# 慢客户端断开时使用的关闭码（1013 Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# 同一会话建立新连接时关闭旧连接使用的关闭码
+REPLACED_CLOSE_CODE = 4001
+
+# 断线重连后补发的消息数
+websocket_replayed_messages_total = metrics_registry.counter(
+    "alma_websocket_replayed_messages_total",
+    "Messages replayed to clients that resumed a WebSocket session",
+)
+
+# 断线重连的次数，result为complete或incomplete（错过的消息已被淘汰）
+websocket_resumes_total = metrics_registry.counter(
+    "alma_websocket_resumes_total",
+    "WebSocket resume handshakes by whether every missed message was replayed",
+    ("result",),
+)
+
+# 批量推送时被合并掉的status_update数
+websocket_status_coalesced_total = metrics_registry.counter(
+    "alma_websocket_status_updates_coalesced_total",
+    "status_update messages superseded by a later status within a batch",
+)
+
+
+def coalesce_status_updates(
+    items: list[tuple[dict, bytes | str]],
+) -> list[tuple[dict, bytes | str]]:
+    """同一批 (消息, 编码后的数据) 中只保留最后一个status_update，其余保持原有顺序"""
+    last_status = None
+    for index, (message, _) in enumerate(items):
+        if message.get("type") == "status_update":
+            last_status = index
+    if last_status is None:
+        return items
+    return [
+        item
+        for index, item in enumerate(items)
+        if index == last_status or item[0].get("type") != "status_update"
+    ]
+
 
 class WebSocketConnectionManager:
     """WebSocket连接管理器，支持实时事件推送"""
 
     def __init__(self):
         self.active_connections: dict[str, WebSocket] = {}
-        self.event_queues: dict[str, asyncio.Queue] = {}
+        self.event_queues: dict[str, BoundedSendQueue] = {}
         self.connection_tasks: dict[str, asyncio.Task] = {}
+        # 开启批量推送的会话
+        self.batching_sessions: set[str] = set()
+        # 各连接握手时协商的编码
+        self.serializers: dict[str, WebSocketSerializer] = {}
+        # 开启大帧压缩的会话
+        self.compressing_sessions: set[str] = set()
+        # 连接时带上有效访问令牌的会话 -> 令牌中的用户ID
+        self.authenticated_users: dict[str, str] = {}
+        # 各会话的重放缓冲，连接断开后在宽限期内保留，重连时从中补发消息
+        self.replay_buffers: dict[str, ReplayBuffer] = {}
+        # 各会话进行中的对话任务及其取消令牌，不随连接断开而结束，重连后由新连接接管
+        self.session_runs: dict[str, dict[asyncio.Task, CancelToken]] = {}
+        # 宽限期结束后清理会话的任务
+        self.teardown_tasks: dict[str, asyncio.Task] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        batch: bool = False,
+        compress: bool = False,
+        user_id: str | None = None,
+    ):
+        """
+        连接WebSocket
+
+        按客户端请求的子协议选择消息编码；batch为True时队列中的消息按批合并发送；
+        compress为True时超过阈值的帧压缩后发送；user_id为访问令牌认证的用户，未认证时为None；
+        会话已有连接时关闭旧连接，会话在等待重连的宽限期内时取消清理
+        """
+        serializer, subprotocol = select_serializer(
+            websocket.scope.get("subprotocols") or []
+        )
+        await websocket.accept(subprotocol=subprotocol)
+
+        previous = self.active_connections.get(session_id)
+        if previous is not None:
+            self.disconnect(session_id)
+            try:
+                await previous.close(
+                    code=REPLACED_CLOSE_CODE, reason="同一会话建立了新连接"
+                )
+            except Exception:
+                pass
+        teardown_task = self.teardown_tasks.pop(session_id, None)
+        if teardown_task is not None:
+            teardown_task.cancel()
+        if (
+            session_id not in self.replay_buffers
+            and settings.WS_REPLAY_MAX_MESSAGES > 0
+        ):
+            self.replay_buffers[session_id] = ReplayBuffer(
+                max_messages=settings.WS_REPLAY_MAX_MESSAGES,
+                max_bytes=settings.WS_REPLAY_MAX_BYTES,
+                ttl=settings.WS_REPLAY_TTL_SECONDS,
+            )
 
-    async def connect(self, websocket: WebSocket, session_id: str):
-        """连接WebSocket"""
-        await websocket.accept()
         self.active_connections[session_id] = websocket
-        self.event_queues[session_id] = asyncio.Queue()
+        self.serializers[session_id] = serializer
+        if user_id is not None:
+            self.authenticated_users[session_id] = user_id
+        else:
+            self.authenticated_users.pop(session_id, None)
+        if compress:
+            self.compressing_sessions.add(session_id)
+        else:
+            self.compressing_sessions.discard(session_id)
+        self.event_queues[session_id] = BoundedSendQueue(
+            max_messages=settings.WS_SEND_QUEUE_MAX_MESSAGES,
+            max_bytes=settings.WS_SEND_QUEUE_MAX_BYTES,
+            policy=settings.WS_SEND_QUEUE_OVERFLOW_POLICY,
+        )
+        if batch:
+            self.batching_sessions.add(session_id)
+        else:
+            self.batching_sessions.discard(session_id)
 
         # 启动事件处理任务
         self.connection_tasks[session_id] = asyncio.create_task(
@@ -47,14 +225,45 @@ class WebSocketConnectionManager:
 
         logger.info(f"WebSocket连接建立: {session_id}")
 
-    def disconnect(self, session_id: str):
-        """断开连接"""
+    def client_identity(self, session_id: str) -> str:
+        """
+        会话当前连接的客户端标识，用作准入控制的限流键
+
+        已认证的连接使用令牌中的用户ID，与REST接口共用同一用户的限流；
+        未认证的连接使用服务端看到的客户端地址
+        """
+        user_id = self.authenticated_users.get(session_id)
+        if user_id is not None:
+            return user_id
+        websocket = self.active_connections.get(session_id)
+        client = websocket.client if websocket is not None else None
+        if client is not None and client.host:
+            return f"ws:{client.host}"
+        return f"ws-session:{session_id}"
+
+    def disconnect(self, session_id: str, websocket: WebSocket | None = None):
+        """
+        断开连接，重放缓冲和进行中的对话保留到会话清理时
+
+        指定websocket时只在它仍是会话的当前连接时断开，避免旧连接断开时影响重连后的新连接
+        """
+        if (
+            websocket is not None
+            and self.active_connections.get(session_id) is not websocket
+        ):
+            return
+
         if session_id in self.active_connections:
             del self.active_connections[session_id]
 
         if session_id in self.event_queues:
             del self.event_queues[session_id]
 
+        self.batching_sessions.discard(session_id)
+        self.serializers.pop(session_id, None)
+        self.compressing_sessions.discard(session_id)
+        self.authenticated_users.pop(session_id, None)
+
         if session_id in self.connection_tasks:
             self.connection_tasks[session_id].cancel()
             del self.connection_tasks[session_id]
@@ -70,10 +279,12 @@ class WebSocketConnectionManager:
 
                 try:
                     # 等待事件，设置超时避免无限等待
-                    message = await asyncio.wait_for(
-                        self.event_queues[session_id].get(), timeout=30.0
-                    )
-                    await self._send_direct(session_id, message)
+                    queue = self.event_queues[session_id]
+                    message, data = await asyncio.wait_for(queue.get(), timeout=30.0)
+                    if session_id in self.batching_sessions:
+                        await self._send_batch(session_id, queue, message, data)
+                    else:
+                        await self._send_direct(session_id, message, data)
                 except asyncio.TimeoutError:
                     # 发送心跳消息
                     await self._send_direct(
@@ -86,24 +297,238 @@ class WebSocketConnectionManager:
         except asyncio.CancelledError:
             pass
 
-    async def _send_direct(self, session_id: str, message: dict):
-        """直接发送消息，不经过队列"""
+    async def _send_batch(
+        self,
+        session_id: str,
+        queue: BoundedSendQueue,
+        first: dict,
+        first_data: bytes | str,
+    ):
+        """
+        收集窗口内的消息合并为一个 event_batch 帧发送
+
+        窗口从第一条消息出队开始计算，达到条数上限时提前发送；只有一条消息时原样发送。
+        各消息沿用入队时的编码结果，批量帧只在外层拼接，不重新编码
+        """
+        max_events = settings.WS_EVENT_BATCH_MAX_EVENTS
+        items = [(first, first_data)]
+        while len(items) < max_events and not queue.empty():
+            items.append(queue.get_nowait())
+        if len(items) < max_events and settings.WS_EVENT_BATCH_WINDOW_MS > 0:
+            await asyncio.sleep(settings.WS_EVENT_BATCH_WINDOW_MS / 1000)
+            while len(items) < max_events and not queue.empty():
+                items.append(queue.get_nowait())
+
+        frames = coalesce_status_updates(items)
+        if len(frames) < len(items):
+            websocket_status_coalesced_total.inc(amount=len(items) - len(frames))
+        if len(frames) == 1:
+            websocket_frames_total.inc("single")
+            await self._send_direct(session_id, *frames[0])
+            return
+        websocket_frames_total.inc("event_batch")
+        batch = {"type": "event_batch", "count": len(frames)}
+        data = self.get_serializer(session_id).dumps_batch([item[1] for item in frames])
+        await self._send_direct(session_id, batch, data)
+
+    def get_serializer(self, session_id: str) -> WebSocketSerializer:
+        """连接协商的编码，连接不存在时为JSON"""
+        return self.serializers.get(session_id, json_serializer)
+
+    async def receive_frame(self, websocket: WebSocket) -> bytes | str:
+        """接收一个客户端帧，二进制帧返回bytes，文本帧返回str"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            return message["bytes"]
+        return message.get("text") or ""
+
+    def decode_frame(self, session_id: str, data: bytes | str) -> dict:
+        """解码客户端帧，二进制帧按协商的编码解码，文本帧总是按JSON解码"""
+        if isinstance(data, bytes):
+            return self.get_serializer(session_id).loads(data)
+        return json_serializer.loads(data)
+
+    async def _send_direct(
+        self, session_id: str, message: dict, data: bytes | str | None = None
+    ):
+        """直接发送消息，不经过队列；data为入队时已编码的数据"""
         if session_id in self.active_connections:
             try:
-                await self.active_connections[session_id].send_text(
-                    json.dumps(message, ensure_ascii=False, default=str)
-                )
+                serializer = self.get_serializer(session_id)
+                if data is None:
+                    data = serializer.dumps(message)
+                websocket = self.active_connections[session_id]
+                if session_id in self.compressing_sessions:
+                    data = self._frame_for_compression(data, serializer.binary)
+                websocket_bytes_sent_total.inc(serializer.name, amount=len(data))
+                if isinstance(data, bytes):
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
             except Exception as e:
                 logger.error(f"发送消息失败: {e}")
                 self.disconnect(session_id)
 
+    @staticmethod
+    def _frame_for_compression(data: bytes | str, binary: bool) -> bytes | str:
+        """
+        开启压缩的连接上的帧格式
+
+        超过阈值的帧压缩后以二进制帧发送，首字节为 FRAME_FLAG_DEFLATE；
+        未压缩的二进制帧首字节为 FRAME_FLAG_PLAIN，未压缩的文本帧不变
+        """
+        size = len(data) if isinstance(data, bytes) else len(data.encode())
+        if size < settings.WS_COMPRESSION_THRESHOLD_BYTES:
+            return FRAME_FLAG_PLAIN + data if binary else data
+        raw = data if isinstance(data, bytes) else data.encode()
+        compressed = zlib.compress(raw, settings.WS_COMPRESSION_LEVEL)
+        websocket_compression_bytes_total.inc("raw", amount=len(raw))
+        websocket_compression_bytes_total.inc("compressed", amount=len(compressed))
+        return FRAME_FLAG_DEFLATE + compressed
+
     async def send_message(self, session_id: str, message: dict):
-        """发送消息给特定会话（通过队列）"""
-        if session_id in self.event_queues:
+        """
+        发送消息给特定会话（通过队列）
+
+        消息入队时编码，按编码后的大小计入队列上限；队列满且无法腾出空间时断开该客户端。
+        会话有重放缓冲时消息先分配序号并写入缓冲，连接断开期间的消息只写入缓冲，重连后补发
+        """
+        if (
+            session_id not in self.event_queues
+            and session_id not in self.replay_buffers
+        ):
+            return
+        try:
+            if session_id in self.replay_buffers and "sequence" not in message:
+                message["sequence"] = await session_store.next_sequence_async(
+                    session_id
+                )
+            # 分配序号时可能在等待存储，之后再取当前的发送队列和重放缓冲
+            queue = self.event_queues.get(session_id)
+            replay_buffer = self.replay_buffers.get(session_id)
+            data = self.get_serializer(session_id).dumps(message)
+            if replay_buffer is not None and "sequence" in message:
+                replay_buffer.append(message["sequence"], message, len(data))
+            if queue is None:
+                return
+            if not queue.put_nowait(message, data):
+                websocket_send_queue_overflow_total.inc("dropped")
+        except SlowConsumerError as e:
+            websocket_send_queue_overflow_total.inc("disconnected")
+            logger.warning(
+                "WebSocket客户端消费过慢，断开连接",
+                extra={"session_id": session_id, "queue": queue.get_stats()},
+            )
+            await self._close_slow_consumer(session_id, str(e))
+        except Exception as e:
+            logger.error(f"消息入队失败: {e}")
+
+    async def _close_slow_consumer(self, session_id: str, reason: str):
+        """断开慢客户端，丢弃其发送队列"""
+        websocket = self.active_connections.get(session_id)
+        self.disconnect(session_id)
+        if websocket is not None:
             try:
-                await self.event_queues[session_id].put(message)
-            except Exception as e:
-                logger.error(f"消息入队失败: {e}")
+                await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason=reason)
+            except Exception:
+                pass
+
+    async def resume(self, session_id: str, last_sequence: int) -> dict:
+        """
+        补发客户端错过的消息（序号大于 last_sequence）
+
+        队列中尚未发送的消息也在重放缓冲中，合并后按序号重新入队，避免重复和乱序；
+        正在发送的消息可能重复到达，客户端按 sequence 去重。
+        complete为False表示部分消息已从缓冲中淘汰，客户端需要重新加载对话
+        """
+        replay_buffer = self.replay_buffers.get(session_id)
+        queue = self.event_queues.get(session_id)
+        if replay_buffer is None or queue is None:
+            websocket_resumes_total.inc("incomplete")
+            return {"replayed": 0, "complete": False, "last_sequence": None}
+
+        missed, complete = replay_buffer.since(last_sequence)
+        merged: dict[int, tuple[dict, bytes | str | None]] = {
+            message["sequence"]: (message, None) for message in missed
+        }
+        for message, data in queue.drain():
+            merged.setdefault(message.get("sequence", 0), (message, data))
+
+        serializer = self.get_serializer(session_id)
+        try:
+            for sequence in sorted(merged):
+                message, data = merged[sequence]
+                if data is None:
+                    data = serializer.dumps(message)
+                queue.put_nowait(message, data)
+        except SlowConsumerError as e:
+            websocket_send_queue_overflow_total.inc("disconnected")
+            await self._close_slow_consumer(session_id, str(e))
+
+        websocket_replayed_messages_total.inc(amount=len(missed))
+        websocket_resumes_total.inc("complete" if complete else "incomplete")
+        return {
+            "replayed": len(missed),
+            "complete": complete,
+            "last_sequence": replay_buffer.last_sequence,
+        }
+
+    def schedule_teardown(
+        self,
+        session_id: str,
+        delay: float,
+        teardown: Callable[[str], Awaitable[None]],
+    ):
+        """宽限期结束后会话仍没有重连时调用 teardown 清理会话，重连时取消"""
+        previous = self.teardown_tasks.pop(session_id, None)
+        if previous is not None:
+            previous.cancel()
+
+        async def run():
+            await asyncio.sleep(delay)
+            if session_id in self.active_connections:
+                return
+            # 清理开始后不再因重连而取消，避免对话停在一半
+            self.teardown_tasks.pop(session_id, None)
+            await teardown(session_id)
+
+        self.teardown_tasks[session_id] = asyncio.create_task(run())
+
+    def drop_replay_buffer(self, session_id: str):
+        """丢弃会话的重放缓冲"""
+        self.replay_buffers.pop(session_id, None)
+
+    def get_replay_stats(self, session_id: str) -> dict | None:
+        """会话的重放缓冲统计"""
+        replay_buffer = self.replay_buffers.get(session_id)
+        return replay_buffer.get_stats() if replay_buffer is not None else None
+
+    def get_queue_stats(self, session_id: str) -> dict | None:
+        """连接的发送队列统计"""
+        queue = self.event_queues.get(session_id)
+        return queue.get_stats() if queue is not None else None
+
+    def get_stats(self) -> dict:
+        """所有连接的发送队列统计"""
+        queues = {
+            session_id: queue.get_stats()
+            for session_id, queue in self.event_queues.items()
+        }
+        return {
+            "connections": len(self.active_connections),
+            "queued_messages": sum(stats["depth"] for stats in queues.values()),
+            "queued_bytes": sum(stats["bytes"] for stats in queues.values()),
+            "dropped": sum(stats["dropped"] for stats in queues.values()),
+            "replay_buffers": len(self.replay_buffers),
+            "replay_buffered_messages": sum(
+                replay_buffer.get_stats()["messages"]
+                for replay_buffer in self.replay_buffers.values()
+            ),
+            "pending_teardowns": len(self.teardown_tasks),
+            "queues": queues,
+        }
 
     async def send_immediate(self, session_id: str, message: dict):
         """立即发送消息，不经过队列（用于紧急消息）"""
@@ -112,13 +537,41 @@ class WebSocketConnectionManager:
 
 manager = WebSocketConnectionManager()
 
+metrics_registry.gauge(
+    "alma_websocket_connections",
+    "Open WebSocket chat connections",
+    lambda: len(manager.active_connections),
+)
+metrics_registry.gauge(
+    "alma_websocket_send_queue_messages",
+    "Messages waiting in WebSocket send queues",
+    lambda: sum(queue.qsize() for queue in manager.event_queues.values()),
+)
+metrics_registry.gauge(
+    "alma_websocket_send_queue_bytes",
+    "Encoded bytes waiting in WebSocket send queues",
+    lambda: sum(queue.queued_bytes for queue in manager.event_queues.values()),
+)
+metrics_registry.gauge(
+    "alma_websocket_sessions_awaiting_resume",
+    "Disconnected chat sessions kept alive while waiting for the client to resume",
+    lambda: len(manager.teardown_tasks),
+)
+
 
 class RealTimeEventHandler:
     """实时事件处理器，用于WebSocket流式推送AutoAgent事件"""
 
-    def __init__(self, session_id: str, manager: WebSocketConnectionManager):
+    def __init__(
+        self,
+        session_id: str,
+        manager: WebSocketConnectionManager,
+        owner_id: str | None,
+    ):
         self.session_id = session_id
         self.manager = manager
+        # 连接认证的用户，转存的超大字段只允许该用户获取；未认证的连接只截断不转存
+        self.owner_id = owner_id
         self.events_count = 0
 
     async def handle_autoagent_event(
@@ -127,14 +580,17 @@ class RealTimeEventHandler:
         """处理AutoAgent事件并实时推送给前端"""
         self.events_count += 1
 
-        # 构建事件消息
+        # 构建事件消息，超大字段按配置截断或转存
         event_message = {
             "type": "agent_event",
             "event_type": event_type,
             "agent_name": agent_name,
-            "data": data,
+            "data": payload_store.limit_event_data(
+                self.session_id, data, self.owner_id
+            ),
             "timestamp": data.get("timestamp", datetime.now().isoformat()),
-            "sequence": self.events_count,
+            # 序号由会话状态存储分配，会话迁移到其他工作进程后仍保持递增
+            "sequence": await session_store.next_sequence_async(self.session_id),
         }
 
         # 发送事件到前端
@@ -205,35 +661,129 @@ class RealTimeEventHandler:
                 },
             )
 
+        elif event_type == DEADLINE_EXCEEDED:
+            await self.manager.send_message(
+                self.session_id,
+                {
+                    "type": "status_update",
+                    "status": "deadline_exceeded",
+                    "message": "对话超过时限，已返回部分结果",
+                },
+            )
+
 
 @router.websocket("/ws/{session_id}")
 async def websocket_chat_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket聊天端点，支持实时事件流"""
-    await manager.connect(websocket, session_id)
+    """
+    WebSocket聊天端点，支持实时事件流
+
+    连接时带上查询参数 batch=true 开启批量推送，推送的消息合并为 event_batch 帧；
+    子协议 alma.msgpack / alma.cbor 使用二进制编码，alma.json 或不指定子协议时使用JSON；
+    查询参数 compress=deflate 开启大帧压缩，压缩帧以二进制帧发送，首字节为 0x01；
+    断线重连时带上查询参数 last_sequence（或连接后发送 resume 消息）补发错过的消息，
+    断开后的宽限期内进行中的对话继续运行，期间的消息在重连后补发；
+    查询参数 token 为访问令牌，带上时消息中的 user_id 必须与令牌一致，
+    超大字段只在已认证的连接上转存，未认证的连接只截断
+    """
+    token = websocket.query_params.get("token")
+    authenticated_user_id = None
+    if token:
+        from app.db.session import get_session_context
+
+        async with get_session_context() as session:
+            user = get_token_user(session, token)
+        if user is not None:
+            authenticated_user_id = str(user.user_id)
+        else:
+            await websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION, reason="访问令牌无效"
+            )
+            return
+    batch = websocket.query_params.get("batch", "").lower() in ("1", "true", "yes")
+    compress = websocket.query_params.get("compress", "").lower() == "deflate"
+    resume_from = parse_last_sequence(websocket.query_params.get("last_sequence"))
+    await manager.connect(
+        websocket,
+        session_id,
+        batch=batch,
+        compress=compress,
+        user_id=authenticated_user_id,
+    )
+
+    # 进行中的对话任务及其取消令牌，对话在后台运行以便继续接收取消消息；
+    # 重连时接管上一个连接留下的对话
+    active_runs = manager.session_runs.setdefault(session_id, {})
 
     try:
-        # 发送连接成功消息
+        # 发送连接成功消息，附带粘性路由提示：会话的AutoAgent实例在其他工作进程时，
+        # 负载均衡器应把该会话路由到 owner_worker_id
+        owner_worker_id = await session_store.call(session_store.get_owner, session_id)
         await manager.send_immediate(
             session_id,
             {
                 "type": "connection_success",
                 "message": "WebSocket连接成功，准备接收实时事件",
                 "session_id": session_id,
+                "worker_id": session_store.worker_id,
+                "owner_worker_id": owner_worker_id,
+                "batching": batch,
+                "encoding": manager.get_serializer(session_id).name,
+                "compression": "deflate" if compress else None,
+                "compression_threshold": settings.WS_COMPRESSION_THRESHOLD_BYTES
+                if compress
+                else None,
+                "available_encodings": get_available_encodings(),
+                "resumable": session_id in manager.replay_buffers,
+                "resume_grace_seconds": settings.WS_RESUME_GRACE_SECONDS,
+                "active_runs": len(active_runs),
                 "timestamp": datetime.now().isoformat(),
             },
         )
+        if resume_from is not None:
+            await handle_resume(session_id, resume_from)
 
         while True:
             # 接收客户端消息
-            data = await websocket.receive_text()
+            data = await manager.receive_frame(websocket)
 
             try:
-                message_data = json.loads(data)
+                message_data = manager.decode_frame(session_id, data)
                 message_type = message_data.get("type")
 
                 if message_type == "chat":
-                    # 处理聊天消息
-                    await handle_realtime_chat_message(session_id, message_data)
+                    # 处理聊天消息，客户端可以用 deadline_ms 指定本次对话的时限
+                    try:
+                        deadline_ms = float(message_data.get("deadline_ms") or 0)
+                    except (TypeError, ValueError):
+                        deadline_ms = 0
+                    cancel_token = CancelToken(deadline=resolve_deadline(deadline_ms))
+                    chat_task = asyncio.create_task(
+                        handle_realtime_chat_message(
+                            session_id, message_data, cancel_token
+                        )
+                    )
+                    active_runs[chat_task] = cancel_token
+                    chat_task.add_done_callback(
+                        lambda task: active_runs.pop(task, None)
+                    )
+                elif message_type == "cancel":
+                    # 取消进行中的对话
+                    for cancel_token in active_runs.values():
+                        cancel_token.cancel("client_cancel")
+                    await manager.send_message(
+                        session_id,
+                        {
+                            "type": "cancel_requested",
+                            "active_runs": len(active_runs),
+                            "timestamp": datetime.now().isoformat(),
+                        },
+                    )
+                elif message_type == "resume":
+                    # 断线重连后补发错过的消息
+                    last_sequence = parse_last_sequence(
+                        message_data.get("last_sequence")
+                    )
+                    await handle_resume(session_id, last_sequence or 0)
                 elif message_type == "ping":
                     # 心跳检测
                     await manager.send_immediate(
@@ -260,12 +810,12 @@ async def websocket_chat_endpoint(websocket: WebSocket, session_id: str):
                         },
                     )
 
-            except json.JSONDecodeError:
+            except MessageDecodeError as e:
                 await manager.send_message(
                     session_id,
                     {
                         "type": "error",
-                        "message": "无效的JSON格式",
+                        "message": str(e),
                         "timestamp": datetime.now().isoformat(),
                     },
                 )
@@ -285,20 +835,117 @@ async def websocket_chat_endpoint(websocket: WebSocket, session_id: str):
     except Exception as e:
         logger.exception(f"WebSocket连接异常: {e}")
     finally:
-        manager.disconnect(session_id)
-        # 清理会话资源
-        agent_dialogue_service.cleanup_session(session_id)
+        manager.disconnect(session_id, websocket)
+        # 被同一会话的新连接取代时由新连接接管会话，否则等待宽限期内重连
+        if session_id not in manager.active_connections:
+            if settings.WS_RESUME_GRACE_SECONDS > 0:
+                manager.schedule_teardown(
+                    session_id, settings.WS_RESUME_GRACE_SECONDS, teardown_session
+                )
+            else:
+                await teardown_session(session_id)
 
 
-async def handle_realtime_chat_message(session_id: str, message_data: dict):
-    """处理实时聊天消息，支持AutoAgent事件流式推送"""
+def parse_last_sequence(value) -> int | None:
+    """解析客户端提供的最后收到的序号，无效时返回None"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+async def handle_resume(session_id: str, last_sequence: int):
+    """补发序号大于 last_sequence 的消息，并告知客户端补发结果"""
+    result = await manager.resume(session_id, last_sequence)
+    await manager.send_immediate(
+        session_id,
+        {
+            "type": "resume_result",
+            "from_sequence": last_sequence,
+            **result,
+            "timestamp": datetime.now().isoformat(),
+        },
+    )
+
+
+async def teardown_session(session_id: str):
+    """取消会话进行中的对话，等待其保存部分结果后清理会话资源"""
+    active_runs = manager.session_runs.pop(session_id, {})
+    for cancel_token in active_runs.values():
+        cancel_token.cancel("client_disconnect")
+    if active_runs:
+        await asyncio.gather(*active_runs, return_exceptions=True)
+    if session_id in manager.active_connections:
+        # 等待对话结束期间客户端重新连接，会话资源留给新连接
+        return
+    agent_dialogue_service.cleanup_session(session_id)
+    payload_store.drop_session(session_id)
+    manager.drop_replay_buffer(session_id)
+
+
+@router.get("/connections", dependencies=[Depends(get_current_active_superuser)])
+def get_connection_stats() -> dict:
+    """获取WebSocket连接的发送队列统计（仅超级用户）"""
+    return manager.get_stats()
+
+
+@router.get("/payloads/{payload_id}")
+def get_offloaded_payload(payload_id: str, current_user: CurrentUserDep) -> dict:
+    """获取事件中被转存的完整字段内容，只有对话所属的用户可以获取"""
+    payload = payload_store.get(payload_id, current_user.user_id)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="内容不存在或已过期"
+        )
+    return payload
+
+
+async def handle_realtime_chat_message(
+    session_id: str, message_data: dict, cancel_token: CancelToken | None = None
+):
+    """
+    处理实时聊天消息
+
+    同一会话中发给同一Agent的进行中的相同消息只处理一次，重复的消息不再保存，也不再推送结果，
+    首个消息的结果已推送到该会话
+    """
+    _, shared = await agent_dialogue_service.run_coalesced_turn(
+        session_id,
+        str(message_data.get("user_id", "")),
+        str(message_data.get("agent_id", "")),
+        message_data.get("message", ""),
+        run_realtime_chat_turn,
+        session_id,
+        message_data,
+        cancel_token,
+    )
+    if shared:
+        logger.info("忽略重复的实时聊天消息: %s", session_id)
+
+
+async def run_realtime_chat_turn(
+    session_id: str, message_data: dict, cancel_token: CancelToken | None = None
+):
+    """处理一轮实时聊天，支持AutoAgent事件流式推送，取消时保存已产生的部分回复"""
     try:
         # 解析消息数据
         user_message = message_data.get("message", "")
         agent_id = message_data.get("agent_id")
         conversation_id = message_data.get("conversation_id")
         model_id = message_data.get("model_id")
-        user_id = message_data.get("user_id")
+        # 已认证的连接以令牌中的用户为准，消息中的user_id可以省略，但不能不一致
+        authenticated_user_id = manager.authenticated_users.get(session_id)
+        user_id = message_data.get("user_id") or authenticated_user_id
+        if authenticated_user_id is not None and user_id != authenticated_user_id:
+            await manager.send_message(
+                session_id,
+                {
+                    "type": "error",
+                    "message": "user_id与访问令牌不一致",
+                    "timestamp": datetime.now().isoformat(),
+                },
+            )
+            return
 
         if not all([user_message, agent_id, user_id]):
             await manager.send_message(
@@ -354,48 +1001,16 @@ async def handle_realtime_chat_message(session_id: str, message_data: dict):
                         },
                     )
                     return
-            else:
-                # 创建新对话
-                conversation = create_conversation(
-                    session=session,
-                    conversation_create=ConversationCreate(title="新对话"),
-                    user_id=uuid.UUID(user_id),
-                )
-
-            # 创建用户消息
-            user_msg = create_message(
-                session=session,
-                message_create=MessageCreate(
-                    role="user",
-                    content=user_message,
-                    conversation_id=conversation.conversation_id,
-                    agent_id=uuid.UUID(agent_id),
-                ),
-            )
-
-            # 发送用户消息确认
-            await manager.send_message(
-                session_id,
-                {
-                    "type": "user_message_saved",
-                    "message_id": str(user_msg.message_id),
-                    "conversation_id": str(conversation.conversation_id),
-                    "timestamp": datetime.now().isoformat(),
-                },
-            )
 
             # 获取模型
             model = None
             if model_id:
                 model = get_model_by_id(session=session, model_id=uuid.UUID(model_id))
 
-            # 获取对话历史
-            conversation_history = get_messages_by_conversation(
-                session=session, conversation_id=conversation.conversation_id
-            )
-
             # 创建实时事件处理器
-            event_handler = RealTimeEventHandler(session_id, manager)
+            event_handler = RealTimeEventHandler(
+                session_id, manager, owner_id=authenticated_user_id
+            )
 
             # 设置AutoAgent的实时事件回调
             async def async_event_callback(
@@ -404,41 +1019,190 @@ async def handle_realtime_chat_message(session_id: str, message_data: dict):
                 """异步事件回调"""
                 await event_handler.handle_autoagent_event(event_type, agent_name, data)
 
-            try:
-                # 调用智能体对话服务，传入实时事件回调
-                dialogue_result = await agent_dialogue_service.process_agent_dialogue_with_realtime_events(
-                    session=session,
-                    agent=agent,
-                    user_message=user_message,
-                    conversation_history=conversation_history[
-                        :-1
-                    ],  # 排除刚创建的用户消息
-                    session_id=session_id,
-                    model=model,
-                    realtime_callback=async_event_callback,
+            async def report_queue_position(position: int, queue_length: int):
+                """排队期间推送当前位置"""
+                await manager.send_message(
+                    session_id,
+                    {
+                        "type": "status_update",
+                        "status": "queued",
+                        "message": f"排队中，前方还有 {position - 1} 个请求",
+                        "queue_position": position,
+                        "queue_length": queue_length,
+                    },
                 )
 
-                if dialogue_result["success"]:
-                    # 创建助手消息
-                    assistant_msg = create_message(
-                        session=session,
-                        message_create=MessageCreate(
-                            role="assistant",
-                            content=dialogue_result["response"],
-                            conversation_id=conversation.conversation_id,
-                            agent_id=uuid.UUID(agent_id),
-                            model_metadata={
-                                "model_id": model_id,
-                                "model_name": dialogue_result.get("model_used"),
-                                "tools_available": dialogue_result.get(
-                                    "tools_available", 0
+            try:
+                # 先经过准入控制，通过后再保存消息并调用智能体对话服务，传入实时事件回调；
+                # 未认证连接消息中的user_id由客户端提供，不能用于限流，
+                # 限流按令牌中的用户或服务端看到的客户端地址计算，并使用默认权重
+                try:
+                    async with admission_controller.admit(
+                        user_id=manager.client_identity(session_id),
+                        provider=resolve_provider(session, model),
+                        weight=admission_weight(False),
+                        on_queued=report_queue_position,
+                        queue_timeout=cancel_token.remaining()
+                        if cancel_token is not None
+                        else None,
+                    ):
+                        if conversation is None:
+                            # 创建新对话
+                            conversation = create_conversation(
+                                session=session,
+                                conversation_create=ConversationCreate(title="新对话"),
+                                user_id=uuid.UUID(user_id),
+                            )
+
+                        # 创建用户消息
+                        with chat_stage_seconds.time("persist_user_message"):
+                            user_msg = create_message(
+                                session=session,
+                                message_create=MessageCreate(
+                                    role="user",
+                                    content=user_message,
+                                    conversation_id=conversation.conversation_id,
+                                    agent_id=uuid.UUID(agent_id),
                                 ),
-                                "events_count": len(dialogue_result.get("events", [])),
-                                "session_id": session_id,
-                                "realtime_events": True,
+                            )
+
+                        # 发送用户消息确认
+                        await manager.send_message(
+                            session_id,
+                            {
+                                "type": "user_message_saved",
+                                "message_id": str(user_msg.message_id),
+                                "conversation_id": str(conversation.conversation_id),
+                                "timestamp": datetime.now().isoformat(),
                             },
-                        ),
+                        )
+
+                        # 获取对话历史
+                        with chat_stage_seconds.time("load_history"):
+                            conversation_history = get_messages_by_conversation(
+                                session=session,
+                                conversation_id=conversation.conversation_id,
+                            )
+
+                        dialogue_result = await agent_dialogue_service.process_agent_dialogue_with_realtime_events(
+                            session=session,
+                            agent=agent,
+                            user_message=user_message,
+                            conversation_history=conversation_history[
+                                :-1
+                            ],  # 排除刚创建的用户消息
+                            session_id=session_id,
+                            model=model,
+                            realtime_callback=async_event_callback,
+                            user_id=user_id,
+                            cancel_token=cancel_token,
+                        )
+                except AdmissionRejectedError as e:
+                    chat_turns_total.inc(
+                        "websocket",
+                        "deadline_exceeded"
+                        if e.reason == DEADLINE_EXCEEDED
+                        else "rejected",
+                    )
+                    await manager.send_message(
+                        session_id,
+                        {
+                            "type": "status_update",
+                            "status": "rejected",
+                            "message": str(e),
+                            "reason": e.reason,
+                            "retry_after": e.retry_after,
+                        },
                     )
+                    return
+
+                if dialogue_result.get("busy") or (
+                    dialogue_result.get("deadline_exceeded")
+                    and not dialogue_result.get("response")
+                ):
+                    # 服务繁忙或超时未产生回复，不保留这轮的用户消息
+                    hard_delete_message(session=session, message_id=user_msg.message_id)
+
+                if dialogue_result.get("busy"):
+                    outcome = "busy"
+                elif dialogue_result.get("deadline_exceeded"):
+                    outcome = "deadline_exceeded"
+                elif dialogue_result.get("cancelled"):
+                    outcome = "cancelled"
+                elif dialogue_result["success"]:
+                    outcome = "completed"
+                else:
+                    outcome = "failed"
+                chat_turns_total.inc("websocket", outcome)
+
+                if dialogue_result.get("cancelled"):
+                    # 保存被取消前已产生的部分回复
+                    assistant_msg = None
+                    if dialogue_result.get("response"):
+                        with chat_stage_seconds.time("persist_assistant_message"):
+                            assistant_msg = create_message(
+                                session=session,
+                                message_create=MessageCreate(
+                                    role="assistant",
+                                    content=dialogue_result["response"],
+                                    conversation_id=conversation.conversation_id,
+                                    agent_id=uuid.UUID(agent_id),
+                                    model_metadata={
+                                        "model_id": model_id,
+                                        "events_count": len(
+                                            dialogue_result.get("events", [])
+                                        ),
+                                        "session_id": session_id,
+                                        "realtime_events": True,
+                                        "cancelled": True,
+                                        "cancel_reason": dialogue_result.get(
+                                            "cancel_reason"
+                                        ),
+                                    },
+                                ),
+                            )
+
+                    await manager.send_message(
+                        session_id,
+                        {
+                            "type": "chat_cancelled",
+                            "conversation_id": str(conversation.conversation_id),
+                            "user_message_id": str(user_msg.message_id),
+                            "assistant_message_id": str(assistant_msg.message_id)
+                            if assistant_msg
+                            else None,
+                            "response": dialogue_result.get("response", ""),
+                            "reason": dialogue_result.get("cancel_reason"),
+                            "deadline_exceeded": dialogue_result.get(
+                                "deadline_exceeded", False
+                            ),
+                            "timestamp": datetime.now().isoformat(),
+                        },
+                    )
+                elif dialogue_result["success"]:
+                    # 创建助手消息
+                    with chat_stage_seconds.time("persist_assistant_message"):
+                        assistant_msg = create_message(
+                            session=session,
+                            message_create=MessageCreate(
+                                role="assistant",
+                                content=dialogue_result["response"],
+                                conversation_id=conversation.conversation_id,
+                                agent_id=uuid.UUID(agent_id),
+                                model_metadata={
+                                    "model_id": model_id,
+                                    "model_name": dialogue_result.get("model_used"),
+                                    "tools_available": dialogue_result.get(
+                                        "tools_available", 0
+                                    ),
+                                    "events_count": len(
+                                        dialogue_result.get("events", [])
+                                    ),
+                                    "session_id": session_id,
+                                    "realtime_events": True,
+                                },
+                            ),
+                        )
 
                     # 发送最终结果
                     await manager.send_message(
@@ -525,12 +1289,14 @@ async def handle_session_reset(session_id: str, message_data: dict):
 async def handle_get_status(session_id: str):
     """获取会话状态"""
     try:
-        status_data = agent_dialogue_service.get_session_statistics(session_id)
+        status_data = await agent_dialogue_service.get_session_statistics(session_id)
         await manager.send_message(
             session_id,
             {
                 "type": "status_response",
                 "data": status_data,
+                "send_queue": manager.get_queue_stats(session_id),
+                "replay": manager.get_replay_stats(session_id),
                 "timestamp": datetime.now().isoformat(),
             },
         )
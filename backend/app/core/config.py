@@ -126,5 +126,191 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
+    # AutoAgent执行器配置
+    # 执行AutoAgent调用的线程池大小（即全局并发上限）
+    AGENT_EXECUTOR_MAX_WORKERS: int = 8
+    # 单个用户同时运行的AutoAgent任务上限
+    AGENT_EXECUTOR_MAX_PER_USER: int = 2
+    # 等待执行的任务数上限，超过后直接拒绝
+    AGENT_EXECUTOR_MAX_QUEUE: int = 64
+
+    # AutoAgent实例池配置
+    # 最多常驻的会话实例数，超过后按LRU淘汰空闲实例
+    AUTOAGENT_POOL_MAX_INSTANCES: int = 100
+    # 实例空闲超过该时间（秒）后被后台任务回收
+    AUTOAGENT_POOL_IDLE_TTL_SECONDS: int = 30 * 60
+    # 后台回收任务的执行间隔（秒）
+    AUTOAGENT_POOL_REAP_INTERVAL_SECONDS: int = 60
+    # 实例因空闲或LRU被淘汰时是否保存会话快照，下次对话时在新实例上恢复上下文
+    AUTOAGENT_SNAPSHOT_ENABLED: bool = False
+    # 进程内存储中快照的保留时间（秒），过期后不再恢复
+    AUTOAGENT_SNAPSHOT_TTL_SECONDS: int = 2 * 60 * 60
+    # 进程内存储中快照的总字节数上限，超出时淘汰最早保存的快照
+    AUTOAGENT_SNAPSHOT_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # AutoAgent预热池配置
+    # 后台保持的已初始化实例数量，0表示不预热
+    AUTOAGENT_WARM_POOL_SIZE: int = 2
+    # 启动时是否等待预热池达到最小实例数
+    AUTOAGENT_WARM_POOL_BLOCK_ON_STARTUP: bool = False
+    # 启动等待的最小实例数
+    AUTOAGENT_WARM_POOL_MIN_SIZE: int = 1
+    # 启动等待的超时时间（秒）
+    AUTOAGENT_WARM_POOL_STARTUP_TIMEOUT_SECONDS: int = 60
+
+    # AutoAgent实例端口范围（包含两端），每个实例租用一个端口
+    AUTOAGENT_PORT_RANGE_START: int = 12347
+    AUTOAGENT_PORT_RANGE_END: int = 13346
+    # 分配端口前是否检查端口已被其他进程占用
+    AUTOAGENT_PORT_CHECK_AVAILABLE: bool = True
+    # 端口范围按工作进程等分的段数，应不小于单机上的工作进程数
+    AUTOAGENT_PORT_WORKER_SLOTS: int = 4
+    # 当前工作进程使用的分段序号，为空时通过锁文件自动占用一个空闲分段
+    AUTOAGENT_PORT_WORKER_INDEX: int | None = None
+    # 分段锁文件所在目录，为空时使用系统临时目录
+    AUTOAGENT_PORT_LOCK_DIR: str | None = None
+
+    # AutoAgent事件桥配置
+    # 每个会话缓冲的待推送事件上限
+    AGENT_EVENT_BRIDGE_MAX_SIZE: int = 256
+    # 缓冲区满时的处理策略：block阻塞AutoAgent线程，drop丢弃低价值事件，coalesce合并同类低价值事件
+    AGENT_EVENT_BRIDGE_OVERFLOW_POLICY: Literal["block", "drop", "coalesce"] = (
+        "coalesce"
+    )
+
+    # 日志配置
+    # 根日志级别
+    LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
+    # 智能体事件日志级别，设为DEBUG时记录思考和工具调用等高频事件
+    AGENT_EVENT_LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
+    # 高频事件的采样间隔，每N条记录1条，1表示全部记录；WARNING及以上级别的事件不采样
+    AGENT_EVENT_LOG_SAMPLE_EVERY: int = 10
+    # JSON日志文件路径，为空时只输出到控制台
+    LOG_JSON_FILE: str | None = None
+    # 单个日志文件最大字节数和保留的历史文件数
+    LOG_FILE_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_FILE_BACKUP_COUNT: int = 5
+    # 日志队列容量，写满后丢弃新日志而不阻塞调用方
+    LOG_QUEUE_SIZE: int = 10000
+
+    # 运行指标配置
+    # 是否开放Prometheus格式的 /metrics 端点，指标包含按用户和工具的计数，默认关闭
+    METRICS_ENABLED: bool = False
+    # 访问 /metrics 所需的令牌，抓取时带上 Authorization: Bearer <令牌>；为空时只允许超级用户访问
+    METRICS_TOKEN: str | None = None
+
+    # AutoAgent事件存储配置
+    # 每个会话在内存中保留的最近事件数
+    AGENT_EVENT_STORE_CAPACITY: int = 500
+    # 每个会话在内存中保留的事件数据估算字节数上限，工具结果较大时先于事件数上限生效
+    AGENT_EVENT_STORE_MAX_BYTES: int = 2 * 1024 * 1024
+    # 完整事件历史的溢出目录，为空时超出容量的旧事件直接丢弃
+    AGENT_EVENT_SPILL_DIR: str | None = None
+
+    # 对话上下文配置
+    # 发送给AutoAgent的查询的token预算（估算值）
+    CONTEXT_TOKEN_BUDGET: int = 4000
+    # 其中为较早对话的滚动摘要预留的token预算
+    CONTEXT_SUMMARY_TOKEN_BUDGET: int = 800
+    # 摘要中每条消息保留的最大字符数
+    CONTEXT_SUMMARY_LINE_CHARS: int = 120
+
+    # 智能体回复缓存配置
+    # 全局开关，开启后仍需在智能体上单独启用
+    RESPONSE_CACHE_ENABLED: bool = False
+    # 最多缓存的回复数量
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    # 缓存有效期（秒）
+    RESPONSE_CACHE_TTL_SECONDS: int = 60 * 60
+
+    # 工具结果缓存配置
+    # 全局开关，开启后仍需在工具上单独启用；依赖AutoAgent的工具注册表，默认关闭
+    TOOL_CACHE_ENABLED: bool = False
+    # 最多缓存的工具结果数量
+    TOOL_CACHE_MAX_ENTRIES: int = 5000
+    # 工具未设置有效期时的默认有效期（秒）
+    TOOL_CACHE_DEFAULT_TTL_SECONDS: int = 10 * 60
+    # 单个结果的最大字节数，超出时不缓存
+    TOOL_CACHE_MAX_RESULT_BYTES: int = 64 * 1024
+    # 从数据库刷新工具缓存策略的间隔（秒）
+    TOOL_CACHE_POLICY_REFRESH_SECONDS: int = 60
+
+    # 对话时限配置
+    # 未指定时限的对话的默认时限（秒），0表示不限制
+    CHAT_DEFAULT_DEADLINE_SECONDS: float = 300
+    # 客户端可以指定的最长时限（秒），0表示不限制
+    CHAT_MAX_DEADLINE_SECONDS: float = 900
+
+    # 团队智能体配置
+    # 是否把团队智能体的请求并行分派给各成员，再由团队智能体汇总
+    AGENT_TEAM_FANOUT_ENABLED: bool = False
+    # 单次对话同时运行的成员分支数上限，不超过单用户的执行器并发上限
+    AGENT_TEAM_MAX_PARALLEL_BRANCHES: int = 4
+    # 单个成员分支的超时时间（秒），超时后取消该分支并使用已产生的部分结果
+    AGENT_TEAM_BRANCH_TIMEOUT_SECONDS: float = 120
+    # 汇总时每个成员结果保留的最大字符数
+    AGENT_TEAM_BRANCH_RESULT_MAX_CHARS: int = 4000
+
+    # 对话准入控制配置
+    # 同时运行的对话数上限，超出后按用户公平排队
+    ADMISSION_MAX_CONCURRENT_RUNS: int = 16
+    # 排队的对话数上限，超出后直接拒绝
+    ADMISSION_MAX_QUEUE: int = 128
+    # 排队等待超时（秒）
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 120
+    # 每个用户每分钟可发起的对话数和突发上限，速率为0表示不限制
+    ADMISSION_USER_RATE_PER_MINUTE: float = 20
+    ADMISSION_USER_BURST: int = 5
+    # 每个模型提供商每分钟可发起的对话数和突发上限
+    ADMISSION_PROVIDER_RATE_PER_MINUTE: float = 120
+    ADMISSION_PROVIDER_BURST: int = 20
+    # 超级用户在公平队列中的权重，普通用户为1
+    ADMISSION_SUPERUSER_WEIGHT: float = 2.0
+
+    # 会话状态存储配置
+    # memory 仅适用于单工作进程；多工作进程或多副本部署时使用 postgres
+    SESSION_STORE_BACKEND: Literal["memory", "postgres"] = "memory"
+    # 工作进程标识，用于粘性路由，为空时使用 主机名:进程号
+    WORKER_ID: str | None = None
+    # 每次向存储申请的事件序号数量，越大访问存储越少
+    SESSION_SEQUENCE_BLOCK_SIZE: int = 100
+
+    # WebSocket推送配置
+    # 批量推送的收集窗口（毫秒），连接时带上 ?batch=true 的客户端在窗口内的消息合并为一个 event_batch 帧
+    WS_EVENT_BATCH_WINDOW_MS: int = 30
+    # 单个 event_batch 帧最多包含的消息数
+    WS_EVENT_BATCH_MAX_EVENTS: int = 50
+    # 是否允许客户端通过子协议协商MessagePack/CBOR二进制编码，需安装对应的可选依赖
+    WS_BINARY_ENCODINGS_ENABLED: bool = True
+    # 连接时带上 ?compress=deflate 的客户端，编码后超过该字节数的帧用zlib压缩后以二进制帧发送
+    WS_COMPRESSION_THRESHOLD_BYTES: int = 16 * 1024
+    # zlib压缩级别，1最快，9压缩率最高
+    WS_COMPRESSION_LEVEL: int = 6
+    # 事件数据中超大字段的处理策略：none原样推送，truncate截断，offload截断并转存完整内容供前端按需获取
+    WS_OVERSIZED_FIELD_POLICY: Literal["none", "truncate", "offload"] = "offload"
+    # 单个事件字段推送的最大字符数
+    WS_EVENT_FIELD_MAX_CHARS: int = 32 * 1024
+    # 转存内容的总字符数上限，超出时淘汰最早转存的内容
+    WS_OFFLOAD_MAX_CHARS: int = 64 * 1024 * 1024
+    # 转存内容的有效期（秒）
+    WS_OFFLOAD_TTL_SECONDS: int = 10 * 60
+    # 每个连接发送队列的消息数上限
+    WS_SEND_QUEUE_MAX_MESSAGES: int = 1000
+    # 每个连接发送队列的字节数上限（按编码后的大小计算）
+    WS_SEND_QUEUE_MAX_BYTES: int = 8 * 1024 * 1024
+    # 发送队列满时的处理策略：drop_oldest丢弃最早的低优先级消息，coalesce先合并status_update，disconnect断开客户端
+    # 没有可丢弃的消息时都会断开客户端
+    WS_SEND_QUEUE_OVERFLOW_POLICY: Literal["drop_oldest", "coalesce", "disconnect"] = (
+        "coalesce"
+    )
+    # 每个会话重放缓冲保留的消息数上限，断线重连时从中补发客户端错过的消息
+    WS_REPLAY_MAX_MESSAGES: int = 500
+    # 每个会话重放缓冲的字节数上限
+    WS_REPLAY_MAX_BYTES: int = 4 * 1024 * 1024
+    # 重放缓冲中消息的保留时间（秒）
+    WS_REPLAY_TTL_SECONDS: int = 120
+    # 连接断开后保留会话（进行中的对话、智能体状态、重放缓冲）等待重连的时间（秒），0表示立即清理
+    WS_RESUME_GRACE_SECONDS: int = 30
+
 
 settings = Settings()  # type: ignore
@@ -0,0 +1,201 @@
+"""
+日志配置
+日志记录只在调用线程中入队，格式化和写出在后台监听线程中完成，支持JSON格式的滚动文件
+"""
+
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+from typing import Any
+
+from app.core.config import settings
+
+# 智能体事件使用的日志记录器
+agent_event_logger = logging.getLogger("app.agent_events")
+
+# 各类智能体事件的默认日志级别，未列出的事件按INFO记录
+AGENT_EVENT_LOG_LEVELS: dict[str, int] = {
+    "ai_thinking_start": logging.DEBUG,
+    "tool_call_start": logging.DEBUG,
+    "tool_call_complete": logging.DEBUG,
+    "ai_response": logging.DEBUG,
+    "query_start": logging.INFO,
+    "task_start": logging.INFO,
+    "task_complete": logging.INFO,
+    "agent_switch": logging.INFO,
+    "query_complete": logging.INFO,
+    "initialization_complete": logging.INFO,
+    "tool_call_error": logging.WARNING,
+    "query_error": logging.ERROR,
+    "autoagent_error": logging.ERROR,
+}
+
+# 高频事件按固定间隔采样记录；WARNING及以上级别的事件始终记录，不参与采样
+SAMPLED_EVENT_TYPES = frozenset(
+    {"ai_thinking_start", "tool_call_start", "tool_call_complete"}
+)
+
+# 结构化字段中字符串的最大长度，超出部分只记录长度
+MAX_FIELD_CHARS = 200
+
+# LogRecord自带的属性，其余属性视为结构化字段
+_RESERVED_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime"}
+
+_sample_counters: dict[str, itertools.count] = {}
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _compact(value: Any) -> Any:
+    """压缩结构化字段，避免把大段内容写入日志"""
+    if isinstance(value, str):
+        if len(value) > MAX_FIELD_CHARS:
+            return {"preview": value[:MAX_FIELD_CHARS], "length": len(value)}
+        return value
+    if isinstance(value, dict):
+        return {str(key): _compact(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [_compact(item) for item in value]
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    return _compact(str(value))
+
+
+def _record_fields(record: logging.LogRecord) -> dict[str, Any]:
+    return {
+        key: _compact(value)
+        for key, value in vars(record).items()
+        if key not in _RESERVED_RECORD_ATTRS
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        payload.update(_record_fields(record))
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """控制台输出，结构化字段以 key=value 附在消息之后"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = _record_fields(record)
+        if fields:
+            text += " " + " ".join(
+                f"{key}={json.dumps(value, ensure_ascii=False, default=str)}"
+                for key, value in fields.items()
+            )
+        return text
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    只入队不格式化的队列处理器
+
+    - 消息格式化推迟到监听线程，调用线程的开销只有一次入队
+    - 队列满时丢弃日志并计数，不阻塞调用方
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """配置根日志记录器，启动后台写日志的监听线程"""
+    global _listener
+    if _listener is not None:
+        return
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(ConsoleFormatter())
+    handlers: list[logging.Handler] = [console_handler]
+
+    if settings.LOG_JSON_FILE:
+        os.makedirs(os.path.dirname(settings.LOG_JSON_FILE) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            settings.LOG_JSON_FILE,
+            maxBytes=settings.LOG_FILE_MAX_BYTES,
+            backupCount=settings.LOG_FILE_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(NonBlockingQueueHandler(log_queue))
+    root_logger.setLevel(settings.LOG_LEVEL)
+    agent_event_logger.setLevel(settings.AGENT_EVENT_LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def shutdown_logging():
+    """停止监听线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _should_sample(event_type: str, level: int) -> bool:
+    every = settings.AGENT_EVENT_LOG_SAMPLE_EVERY
+    if every <= 1 or level >= logging.WARNING or event_type not in SAMPLED_EVENT_TYPES:
+        return True
+    counter = _sample_counters.get(event_type)
+    if counter is None:
+        counter = _sample_counters.setdefault(event_type, itertools.count())
+    return next(counter) % every == 0
+
+
+def log_agent_event(event_type: str, data: dict[str, Any], **context: Any):
+    """
+    记录一条智能体事件
+
+    级别未启用或未被采样时直接返回，WARNING及以上级别不采样；事件数据原样入队，压缩和序列化在监听线程中完成
+    """
+    level = AGENT_EVENT_LOG_LEVELS.get(event_type, logging.INFO)
+    if not agent_event_logger.isEnabledFor(level):
+        return
+    if not _should_sample(event_type, level):
+        return
+    agent_event_logger.log(
+        level,
+        event_type,
+        extra={"event_type": event_type, "event_data": data, **context},
+    )
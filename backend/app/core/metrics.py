@@ -0,0 +1,275 @@
+"""
+运行指标
+进程内的计数器、仪表和直方图，以Prometheus文本格式输出
+
+记录指标只需一次加锁和字典更新，可以在执行器线程中调用；仪表在抓取时才通过回调取值
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+# 直方图默认分桶（秒），覆盖从数据库查询到完整智能体运行的耗时
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"'
+        for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类，label_values 按 labelnames 的顺序传入"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _check_labels(self, label_values: LabelValues):
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(
+                f"指标 {self.name} 需要标签 {self.labelnames}，实际传入 {label_values}"
+            )
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        """返回 (样本名后缀, 标签值, 数值)"""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, label_values, value in self.samples():
+            names = self.labelnames
+            if suffix == "_bucket":
+                names = self.labelnames + ("le",)
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, label_values)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self._check_labels(label_values)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield "", label_values, value
+
+
+class Gauge(Metric):
+    """
+    仪表，抓取时调用collect取值
+
+    无标签时collect返回数值，有标签时返回 {标签值元组: 数值}
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], float | dict[LabelValues, float]],
+        labelnames: tuple[str, ...] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        value = self.collect()
+        if isinstance(value, dict):
+            for label_values, item in value.items():
+                yield "", label_values, item
+        else:
+            yield "", (), value
+
+
+class Histogram(Metric):
+    """分桶直方图，每个标签组合记录各桶计数、总和与次数"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（最后一个为+Inf）, 总和, 次数]
+        self._series: dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        self._check_labels(label_values)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """记录代码块的耗时，异常退出时同样记录"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, *label_values)
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        with self._lock:
+            items = [
+                (label_values, list(series[0]), series[1], series[2])
+                for label_values, series in self._series.items()
+            ]
+        for label_values, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (math.inf,), counts, strict=True
+            ):
+                cumulative += bucket_count
+                yield "_bucket", label_values + (_format_value(bound),), cumulative
+            yield "_sum", label_values, total
+            yield "_count", label_values, count
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], float | dict[LabelValues, float]],
+        labelnames: tuple[str, ...] = (),
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, collect, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """输出Prometheus文本格式，仪表回调异常时跳过该指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+# 对话各阶段耗时
+chat_stage_seconds = metrics_registry.histogram(
+    "alma_chat_stage_duration_seconds",
+    "Duration of each stage of a chat turn",
+    ("stage",),
+)
+
+# 对话轮次结果
+chat_turns_total = metrics_registry.counter(
+    "alma_chat_turns_total",
+    "Chat turns by channel and outcome",
+    ("channel", "outcome"),
+)
+
+# AutoAgent事件数
+agent_events_total = metrics_registry.counter(
+    "alma_agent_events_total",
+    "AutoAgent events received by event type",
+    ("event_type",),
+)
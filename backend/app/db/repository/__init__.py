@@ -33,6 +33,10 @@ from .conversation_crud import (
     get_recent_conversations_by_user,
     update_conversation,
 )
+from .conversation_summary_crud import (
+    get_conversation_summary,
+    upsert_conversation_summary,
+)
 from .llm_config_crud import (
     create_llm_config,
     delete_llm_config,
@@ -66,10 +70,21 @@ from .model_crud import (
     get_models_count_by_llm_config,
     update_model,
 )
+from .session_state_crud import (
+    allocate_session_sequence,
+    bind_session_state_worker,
+    clear_session_state,
+    get_session_state,
+    get_session_state_snapshot,
+    release_session_state_worker,
+    update_session_state_snapshot,
+    update_session_state_summary,
+)
 from .tool_crud import (
     create_tool,
     delete_tool,
     get_all_tools,
+    get_cacheable_tools,
     get_tool_by_id,
     get_tool_by_name,
     get_tools_count,
@@ -100,6 +115,9 @@ __all__ = [
     "update_conversation",
     "delete_conversation",
     "get_conversations_count_by_user",
+    # ConversationSummary CRUD
+    "get_conversation_summary",
+    "upsert_conversation_summary",
     # Message CRUD
     "create_message",
     "get_message_by_id",
@@ -130,6 +148,15 @@ __all__ = [
     "delete_llm_config",
     "get_decrypted_api_key",
     "get_llm_configs_count_by_user",
+    # SessionState CRUD
+    "get_session_state",
+    "bind_session_state_worker",
+    "release_session_state_worker",
+    "clear_session_state",
+    "update_session_state_summary",
+    "update_session_state_snapshot",
+    "get_session_state_snapshot",
+    "allocate_session_sequence",
     # Tool CRUD
     "create_tool",
     "get_tool_by_id",
@@ -139,6 +166,7 @@ __all__ = [
     "delete_tool",
     "search_tools_by_name",
     "get_tools_count",
+    "get_cacheable_tools",
     # Agent-Tools relationship CRUD
     "add_tool_to_agent",
     "remove_tool_from_agent",
@@ -0,0 +1,37 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlmodel import Session
+
+from app.models import ConversationSummary
+
+
+def get_conversation_summary(
+    *, session: Session, conversation_id: uuid.UUID
+) -> ConversationSummary | None:
+    """获取对话的滚动摘要"""
+    return session.get(ConversationSummary, conversation_id)
+
+
+def upsert_conversation_summary(
+    *,
+    session: Session,
+    conversation_id: uuid.UUID,
+    summary: str,
+    summarized_until: datetime | None,
+    summarized_count: int,
+    summarized_message_id: uuid.UUID | None = None,
+) -> ConversationSummary:
+    """创建或更新对话的滚动摘要"""
+    db_obj = session.get(ConversationSummary, conversation_id)
+    if db_obj is None:
+        db_obj = ConversationSummary(conversation_id=conversation_id)
+    db_obj.summary = summary
+    db_obj.summarized_until = summarized_until
+    db_obj.summarized_count = summarized_count
+    db_obj.summarized_message_id = summarized_message_id
+    db_obj.updated_at = datetime.now(timezone.utc)
+    session.add(db_obj)
+    session.commit()
+    session.refresh(db_obj)
+    return db_obj
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, or_, select, update
+
+from app.models import SessionState
+
+
+def get_session_state(*, session: Session, session_id: str) -> SessionState | None:
+    """获取会话状态"""
+    return session.get(SessionState, session_id)
+
+
+def _ensure_session_state(*, session: Session, session_id: str):
+    """会话状态不存在时创建，并发创建时以先写入的为准"""
+    session.exec(
+        insert(SessionState)
+        .values(
+            session_id=session_id,
+            event_sequence=0,
+            created_at=datetime.now(timezone.utc),
+            updated_at=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["session_id"])
+    )
+
+
+def bind_session_state_worker(
+    *, session: Session, session_id: str, worker_id: str, port: int | None
+) -> None:
+    """记录会话当前由哪个工作进程持有"""
+    _ensure_session_state(session=session, session_id=session_id)
+    session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .values(worker_id=worker_id, port=port, updated_at=datetime.now(timezone.utc))
+    )
+    session.commit()
+
+
+def release_session_state_worker(
+    *, session: Session, session_id: str, worker_id: str
+) -> None:
+    """工作进程释放会话，只清除自己持有的记录"""
+    session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .where(SessionState.worker_id == worker_id)
+        .values(worker_id=None, port=None, updated_at=datetime.now(timezone.utc))
+    )
+    session.commit()
+
+
+def clear_session_state(*, session: Session, session_id: str, worker_id: str) -> None:
+    """
+    清除会话状态，其他工作进程持有的会话不清除；
+    保留事件序号，会话之后重新使用时序号继续递增，客户端不会把新消息当作已收到的丢弃
+    """
+    session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .where(
+            or_(SessionState.worker_id.is_(None), SessionState.worker_id == worker_id)
+        )
+        .values(
+            worker_id=None,
+            port=None,
+            events_summary=None,
+            snapshot=None,
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+    session.commit()
+
+
+def update_session_state_summary(
+    *, session: Session, session_id: str, events_summary: dict[str, Any]
+) -> None:
+    """更新会话的事件摘要"""
+    _ensure_session_state(session=session, session_id=session_id)
+    session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .values(events_summary=events_summary, updated_at=datetime.now(timezone.utc))
+    )
+    session.commit()
+
+
+def update_session_state_snapshot(
+    *, session: Session, session_id: str, snapshot: bytes | None
+) -> None:
+    """保存或清除会话快照"""
+    _ensure_session_state(session=session, session_id=session_id)
+    session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .values(snapshot=snapshot, updated_at=datetime.now(timezone.utc))
+    )
+    session.commit()
+
+
+def get_session_state_snapshot(*, session: Session, session_id: str) -> bytes | None:
+    """读取会话快照"""
+    return session.exec(
+        select(SessionState.snapshot).where(SessionState.session_id == session_id)
+    ).first()
+
+
+def allocate_session_sequence(*, session: Session, session_id: str, count: int) -> int:
+    """原子地申请count个事件序号，返回申请到的最大序号"""
+    _ensure_session_state(session=session, session_id=session_id)
+    end = session.exec(
+        update(SessionState)
+        .where(SessionState.session_id == session_id)
+        .values(event_sequence=SessionState.event_sequence + count)
+        .returning(SessionState.event_sequence)
+    ).scalar_one()
+    session.commit()
+    return end
@@ -34,8 +34,13 @@ def get_all_tools(*, session: Session, skip: int = 0, limit: int = 100) -> list[
 
 
 def update_tool(*, session: Session, db_tool: Tool, tool_in: ToolUpdate) -> Tool:
-    """更新工具"""
+    """更新工具，参数定义或实现变化时递增版本"""
     tool_data = tool_in.model_dump(exclude_unset=True)
+    if any(
+        key in tool_data and tool_data[key] != getattr(db_tool, key)
+        for key in ("parameters", "implementation")
+    ):
+        tool_data["version"] = db_tool.version + 1
     db_tool.sqlmodel_update(tool_data)
     session.add(db_tool)
     session.commit()
@@ -53,6 +58,12 @@ def delete_tool(*, session: Session, tool_id: uuid.UUID) -> bool:
     return False
 
 
+def get_cacheable_tools(*, session: Session) -> list[Tool]:
+    """获取开启了结果缓存的工具"""
+    statement = select(Tool).where(Tool.is_cacheable)
+    return list(session.exec(statement).all())
+
+
 def search_tools_by_name(
     *, session: Session, search_term: str, limit: int = 50
 ) -> list[Tool]:
@@ -1,17 +1,53 @@
-from fastapi import FastAPI
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.routing import APIRoute
 
+from app.api.v1.dependencies import require_metrics_access
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.core.logging import setup_logging, shutdown_logging
+from app.core.metrics import metrics_registry
+from app.services.agent_executor import agent_executor
+from app.services.agent_service import agent_dialogue_service
+from app.services.session_store import session_store
+from app.services.tool_cache import tool_result_cache
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+    # 日志在后台线程中写出，需最先启动、最后关闭
+    setup_logging()
+    # 启动空闲AutoAgent实例的后台回收任务
+    agent_dialogue_service.instance_pool.start_reaper()
+    # 包装AutoAgent工具并定期刷新工具缓存策略，需在预热实例创建前完成
+    if settings.TOOL_CACHE_ENABLED and tool_result_cache.install():
+        tool_result_cache.start_refresher()
+    # 启动AutoAgent预热池，可配置为等待达到最小实例数后再接收请求
+    await agent_dialogue_service.warm_pool.start(
+        block=settings.AUTOAGENT_WARM_POOL_BLOCK_ON_STARTUP,
+        min_size=settings.AUTOAGENT_WARM_POOL_MIN_SIZE,
+        timeout=settings.AUTOAGENT_WARM_POOL_STARTUP_TIMEOUT_SECONDS,
+    )
+    yield
+    await agent_dialogue_service.warm_pool.stop()
+    await agent_dialogue_service.instance_pool.stop_reaper()
+    await tool_result_cache.stop_refresher()
+    # 关闭AutoAgent执行器线程池
+    agent_executor.shutdown()
+    shutdown_logging()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -26,4 +62,28 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+
+@app.middleware("http")
+async def add_worker_id_header(request: Request, call_next):
+    """在响应头中标明处理请求的工作进程，供负载均衡器做会话粘性路由"""
+    response = await call_next(request)
+    response.headers["X-Worker-Id"] = session_store.worker_id
+    return response
+
+
+@app.get(
+    "/metrics",
+    tags=["metrics"],
+    include_in_schema=False,
+    dependencies=[Depends(require_metrics_access)],
+)
+def metrics() -> PlainTextResponse:
+    """Prometheus文本格式的运行指标，需带上 METRICS_TOKEN 或超级用户的访问令牌"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return PlainTextResponse(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
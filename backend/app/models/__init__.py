@@ -1,9 +1,11 @@
 from .agent import Agent
 from .agent_tools import AgentTools
 from .conversation import Conversation
+from .conversation_summary import ConversationSummary
 from .llmconfig import LLMConfig
 from .message import Message
 from .model import Model
+from .session_state import SessionState
 from .tool import Tool
 from .user import User
 
@@ -11,9 +13,11 @@ __all__ = [
     "Agent",
     "AgentTools",
     "Conversation",
+    "ConversationSummary",
     "LLMConfig",
     "Message",
     "Model",
+    "SessionState",
     "Tool",
     "User",
 ]
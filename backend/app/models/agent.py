@@ -10,6 +10,8 @@ class Agent(SQLModel, table=True):
     team: list[str] | None = Field(default=None, sa_type=JSON)
     is_system_agent: bool = False
     status: str = Field(default="active")  # Literal["active", "disabled"]
+    # 是否对该智能体启用回复缓存，还需要全局开关 RESPONSE_CACHE_ENABLED
+    response_cache_enabled: bool = False
 
     model_id: uuid.UUID | None = Field(default=None, foreign_key="model.model_id")
     user_id: uuid.UUID | None = Field(
@@ -0,0 +1,19 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlmodel import Field, SQLModel, Text
+
+
+class ConversationSummary(SQLModel, table=True):
+    conversation_id: uuid.UUID = Field(
+        foreign_key="conversation.conversation_id",
+        primary_key=True,
+        ondelete="CASCADE",
+    )
+    summary: str = Field(default="", sa_type=Text)
+    # 已折叠进摘要的最后一条消息的时间，之后的消息尚未摘要
+    summarized_until: datetime | None = Field(default=None)
+    # 已折叠进摘要的最后一条消息，该消息及之前的消息不再放入历史对话或重复摘要
+    summarized_message_id: uuid.UUID | None = Field(default=None)
+    summarized_count: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlmodel import JSON, Field, LargeBinary, SQLModel
+
+
+class SessionState(SQLModel, table=True):
+    session_id: str = Field(primary_key=True, max_length=255)
+    # 当前持有该会话AutoAgent实例的工作进程，用于粘性路由
+    worker_id: str | None = Field(default=None, max_length=255)
+    port: int | None = Field(default=None)
+    # 已分配出去的最大事件序号，各工作进程按块申请
+    event_sequence: int = Field(default=0)
+    events_summary: dict[str, Any] | None = Field(default=None, sa_type=JSON)
+    # 压缩后的AutoAgent会话快照，实例被淘汰后用于恢复
+    snapshot: bytes | None = Field(default=None, sa_type=LargeBinary)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -10,3 +10,9 @@ class Tool(SQLModel, table=True):
     parameters: dict[str, Any] = Field(sa_type=JSON)
     description: str | None = Field(default=None, sa_type=Text)
     implementation: str | None = Field(default=None, sa_type=Text)
+    # 是否缓存该工具的调用结果，只应对相同参数总是返回相同结果的工具开启
+    is_cacheable: bool = False
+    # 结果缓存的有效期（秒），为空时使用 TOOL_CACHE_DEFAULT_TTL_SECONDS
+    cache_ttl_seconds: int | None = None
+    # 工具版本，参数定义或实现变化时递增，旧版本的缓存结果随之失效
+    version: int = 1
@@ -9,6 +9,7 @@ class AgentBase(BaseModel):
     team: list[str] | None = None
     is_system_agent: bool = False
     status: str = Field(default="active")  # "active" or "disabled"
+    response_cache_enabled: bool = False
 
 
 class AgentCreate(AgentBase):
@@ -20,6 +21,7 @@ class AgentUpdate(BaseModel):
     instruction: str | None = None
     team: list[str] | None = None
     status: str | None = None
+    response_cache_enabled: bool | None = None
     model_id: uuid.UUID | None = None
 
 
@@ -9,6 +9,8 @@ class ToolBase(BaseModel):
     parameters: dict[str, Any]
     description: str | None = None
     implementation: str | None = None
+    is_cacheable: bool = False
+    cache_ttl_seconds: int | None = Field(default=None, ge=1)
 
 
 class ToolCreate(ToolBase):
@@ -20,10 +22,13 @@ class ToolUpdate(BaseModel):
     parameters: dict[str, Any] | None = None
     description: str | None = None
     implementation: str | None = None
+    is_cacheable: bool | None = None
+    cache_ttl_seconds: int | None = Field(default=None, ge=1)
 
 
 class ToolPublic(ToolBase):
     tool_id: uuid.UUID
+    version: int
 
 
 class ToolsPublic(BaseModel):
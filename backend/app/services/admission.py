@@ -0,0 +1,398 @@
+"""
+对话准入控制
+按用户和模型提供商做令牌桶限流，并发已满时按用户加权公平排队
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import chat_stage_seconds
+from app.db.repository import get_llm_config_by_id
+from app.models import Model
+from app.services.cancellation import DEADLINE_EXCEEDED
+
+# 未指定模型时使用的提供商标识
+DEFAULT_PROVIDER = "default"
+
+# 令牌桶数量超过该值时清理已回满的桶
+MAX_IDLE_BUCKETS = 10000
+
+
+class AdmissionRejectedError(Exception):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, reason: str, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶，rate为每秒补充的令牌数，capacity为突发上限"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        # 调用方可能在创建桶之前取的时间，时间倒退时不补充也不扣减
+        if now <= self.updated_at:
+            return
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """距离有可用令牌还需等待的秒数，0表示当前可用"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def refund(self):
+        """归还一个令牌，用于扣减后未能运行的请求"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Waiter:
+    __slots__ = ("tag", "seq", "user_key", "admitted", "cancelled", "changed")
+
+    def __init__(self, tag: float, seq: int, user_key: str):
+        self.tag = tag
+        self.seq = seq
+        self.user_key = user_key
+        self.admitted = False
+        self.cancelled = False
+        self.changed = asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class AdmissionController:
+    """
+    对话准入控制器
+
+    - 每个用户、每个提供商各有一个令牌桶，任一桶为空时直接拒绝
+    - 同时运行的对话数达到上限后进入等待队列，队列满或等待超时时拒绝
+    - 队列已满时在扣减令牌之前拒绝；排队超时或取消时归还已扣减的令牌
+    - 截止时间已到的请求以 deadline_exceeded 拒绝，排队超过截止时间时同样如此
+    - 等待队列按开始时间公平排队：每个请求的标签为
+      max(全局虚拟时间, 该用户上一个标签) + 1/权重，标签最小的先运行
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float,
+        user_rate: float,
+        user_burst: int,
+        provider_rate: float,
+        provider_burst: int,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.provider_rate = provider_rate
+        self.provider_burst = provider_burst
+
+        self.running = 0
+        self._queue: list[_Waiter] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._user_tags: dict[str, float] = {}
+        self._user_buckets: dict[str, TokenBucket] = {}
+        self._provider_buckets: dict[str, TokenBucket] = {}
+
+        # 统计计数
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_deadline = 0
+        self.total_queue_wait = 0.0
+
+    def _bucket(
+        self,
+        buckets: dict[str, TokenBucket],
+        key: str,
+        rate: float,
+        capacity: int,
+        now: float,
+    ) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_IDLE_BUCKETS:
+                for idle_key in [k for k, b in buckets.items() if b.is_full(now)]:
+                    del buckets[idle_key]
+            bucket = TokenBucket(rate, capacity)
+            buckets[key] = bucket
+        return bucket
+
+    def _check_rate_limits(self, user_key: str, provider: str) -> list[TokenBucket]:
+        """
+        同时检查用户和提供商的令牌桶，都有令牌时才扣减，速率为0表示不限制
+
+        Returns:
+            已扣减令牌的桶，请求最终没有运行时据此归还
+        """
+        now = time.monotonic()
+        buckets: list[TokenBucket] = []
+
+        if self.user_rate > 0:
+            user_bucket = self._bucket(
+                self._user_buckets,
+                user_key,
+                self.user_rate / 60,
+                self.user_burst,
+                now,
+            )
+            user_wait = user_bucket.wait_time(now)
+            if user_wait > 0:
+                self.rejected_rate_limited += 1
+                raise AdmissionRejectedError(
+                    "user_rate_limited", "请求过于频繁，请稍后再试", user_wait
+                )
+            buckets.append(user_bucket)
+
+        if self.provider_rate > 0:
+            provider_bucket = self._bucket(
+                self._provider_buckets,
+                provider,
+                self.provider_rate / 60,
+                self.provider_burst,
+                now,
+            )
+            provider_wait = provider_bucket.wait_time(now)
+            if provider_wait > 0:
+                self.rejected_rate_limited += 1
+                raise AdmissionRejectedError(
+                    "provider_rate_limited",
+                    f"模型提供商 {provider} 请求过于频繁，请稍后再试",
+                    provider_wait,
+                )
+            buckets.append(provider_bucket)
+
+        for bucket in buckets:
+            bucket.take()
+        return buckets
+
+    def _position(self, waiter: _Waiter) -> int:
+        """等待者在队列中的位置，从1开始"""
+        return 1 + sum(
+            1
+            for other in self._queue
+            if not other.cancelled and not other.admitted and other < waiter
+        )
+
+    def _notify_waiters(self):
+        for waiter in self._queue:
+            waiter.changed.set()
+
+    def _dispatch(self):
+        """有空闲名额时按标签顺序放行等待者"""
+        dispatched = False
+        while self._queue and self.running < self.max_concurrent:
+            waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            self._queued -= 1
+            self._virtual_time = max(self._virtual_time, waiter.tag)
+            waiter.admitted = True
+            self.running += 1
+            waiter.changed.set()
+            dispatched = True
+        if dispatched:
+            self._notify_waiters()
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _remove_waiter(self, waiter: _Waiter):
+        waiter.cancelled = True
+        self._queued -= 1
+        self._notify_waiters()
+
+    async def _wait_in_queue(
+        self,
+        waiter: _Waiter,
+        on_queued: Callable[[int, int], Awaitable[None]] | None,
+        queue_timeout: float,
+        deadline_bound: bool,
+    ):
+        deadline = time.monotonic() + queue_timeout
+        last_position = None
+        try:
+            while not waiter.admitted:
+                waiter.changed.clear()
+                position = self._position(waiter)
+                if on_queued is not None and position != last_position:
+                    last_position = position
+                    await on_queued(position, self._queued)
+                    if waiter.admitted:
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(waiter.changed.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            if waiter.admitted:
+                return
+            self._remove_waiter(waiter)
+            if deadline_bound:
+                self.rejected_deadline += 1
+                raise AdmissionRejectedError(
+                    DEADLINE_EXCEEDED, "排队期间对话已超过时限", 0.0
+                ) from None
+            self.rejected_timeout += 1
+            raise AdmissionRejectedError(
+                "queue_timeout", "排队等待超时，请稍后再试", 0.0
+            ) from None
+        except BaseException:
+            # 调用方被取消时归还名额或退出队列
+            if waiter.admitted:
+                self._release()
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id: Any,
+        provider: str = DEFAULT_PROVIDER,
+        weight: float = 1.0,
+        on_queued: Callable[[int, int], Awaitable[None]] | None = None,
+        queue_timeout: float | None = None,
+    ) -> AsyncIterator[None]:
+        """
+        申请运行名额，退出上下文时归还
+
+        Args:
+            user_id: 用户ID
+            provider: 模型提供商，用于提供商级限流
+            weight: 用户权重，权重越大排队时获得的份额越多
+            on_queued: 排队位置变化时的回调，参数为 (位置, 队列长度)
+            queue_timeout: 本次请求的最长排队时间，不超过全局排队超时，用于对话截止时间
+
+        Raises:
+            AdmissionRejectedError: 被限流、队列已满、排队超时或已超过截止时间
+        """
+        if queue_timeout is not None and queue_timeout <= 0:
+            self.rejected_deadline += 1
+            raise AdmissionRejectedError(DEADLINE_EXCEEDED, "对话已超过时限", 0.0)
+
+        user_key = str(user_id)
+        must_queue = self.running >= self.max_concurrent or self._queued > 0
+        if must_queue and self._queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejectedError(
+                "queue_full", "服务繁忙，排队人数已满，请稍后再试", 0.0
+            )
+        taken = self._check_rate_limits(user_key, provider)
+
+        started_at = time.monotonic()
+        if not must_queue:
+            self.running += 1
+        else:
+            tag = max(self._virtual_time, self._user_tags.get(user_key, 0.0)) + (
+                1.0 / max(weight, 1e-6)
+            )
+            self._user_tags[user_key] = tag
+            waiter = _Waiter(tag, next(self._seq), user_key)
+            heapq.heappush(self._queue, waiter)
+            self._queued += 1
+            self.queued_total += 1
+            timeout = self.queue_timeout
+            deadline_bound = queue_timeout is not None and queue_timeout < timeout
+            if deadline_bound:
+                timeout = queue_timeout
+            try:
+                await self._wait_in_queue(waiter, on_queued, timeout, deadline_bound)
+            except BaseException:
+                if not waiter.admitted:
+                    for bucket in taken:
+                        bucket.refund()
+                raise
+
+        queue_wait = time.monotonic() - started_at
+        self.admitted += 1
+        self.total_queue_wait += queue_wait
+        chat_stage_seconds.observe(queue_wait, "admission_queue")
+        try:
+            yield
+        finally:
+            self._release()
+            # 没有排队和运行中的请求时重置虚拟时间，避免标签无限增长
+            if self.running == 0 and self._queued == 0:
+                self._virtual_time = 0.0
+                self._user_tags.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取准入控制统计信息"""
+        return {
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_deadline": self.rejected_deadline,
+            "avg_queue_wait": self.total_queue_wait / self.admitted
+            if self.admitted
+            else 0.0,
+            "user_buckets": len(self._user_buckets),
+            "provider_buckets": len(self._provider_buckets),
+        }
+
+
+def resolve_provider(session: Session, model: Model | None) -> str:
+    """根据模型找到所属的提供商，用于提供商级限流"""
+    if model is None:
+        return DEFAULT_PROVIDER
+    llm_config = get_llm_config_by_id(session=session, llm_id=model.llm_id)
+    return llm_config.provider if llm_config else DEFAULT_PROVIDER
+
+
+def admission_weight(is_superuser: bool) -> float:
+    """用户在公平队列中的权重"""
+    return settings.ADMISSION_SUPERUSER_WEIGHT if is_superuser else 1.0
+
+
+# 全局准入控制器实例
+admission_controller = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT_RUNS,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    user_rate=settings.ADMISSION_USER_RATE_PER_MINUTE,
+    user_burst=settings.ADMISSION_USER_BURST,
+    provider_rate=settings.ADMISSION_PROVIDER_RATE_PER_MINUTE,
+    provider_burst=settings.ADMISSION_PROVIDER_BURST,
+)
@@ -0,0 +1,180 @@
+"""
+AutoAgent执行器
+将同步的AutoAgent调用放到有界线程池中执行，避免阻塞事件循环
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from app.core.config import settings
+
+
+class AgentExecutorBusyError(Exception):
+    """等待队列已满，拒绝新的AutoAgent任务"""
+
+
+class AgentExecutor:
+    """
+    AutoAgent任务执行器
+
+    - 所有AutoAgent的同步调用（initialize、process_query等）都通过这里进入线程池
+    - 全局并发上限等于线程池大小，单用户并发另有上限
+    - 等待中的任务数量超过上限时直接拒绝，防止无限排队
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_concurrent_per_user: int,
+        max_queue_size: int,
+    ):
+        self.max_workers = max_workers
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.max_queue_size = max_queue_size
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._global_semaphore = asyncio.Semaphore(max_workers)
+        self._user_semaphores: dict[str, asyncio.Semaphore] = {}
+        # 每个用户正在等待或运行的任务数，用于回收信号量
+        self._user_tasks: dict[str, int] = {}
+
+        # 运行指标
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="autoagent"
+            )
+        return self._executor
+
+    def _acquire_user_slot(self, user_key: str) -> asyncio.Semaphore:
+        if user_key not in self._user_semaphores:
+            self._user_semaphores[user_key] = asyncio.Semaphore(
+                self.max_concurrent_per_user
+            )
+        self._user_tasks[user_key] = self._user_tasks.get(user_key, 0) + 1
+        return self._user_semaphores[user_key]
+
+    def _release_user_slot(self, user_key: str):
+        self._user_tasks[user_key] -= 1
+        if self._user_tasks[user_key] <= 0:
+            del self._user_tasks[user_key]
+            del self._user_semaphores[user_key]
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        user_id: Any = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        在线程池中执行同步函数
+
+        Args:
+            func: 需要执行的同步函数
+            user_id: 发起任务的用户，用于单用户并发限制
+        """
+        if self.queue_depth >= self.max_queue_size:
+            self.rejected += 1
+            raise AgentExecutorBusyError(
+                f"智能体任务队列已满({self.queue_depth}/{self.max_queue_size})，请稍后再试"
+            )
+
+        user_key = str(user_id) if user_id is not None else "anonymous"
+        user_semaphore = self._acquire_user_slot(user_key)
+
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        enqueued_at = time.monotonic()
+        acquired_user = False
+        acquired_global = False
+        try:
+            await user_semaphore.acquire()
+            acquired_user = True
+            await self._global_semaphore.acquire()
+            acquired_global = True
+        except BaseException:
+            if acquired_user:
+                user_semaphore.release()
+            self._release_user_slot(user_key)
+            raise
+        finally:
+            self.queue_depth -= 1
+
+        started_at = time.monotonic()
+        self.total_wait_time += started_at - enqueued_at
+        self.running += 1
+
+        loop = asyncio.get_running_loop()
+
+        def release_slots(_future):
+            # 线程真正结束后才释放名额，即使等待方已被取消
+            def release():
+                self.running -= 1
+                self.total_run_time += time.monotonic() - started_at
+                if acquired_global:
+                    self._global_semaphore.release()
+                user_semaphore.release()
+                self._release_user_slot(user_key)
+
+            loop.call_soon_threadsafe(release)
+
+        ctx = contextvars.copy_context()
+        concurrent_future = self._get_executor().submit(
+            ctx.run, functools.partial(func, *args, **kwargs)
+        )
+        concurrent_future.add_done_callback(release_slots)
+
+        try:
+            result = await asyncio.wrap_future(concurrent_future)
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取执行器运行指标"""
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrent_per_user": self.max_concurrent_per_user,
+            "max_queue_size": self.max_queue_size,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "active_users": len(self._user_tasks),
+            "avg_wait_seconds": self.total_wait_time / finished if finished else 0.0,
+            "avg_run_seconds": self.total_run_time / finished if finished else 0.0,
+        }
+
+    def shutdown(self):
+        """关闭线程池，取消尚未开始的任务"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局执行器实例
+agent_executor = AgentExecutor(
+    max_workers=settings.AGENT_EXECUTOR_MAX_WORKERS,
+    max_concurrent_per_user=settings.AGENT_EXECUTOR_MAX_PER_USER,
+    max_queue_size=settings.AGENT_EXECUTOR_MAX_QUEUE,
+)
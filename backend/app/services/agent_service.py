@@ -3,197 +3,552 @@
 直接集成AutoAgent功能，提供完整的多智能体对话能力
 """
 
+import asyncio
+import contextvars
+import logging
+import os
+import tempfile
+import time
 import uuid
+import weakref
+from collections.abc import Awaitable, Callable
 from datetime import datetime
 from typing import Any
 
+# 导入AutoAgent库
+from autoagent.api import AgentEvent, AutoAgentAPI
 from sqlmodel import Session
 
+from app.core.config import settings
+from app.core.logging import log_agent_event
+from app.core.metrics import agent_events_total, chat_stage_seconds, metrics_registry
 from app.models import Agent, Message
-
-# 导入AutoAgent库
-from autoagent.api import AutoAgentAPI, AgentEvent
+from app.services.admission import admission_controller
+from app.services.agent_executor import AgentExecutorBusyError, agent_executor
+from app.services.cancellation import (
+    CANCEL_CHECKPOINT_EVENT_TYPES,
+    DEADLINE_EXCEEDED,
+    AgentRunCancelled,
+    CancelToken,
+)
+from app.services.context_builder import context_builder
+from app.services.event_bridge import AgentEventBridge
+from app.services.event_store import SessionEventStore
+from app.services.instance_pool import AutoAgentInstancePool, PooledInstance
+from app.services.payload_store import payload_store
+from app.services.port_allocator import PortLeaseManager, resolve_worker_port_range
+from app.services.response_cache import is_response_cache_enabled, response_cache
+from app.services.session_snapshot import (
+    dump_snapshot,
+    load_snapshot,
+    restore_snapshot,
+)
+from app.services.session_store import session_store
+from app.services.single_flight import SingleFlight, message_digest
+from app.services.team_orchestrator import TeamOrchestrator
+from app.services.tool_cache import tool_result_cache
+from app.services.warm_pool import WarmInstancePool
+
+logger = logging.getLogger(__name__)
+
+# 执行器线程中正在运行的查询的取消令牌；AutoAgent在调用process_query的线程中同步回调事件，
+# 每次查询的令牌互不影响，超时后仍在运行的查询不会读到下一轮对话的令牌
+_run_cancel_token: contextvars.ContextVar[CancelToken | None] = contextvars.ContextVar(
+    "autoagent_run_cancel_token", default=None
+)
 
 
 class AutoAgentEventHandler:
     """AutoAgent事件处理器，用于收集和处理智能体事件"""
 
-    def __init__(self):
-        self.events_log: list[AgentEvent] = []
-        self.current_session_events: list[AgentEvent] = []
+    def __init__(self, spill_path: str | None = None):
+        # 定长环形缓冲区，单会话事件内存有上限
+        self.event_store = SessionEventStore(
+            capacity=settings.AGENT_EVENT_STORE_CAPACITY,
+            spill_path=spill_path,
+            max_bytes=settings.AGENT_EVENT_STORE_MAX_BYTES,
+        )
+        # 当前绑定的会话，预热实例在被取用时设置
+        self.session_id: str | None = None
+        # 实时推送的事件出口，由对话服务在每轮对话期间设置
+        self.realtime_sink: Callable[[AgentEvent], Any] | None = None
 
     def handle_event(self, event: AgentEvent):
         """处理AutoAgent事件，参考api_usage_example的事件处理方式"""
-        self.events_log.append(event)
-        self.current_session_events.append(event)
-
-        # 根据事件类型进行不同处理，参考api_usage_example
-        if event.event_type == "task_start":
-            print(f"🚀 任务开始: {event.data.get('user_query', '')}")
-            print(f"📋 使用智能体: {event.data.get('agent_name', '')}")
-
-        elif event.event_type == "ai_thinking_start":
-            print(
-                f"🤔 {event.data.get('agent_name', '')} 开始思考... (第 {event.data.get('turn', '')} 轮)"
-            )
-
-        elif event.event_type == "ai_response":
-            agent_name = event.data.get("agent_name", "")
-            content = event.data.get("content", "")
-            has_tools = event.data.get("has_tool_calls", False)
-
-            print(
-                f"💭 {agent_name} 回复: {content[:100]}{'...' if len(content) > 100 else ''}"
-            )
-            if has_tools:
-                tool_calls = event.data.get("tool_calls", [])
-                print(f"🔧 准备调用工具: {[tc['name'] for tc in tool_calls]}")
-
-        elif event.event_type == "tool_call_start":
-            tool_name = event.data.get("tool_name", "")
-            agent_name = event.data.get("agent_name", "")
-            print(f"⚡ {agent_name} 开始调用工具: {tool_name}")
-
-        elif event.event_type == "tool_call_complete":
-            tool_name = event.data.get("tool_name", "")
-            agent_name = event.data.get("agent_name", "")
-            result = (
-                event.data.get("tool_result", "")[:100] + "..."
-                if len(event.data.get("tool_result", "")) > 100
-                else event.data.get("tool_result", "")
-            )
-            print(f"✅ {agent_name} 完成工具调用: {tool_name}")
-            print(f"📄 工具结果: {result}")
-
-        elif event.event_type == "agent_switch":
-            from_agent = event.data.get("from_agent", "")
-            to_agent = event.data.get("to_agent", "")
-            reason = event.data.get("reason", "")
-            print(f"🔄 智能体切换: {from_agent} -> {to_agent} ({reason})")
-
-        elif event.event_type == "task_complete":
-            agent_name = event.data.get("agent_name", "")
-            turns = event.data.get("total_turns", 0)
-            print(f"🎉 任务完成! 智能体: {agent_name}, 总轮数: {turns}")
-
-        elif event.event_type == "query_complete":
-            result = (
-                event.data.get("result", "")[:200] + "..."
-                if len(event.data.get("result", "")) > 200
-                else event.data.get("result", "")
-            )
-            print(f"📋 最终结果: {result}")
-
-        elif event.event_type == "initialization_complete":
-            print(f"📦 AutoAgent初始化完成")
-            available_agents = event.data.get("available_agents", [])
-            print(f"📋 可用智能体: {available_agents}")
-
-        elif event.event_type == "query_start":
-            print(f"🔍 开始处理查询: {event.data.get('query', '')}")
-
-        elif event.event_type == "query_error":
-            print(f"❌ 查询处理错误: {event.data.get('error', '')}")
-
-        print("-" * 50)
+        agent_events_total.inc(event.event_type)
+        self.event_store.append(event.event_type, event.timestamp, event.data)
+
+        # 在开始新的模型调用或工具调用前检查取消，异常会中断process_query
+        cancel_token = _run_cancel_token.get()
+        if (
+            cancel_token is not None
+            and event.event_type in CANCEL_CHECKPOINT_EVENT_TYPES
+        ):
+            cancel_token.raise_if_cancelled()
+
+        # 先转交实时推送，避免被下面的日志输出拖慢
+        realtime_sink = self.realtime_sink
+        if realtime_sink is not None:
+            realtime_sink(event)
+
+        # 结构化日志只在调用线程入队，按事件类型分级并对高频事件采样
+        log_agent_event(event.event_type, event.data, session_id=self.session_id)
+
+    def add_event(self, event_type: str, data: dict) -> dict[str, Any]:
+        """记录服务端产生的事件（如备用响应），返回事件字典"""
+        record = self.event_store.append(event_type, datetime.now().isoformat(), data)
+        return record.to_dict()
 
     def get_current_session_events(self) -> list[dict[str, Any]]:
         """获取当前会话的事件"""
-        return [event.to_dict() for event in self.current_session_events]
+        return [record.to_dict() for record in self.event_store.current_turn_events()]
 
     def clear_current_session(self):
         """清除当前会话的事件"""
-        self.current_session_events.clear()
+        self.event_store.start_turn()
 
     def get_events_summary(self) -> dict[str, Any]:
         """获取事件摘要"""
-        event_types = {}
-        for event in self.current_session_events:
-            event_types[event.event_type] = event_types.get(event.event_type, 0) + 1
+        return self.event_store.get_turn_summary()
 
-        return {
-            "total_events": len(self.current_session_events),
-            "event_types": event_types,
-            "timeline": [
-                (event.timestamp, event.event_type)
-                for event in self.current_session_events
-            ],
-        }
+    def get_partial_response(self) -> str:
+        """当前一轮对话中已产生的回复内容，用于保存被取消的对话"""
+        contents = [
+            record.data.get("content", "")
+            for record in self.event_store.current_turn_events()
+            if record.event_type == "ai_response"
+        ]
+        return "\n\n".join(content for content in contents if content)
+
+    def get_statistics(self) -> dict[str, Any]:
+        """获取会话累计统计"""
+        return self.event_store.get_statistics()
+
+    def close(self):
+        """释放事件存储占用的文件"""
+        self.event_store.close()
 
 
 class AgentDialogueService:
     """智能体对话服务类，直接集成AutoAgent功能"""
 
     def __init__(self):
-        # 存储不同会话的AutoAgent实例和事件处理器
-        self.autoagent_instances: dict[str, AutoAgentAPI] = {}
-        self.event_handlers: dict[str, AutoAgentEventHandler] = {}
+        # AutoAgent实例端口的租约管理，同一台机器上的工作进程各用一段端口
+        port_start, port_end, worker_slot = resolve_worker_port_range(
+            settings.AUTOAGENT_PORT_RANGE_START,
+            settings.AUTOAGENT_PORT_RANGE_END,
+            slots=settings.AUTOAGENT_PORT_WORKER_SLOTS,
+            worker_index=settings.AUTOAGENT_PORT_WORKER_INDEX,
+            lock_dir=settings.AUTOAGENT_PORT_LOCK_DIR or tempfile.gettempdir(),
+        )
+        self.port_leases = PortLeaseManager(
+            port_start=port_start,
+            port_end=port_end,
+            check_available=settings.AUTOAGENT_PORT_CHECK_AVAILABLE,
+            worker_slot=worker_slot,
+        )
+        # 存储不同会话的AutoAgent实例和事件处理器，按LRU和空闲超时淘汰
+        self.instance_pool = AutoAgentInstancePool(
+            max_instances=settings.AUTOAGENT_POOL_MAX_INSTANCES,
+            idle_ttl=settings.AUTOAGENT_POOL_IDLE_TTL_SECONDS,
+            reap_interval=settings.AUTOAGENT_POOL_REAP_INTERVAL_SECONDS,
+        )
+        self.instance_pool.add_evict_callback(self._on_instance_evicted)
+        # 预热实例池，新会话优先从这里取已初始化的实例
+        self.warm_pool = WarmInstancePool(
+            factory=self._create_warm_instance,
+            target_size=settings.AUTOAGENT_WARM_POOL_SIZE,
+            on_discard=self._discard_instance,
+        )
+        # 进行中对话轮次的合并，键为 (会话ID, 消息哈希)
+        self.single_flight = SingleFlight()
+        # 会话锁，没有调用方持有时自动回收
+        self._session_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
 
-    def _get_or_create_autoagent_instance(
-        self, session_id: str
-    ) -> tuple[AutoAgentAPI, AutoAgentEventHandler]:
-        """获取或创建AutoAgent实例和事件处理器"""
+        # 团队智能体的并行分派
+        self.team_orchestrator = TeamOrchestrator(
+            self,
+            max_parallel=settings.AGENT_TEAM_MAX_PARALLEL_BRANCHES,
+            branch_timeout=settings.AGENT_TEAM_BRANCH_TIMEOUT_SECONDS,
+            result_max_chars=settings.AGENT_TEAM_BRANCH_RESULT_MAX_CHARS,
+        )
 
-        if session_id not in self.autoagent_instances:
-            # 创建事件处理器
-            event_handler = AutoAgentEventHandler()
+        # 会话快照统计
+        self.snapshots_saved = 0
+        self.snapshots_restored = 0
+        self.snapshot_failures = 0
 
-            # 创建AutoAgent API实例，参考api_usage_example的用法
-            # 使用本地环境避免Docker相关的序列化问题
+    def _on_instance_evicted(self, entry: PooledInstance, reason: str):
+        """
+        实例被淘汰或清理时释放其端口租约和事件存储
+
+        只有因空闲或LRU被淘汰的实例保存会话快照，显式清理的会话不会再恢复
+        """
+        if reason in ("idle", "lru"):
+            self._save_session_snapshot(entry)
+        if entry.port is not None:
+            self.port_leases.release(entry.port)
+        entry.event_handler.close()
+        session_store.submit(session_store.release, entry.session_id)
+
+    def _retire_instance(self, entry: PooledInstance):
+        """
+        释放已移出实例池的超时实例，在其线程结束后调用
+
+        会话此时可能已绑定新实例，不保存快照，也不修改会话状态存储中的归属
+        """
+        if entry.port is not None:
+            self.port_leases.release(entry.port)
+        entry.event_handler.close()
+
+    def remember_session_state(self, session_id: str, result: dict[str, Any]):
+        """记录查询返回的消息和上下文变量，实例淘汰时据此生成快照"""
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
+            entry.session_state = {
+                "messages": result.get("messages") or [],
+                "context_variables": result.get("context_variables") or {},
+            }
+
+    def _save_session_snapshot(self, entry: PooledInstance):
+        """把实例的会话状态压缩后写入会话状态存储"""
+        if not settings.AUTOAGENT_SNAPSHOT_ENABLED or entry.session_state is None:
+            return
+        try:
+            snapshot = dump_snapshot(
+                entry.session_state["messages"],
+                entry.session_state["context_variables"],
+            )
+            session_store.submit(
+                session_store.save_snapshot, entry.session_id, snapshot
+            )
+            self.snapshots_saved += 1
+        except Exception as e:
+            self.snapshot_failures += 1
+            logger.warning("保存会话快照失败: %s", e)
+
+    async def _load_session_snapshot(self, session_id: str) -> bytes | None:
+        """读取会话之前保存的快照，没有快照或未开启时返回None"""
+        if not settings.AUTOAGENT_SNAPSHOT_ENABLED:
+            return None
+        try:
+            return await session_store.call(session_store.load_snapshot, session_id)
+        except Exception as e:
+            self.snapshot_failures += 1
+            logger.warning("读取会话快照失败: %s", e)
+            return None
+
+    def _restore_session_snapshot(self, entry: PooledInstance, data: bytes | None):
+        """新实例绑定会话时恢复 _load_session_snapshot 读取的快照，恢复后从存储中删除"""
+        if data is None:
+            return
+        try:
+            snapshot = load_snapshot(data)
+            if snapshot is not None and restore_snapshot(entry.api, snapshot):
+                entry.session_state = {
+                    "messages": snapshot["messages"],
+                    "context_variables": snapshot["context_variables"],
+                }
+                self.snapshots_restored += 1
+                logger.info("已恢复会话快照: %s", entry.session_id)
+            session_store.submit(session_store.save_snapshot, entry.session_id, None)
+        except Exception as e:
+            self.snapshot_failures += 1
+            logger.warning("恢复会话快照失败: %s", e)
+
+    def _save_events_summary(
+        self, session_id: str, event_handler: AutoAgentEventHandler
+    ):
+        """把会话的事件统计写入共享存储，其他工作进程可以查询"""
+        statistics = event_handler.get_statistics()
+        statistics["tools_used"] = sorted(statistics["tools_used"])
+        session_store.submit(
+            session_store.update_events_summary, session_id, statistics
+        )
+
+    def _discard_instance(
+        self, instance: tuple[AutoAgentAPI, AutoAgentEventHandler, int]
+    ):
+        """丢弃未放入实例池的实例"""
+        _, event_handler, port = instance
+        self.port_leases.release(port)
+        event_handler.close()
+
+    def _create_autoagent_instance(
+        self, instance_name: str
+    ) -> tuple[AutoAgentAPI, AutoAgentEventHandler, int]:
+        """创建并初始化AutoAgent实例，同步执行，需在执行器线程中调用"""
+        # 创建事件处理器，配置了溢出目录时完整事件历史写入磁盘
+        spill_path = None
+        if settings.AGENT_EVENT_SPILL_DIR:
+            spill_path = os.path.join(
+                settings.AGENT_EVENT_SPILL_DIR, f"{instance_name}.jsonl"
+            )
+        event_handler = AutoAgentEventHandler(spill_path=spill_path)
+
+        # 从端口范围中租用端口，实例淘汰时归还
+        port = self.port_leases.lease(instance_name)
+
+        # 创建AutoAgent API实例，参考api_usage_example的用法
+        # 使用本地环境避免Docker相关的序列化问题
+        try:
             api = AutoAgentAPI(
-                container_name=f"alma_agent_{session_id}",
-                port=12347 + hash(session_id) % 1000,  # 避免端口冲突
+                container_name=f"alma_agent_{instance_name}",
+                port=port,
                 local_env=True,  # 改为本地环境，避免序列化问题
             )
+        except Exception:
+            self.port_leases.release(port)
+            raise
 
-            # 添加事件回调，这是关键步骤
-            api.add_event_callback(event_handler.handle_event)
+        # 添加事件回调，这是关键步骤
+        api.add_event_callback(event_handler.handle_event)
 
-            # 初始化AutoAgent（参考api_usage_example，可选但推荐）
-            try:
-                print(f"📦 初始化AutoAgent实例: {session_id}")
+        # 初始化AutoAgent（参考api_usage_example，可选但推荐）
+        try:
+            logger.info("初始化AutoAgent实例: %s", instance_name)
+            with chat_stage_seconds.time("instance_init"):
                 api.initialize()
-            except Exception as e:
-                print(f"⚠️ AutoAgent初始化失败，将在process_query时自动初始化: {e}")
+        except Exception as e:
+            logger.warning("AutoAgent初始化失败，将在process_query时自动初始化: %s", e)
 
-            # 存储实例
-            self.autoagent_instances[session_id] = api
-            self.event_handlers[session_id] = event_handler
+        return api, event_handler, port
 
-        return self.autoagent_instances[session_id], self.event_handlers[session_id]
+    def _create_warm_instance(
+        self,
+    ) -> tuple[AutoAgentAPI, AutoAgentEventHandler, int]:
+        """创建预热实例，此时还未绑定会话"""
+        return self._create_autoagent_instance(f"warm_{uuid.uuid4().hex[:12]}")
+
+    async def acquire_instance(
+        self, session_id: str, user_id: Any = None
+    ) -> tuple[AutoAgentAPI, AutoAgentEventHandler]:
+        """获取或创建AutoAgent实例和事件处理器，并标记为使用中，用完后调用 release_instance"""
+        started_at = time.perf_counter()
+
+        entry = self.instance_pool.get(session_id)
+        if entry is None:
+            # 优先使用预热实例，没有可用实例时冷启动创建
+            instance = self.warm_pool.take()
+            if instance is None:
+                instance = await agent_executor.run(
+                    self._create_autoagent_instance, session_id, user_id=user_id
+                )
+            api, event_handler, port = instance
+            self.port_leases.reassign(port, session_id)
+            event_handler.session_id = session_id
+            # 快照在实例放入池之前读取，放入后到恢复完成之间没有等待，其他请求不会用到未恢复的实例
+            snapshot_data = await self._load_session_snapshot(session_id)
+
+            # 初始化期间可能已有并发请求创建了同一会话的实例
+            entry = self.instance_pool.peek(session_id)
+            if entry is None:
+                entry = self.instance_pool.put(session_id, api, event_handler, port)
+                session_store.submit(session_store.bind, session_id, port)
+                self._restore_session_snapshot(entry, snapshot_data)
+            else:
+                self._discard_instance(instance)
+
+        self.instance_pool.acquire(session_id)
+        chat_stage_seconds.observe(time.perf_counter() - started_at, "instance_acquire")
+        return entry.api, entry.event_handler
+
+    def release_instance(self, session_id: str, event_handler: AutoAgentEventHandler):
+        """归还 acquire_instance 取得的实例，并把会话的事件统计写入共享存储"""
+        self.instance_pool.release(session_id)
+        self._save_events_summary(session_id, event_handler)
 
     def _build_agent_query(
-        self, agent: Agent, user_message: str, conversation_history: list[Message]
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
     ) -> str:
-        """构建发送给AutoAgent的查询"""
-        query_parts = []
+        """
+        构建发送给AutoAgent的查询，历史对话按token预算组装
+
+        每轮对话只在这里保存一次新的摘要，团队成员分支构建查询时不写数据库
+        """
+        with chat_stage_seconds.time("build_query"):
+            query, summary_update = context_builder.compose(
+                session, agent, user_message, conversation_history
+            )
+        if summary_update is not None:
+            try:
+                context_builder.save_summary(session, summary_update)
+            except Exception as e:
+                # 摘要保存失败不影响本轮对话，下一轮会重新折叠这些消息
+                session.rollback()
+                logger.warning("保存对话摘要失败: %s", e)
+        return query
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """获取会话锁，保证同一个AutoAgent实例不会并发执行查询"""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+
+    async def _run_serialized(
+        self, session_id: str, func: Callable[..., Any], *args: Any
+    ) -> dict[str, Any]:
+        """持有会话锁执行对话"""
+        async with self._session_lock(session_id):
+            return await func(*args)
 
-        # 添加Agent角色信息
-        query_parts.append(f"你是{agent.name}。")
-        query_parts.append(f"你的指令：{agent.instruction}")
+    async def run_coalesced_turn(
+        self,
+        session_id: str,
+        user_id: str,
+        agent_id: str,
+        user_message: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+    ) -> tuple[Any, bool]:
+        """
+        同一会话中同一用户发给同一智能体的相同消息合并为一轮对话
 
-        if agent.team:
-            query_parts.append(f"你所属的团队：{', '.join(agent.team)}")
+        func 为完整的一轮（保存用户消息、调用智能体、保存回复并通知客户端），
+        只由首个调用方执行；合并的调用方拿到同一个结果，不应再保存消息或推送通知
 
-        # 添加对话历史（最近几条）
-        recent_messages = (
-            conversation_history[-5:]
-            if len(conversation_history) > 5
-            else conversation_history
+        Returns:
+            (func的结果, 是否为合并的调用)
+        """
+        result, shared = await self.single_flight.run(
+            (session_id, user_id, agent_id, message_digest(user_message)), func, *args
         )
-        if recent_messages:
-            query_parts.append("\n历史对话：")
-            for msg in recent_messages:
-                if msg.role == "user":
-                    query_parts.append(f"用户: {msg.content}")
-                elif msg.role == "assistant":
-                    query_parts.append(f"助手: {msg.content}")
+        if shared:
+            logger.info("合并重复的对话请求: %s", session_id)
+        return result, shared
 
-        # 添加当前用户消息
-        query_parts.append(f"\n当前用户消息: {user_message}")
-        query_parts.append("\n请根据你的角色和指令回复用户。")
+    def run_query(
+        self,
+        api: AutoAgentAPI,
+        event_handler: AutoAgentEventHandler,
+        query: str,
+        cancel_token: CancelToken | None,
+    ) -> dict[str, Any]:
+        """在执行器线程中运行AutoAgent查询，取消时提前返回"""
+        context_token = _run_cancel_token.set(cancel_token)
+        try:
+            if cancel_token is not None:
+                # 在执行器中排队期间可能已被取消
+                cancel_token.raise_if_cancelled()
+            with chat_stage_seconds.time("process_query"):
+                return api.process_query(query)
+        except AgentRunCancelled:
+            return {"success": False, "cancelled": True, "error": "对话已取消"}
+        finally:
+            _run_cancel_token.reset(context_token)
+
+    async def _execute_query(
+        self,
+        session_id: str,
+        api: AutoAgentAPI,
+        event_handler: AutoAgentEventHandler,
+        query: str,
+        cancel_token: CancelToken | None,
+        user_id: Any = None,
+    ) -> dict[str, Any]:
+        """
+        在执行器中运行查询，令牌带截止时间时最多等待到截止时间
+
+        超时后以 deadline_exceeded 取消令牌并立即返回，卡住的模型调用或工具调用
+        不再占用请求；仍在运行的实例移出实例池，下一轮对话使用新实例，
+        不会与它并发执行查询或混入它的事件，其资源在线程真正结束后释放
+        """
+        remaining = cancel_token.remaining() if cancel_token is not None else None
+        if remaining is None:
+            return await agent_executor.run(
+                self.run_query,
+                api,
+                event_handler,
+                query,
+                cancel_token,
+                user_id=user_id,
+            )
+
+        run_task = asyncio.ensure_future(
+            agent_executor.run(
+                self.run_query,
+                api,
+                event_handler,
+                query,
+                cancel_token,
+                user_id=user_id,
+            )
+        )
+        done, _ = await asyncio.wait({run_task}, timeout=remaining)
+        if done:
+            return run_task.result()
+
+        cancel_token.cancel(DEADLINE_EXCEEDED)
+        logger.warning("对话超过截止时间，不再等待AutoAgent返回: %s", session_id)
+
+        entry = self.instance_pool.detach(session_id)
+
+        def retire_later(task: asyncio.Task):
+            # 标记异常已被读取，避免未读取异常的警告
+            if not task.cancelled():
+                task.exception()
+            if entry is not None:
+                self._retire_instance(entry)
 
-        return "\n".join(query_parts)
+        run_task.add_done_callback(retire_later)
+        return {"success": False, "cancelled": True, "error": "对话已超时"}
+
+    def _cancelled_result(
+        self,
+        event_handler: AutoAgentEventHandler,
+        cancel_token: CancelToken,
+        agent: Agent,
+        session_id: str,
+    ) -> dict[str, Any]:
+        """被取消或超时的对话结果，保留已产生的部分回复"""
+        logger.info("对话已取消: %s (%s)", session_id, cancel_token.reason)
+        deadline_exceeded = cancel_token.reason == DEADLINE_EXCEEDED
+        if deadline_exceeded:
+            event_handler.add_event(DEADLINE_EXCEEDED, {"agent_name": agent.name})
+        return {
+            "success": False,
+            "cancelled": True,
+            "cancel_reason": cancel_token.reason,
+            "deadline_exceeded": deadline_exceeded,
+            "error": "对话已超时" if deadline_exceeded else "对话已取消",
+            "response": event_handler.get_partial_response(),
+            "agent_name": agent.name,
+            "events": event_handler.get_current_session_events(),
+            "events_summary": event_handler.get_events_summary(),
+            "session_id": session_id,
+        }
+
+    async def _replay_cached_result(
+        self,
+        cached_result: dict[str, Any],
+        session_id: str,
+        realtime_callback=None,
+    ) -> dict[str, Any]:
+        """使用缓存的结果返回，并按原顺序推送合成事件，保证前端表现一致"""
+        logger.info("命中回复缓存: %s", session_id)
+
+        if realtime_callback:
+            for event in cached_result.get("events", []):
+                data = dict(event.get("data") or {})
+                data["cached"] = True
+                try:
+                    await realtime_callback(
+                        event.get("event_type", ""), data.get("agent_name", ""), data
+                    )
+                except Exception:
+                    logger.exception("实时事件推送异常")
+
+        cached_result["session_id"] = session_id
+        cached_result["cached"] = True
+        return cached_result
 
     async def process_agent_dialogue(
         self,
@@ -202,17 +557,25 @@ class AgentDialogueService:
         user_message: str,
         conversation_history: list[Message],
         session_id: str = None,
+        user_id: Any = None,
+        model=None,
+        cancel_token: CancelToken | None = None,
     ) -> dict[str, Any]:
         """
         处理智能体对话，使用AutoAgent
         参考api_usage_example.py的实现方式
 
+        同一会话的查询串行执行，重复提交的合并由调用方通过 run_coalesced_turn 完成
+
         Args:
             session: 数据库会话
             agent: 智能体实例
             user_message: 用户消息
             conversation_history: 对话历史
             session_id: 会话ID，用于区分不同对话
+            user_id: 发起对话的用户ID，用于执行器的并发限制
+            model: 模型实例
+            cancel_token: 取消令牌，触发后在下一次模型调用或工具调用前停止
 
         Returns:
             包含回复内容和事件的字典
@@ -221,51 +584,102 @@ class AgentDialogueService:
         if not session_id:
             session_id = str(uuid.uuid4())
 
+        return await self._run_serialized(
+            session_id,
+            self._run_agent_dialogue,
+            session,
+            agent,
+            user_message,
+            conversation_history,
+            session_id,
+            user_id,
+            model,
+            cancel_token,
+        )
+
+    async def _run_agent_dialogue(
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
+        session_id: str,
+        user_id: Any = None,
+        model=None,
+        cancel_token: CancelToken | None = None,
+    ) -> dict[str, Any]:
+        """执行一次对话，调用方需持有会话锁"""
+        api = None
         try:
+            # 构建查询
+            query = self._build_agent_query(
+                session, agent, user_message, conversation_history
+            )
+
+            # 命中回复缓存时直接返回，无需占用AutoAgent实例，团队智能体也不再分派
+            cache_key = None
+            if is_response_cache_enabled(agent):
+                cache_key = response_cache.make_key(agent, query, model)
+                cached_result = response_cache.get(cache_key)
+                if cached_result is not None:
+                    return await self._replay_cached_result(
+                        cached_result, session_id, None
+                    )
+
+            # 团队智能体先把请求并行分派给各成员，再带着成员结果汇总；
+            # 缓存仍按原始消息的查询保存
+            team_branches = None
+            if self.team_orchestrator.should_fan_out(agent):
+                merged_message, team_branches = await self.team_orchestrator.fan_out(
+                    session,
+                    agent,
+                    user_message,
+                    conversation_history,
+                    session_id,
+                    user_id=user_id,
+                    cancel_token=cancel_token,
+                )
+                query = context_builder.build(
+                    session, agent, merged_message, conversation_history
+                )
+
             # 获取或创建AutoAgent实例和事件处理器
-            api, event_handler = self._get_or_create_autoagent_instance(session_id)
+            api, event_handler = await self.acquire_instance(session_id, user_id)
 
             # 清除当前会话事件，为新的对话做准备
             event_handler.clear_current_session()
 
-            # 构建查询
-            query = self._build_agent_query(agent, user_message, conversation_history)
-
             # 使用AutoAgent处理查询，这里参考了api_usage_example的用法
-            print(f"🔍 处理查询: {user_message}")
-            print(f"📋 使用智能体: {agent.name}")
-            print(f"📝 查询长度: {len(query)} 字符")
+            logger.info(
+                "处理查询",
+                extra={
+                    "session_id": session_id,
+                    "agent_name": agent.name,
+                    "query_chars": len(query),
+                },
+            )
 
             try:
-                result = api.process_query(query)
+                result = await self._execute_query(
+                    session_id, api, event_handler, query, cancel_token, user_id
+                )
+            except AgentExecutorBusyError:
+                raise
             except Exception as autoagent_error:
                 # AutoAgent处理异常时的备用响应
-                print(f"⚠️ AutoAgent处理异常，使用备用响应: {autoagent_error}")
+                logger.warning("AutoAgent处理异常，使用备用响应: %s", autoagent_error)
 
                 # 创建备用响应
                 backup_response = f"我是{agent.name}，{agent.instruction}。关于您的问题：{user_message}，我正在为您处理中。由于系统正在优化，请稍后再试或联系技术支持。"
 
                 # 添加错误事件
-                error_event = {
-                    "event_type": "autoagent_error",
-                    "timestamp": datetime.now().isoformat(),
-                    "data": {
+                error_event = event_handler.add_event(
+                    "autoagent_error",
+                    {
                         "error": str(autoagent_error),
                         "fallback_used": True,
                         "agent_name": agent.name,
                     },
-                }
-                event_handler.current_session_events.append(
-                    type(
-                        "Event",
-                        (),
-                        {
-                            "event_type": "autoagent_error",
-                            "timestamp": datetime.now().isoformat(),
-                            "data": error_event["data"],
-                            "to_dict": lambda self: error_event,
-                        },
-                    )()
                 )
 
                 return {
@@ -284,16 +698,32 @@ class AgentDialogueService:
                     "fallback_used": True,
                 }
 
+            if cancel_token is not None and cancel_token.cancelled:
+                cancelled_result = self._cancelled_result(
+                    event_handler, cancel_token, agent, session_id
+                )
+                if team_branches is not None:
+                    cancelled_result["team_branches"] = team_branches
+                return cancelled_result
+
             if result.get("success"):
+                self.remember_session_state(session_id, result)
+
                 # 获取事件信息
                 events = event_handler.get_current_session_events()
                 events_summary = event_handler.get_events_summary()
 
-                print(f"✅ 查询处理成功，智能体: {result.get('agent_name')}")
-                print(f"📊 事件数量: {len(events)}")
-                print(f"📊 事件类型分布: {events_summary.get('event_types', {})}")
+                logger.info(
+                    "查询处理成功",
+                    extra={
+                        "session_id": session_id,
+                        "agent_name": result.get("agent_name"),
+                        "event_count": len(events),
+                        "event_types": events_summary.get("event_types", {}),
+                    },
+                )
 
-                return {
+                dialogue_result = {
                     "success": True,
                     "response": result.get("result", ""),
                     "raw_result": result.get("raw_result", ""),
@@ -304,8 +734,13 @@ class AgentDialogueService:
                     "autoagent_messages": result.get("messages", []),
                     "context_variables": result.get("context_variables", {}),
                 }
+                if team_branches is not None:
+                    dialogue_result["team_branches"] = team_branches
+                if cache_key is not None:
+                    response_cache.put(cache_key, dialogue_result)
+                return dialogue_result
             else:
-                print(f"❌ AutoAgent处理失败: {result.get('error', '未知错误')}")
+                logger.error("AutoAgent处理失败: %s", result.get("error", "未知错误"))
                 return {
                     "success": False,
                     "error": result.get("error", "AutoAgent处理失败"),
@@ -313,14 +748,26 @@ class AgentDialogueService:
                     "session_id": session_id,
                 }
 
+        except AgentExecutorBusyError as e:
+            logger.warning("执行器繁忙，拒绝请求: %s", session_id)
+            return {
+                "success": False,
+                "error": str(e),
+                "busy": True,
+                "events": [],
+                "session_id": session_id,
+            }
         except Exception as e:
-            print(f"❌ 对话处理异常: {str(e)}")
+            logger.exception("对话处理异常: %s", e)
             return {
                 "success": False,
                 "error": f"Agent对话处理异常: {str(e)}",
                 "events": [],
                 "session_id": session_id,
             }
+        finally:
+            if api is not None:
+                self.release_instance(session_id, event_handler)
 
     async def process_agent_dialogue_with_realtime_events(
         self,
@@ -331,11 +778,15 @@ class AgentDialogueService:
         session_id: str = None,
         model=None,
         realtime_callback=None,
+        user_id: Any = None,
+        cancel_token: CancelToken | None = None,
     ) -> dict[str, Any]:
         """
         处理智能体对话，支持实时事件推送
         这个方法专门为WebSocket实时流式传输设计
 
+        同一会话的查询串行执行，重复提交的合并由调用方通过 run_coalesced_turn 完成
+
         Args:
             session: 数据库会话
             agent: 智能体实例
@@ -344,6 +795,8 @@ class AgentDialogueService:
             session_id: 会话ID，用于区分不同对话
             model: 模型实例
             realtime_callback: 实时事件回调函数
+            user_id: 发起对话的用户ID，用于执行器的并发限制
+            cancel_token: 取消令牌，触发后在下一次模型调用或工具调用前停止
 
         Returns:
             包含回复内容和事件的字典
@@ -352,65 +805,121 @@ class AgentDialogueService:
         if not session_id:
             session_id = str(uuid.uuid4())
 
+        return await self._run_serialized(
+            session_id,
+            self._run_agent_dialogue_with_realtime_events,
+            session,
+            agent,
+            user_message,
+            conversation_history,
+            session_id,
+            model,
+            realtime_callback,
+            user_id,
+            cancel_token,
+        )
+
+    async def _run_agent_dialogue_with_realtime_events(
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
+        session_id: str,
+        model=None,
+        realtime_callback=None,
+        user_id: Any = None,
+        cancel_token: CancelToken | None = None,
+    ) -> dict[str, Any]:
+        """执行一次带实时事件推送的对话，调用方需持有会话锁"""
+        api = None
+        event_handler = None
+        event_bridge = None
         try:
+            # 构建查询
+            query = self._build_agent_query(
+                session, agent, user_message, conversation_history
+            )
+
+            # 命中回复缓存时直接返回，无需占用AutoAgent实例，团队智能体也不再分派
+            cache_key = None
+            if is_response_cache_enabled(agent):
+                cache_key = response_cache.make_key(agent, query, model)
+                cached_result = response_cache.get(cache_key)
+                if cached_result is not None:
+                    return await self._replay_cached_result(
+                        cached_result, session_id, realtime_callback
+                    )
+
+            # 团队智能体先把请求并行分派给各成员，再带着成员结果汇总；
+            # 缓存仍按原始消息的查询保存
+            team_branches = None
+            if self.team_orchestrator.should_fan_out(agent):
+                merged_message, team_branches = await self.team_orchestrator.fan_out(
+                    session,
+                    agent,
+                    user_message,
+                    conversation_history,
+                    session_id,
+                    user_id=user_id,
+                    cancel_token=cancel_token,
+                    realtime_callback=realtime_callback,
+                )
+                query = context_builder.build(
+                    session, agent, merged_message, conversation_history
+                )
+
             # 获取或创建AutoAgent实例和事件处理器
-            api, event_handler = self._get_or_create_autoagent_instance(session_id)
+            api, event_handler = await self.acquire_instance(session_id, user_id)
 
             # 清除当前会话事件，为新的对话做准备
             event_handler.clear_current_session()
 
-            # 如果提供了实时回调，将其添加到事件处理器
+            # 如果提供了实时回调，通过事件桥把执行器线程中的事件转交给事件循环
             if realtime_callback:
-                # 创建一个包装器来处理异步回调
-                original_handle_event = event_handler.handle_event
 
-                def enhanced_handle_event(event):
-                    # 调用原始处理
-                    original_handle_event(event)
-
-                    # 异步调用实时回调
-                    import asyncio
-
-                    try:
-                        # 检查是否在事件循环中
-                        loop = asyncio.get_event_loop()
-                        if loop.is_running():
-                            # 创建任务而不是等待
-                            asyncio.create_task(
-                                realtime_callback(
-                                    event.event_type,
-                                    event.data.get("agent_name", ""),
-                                    event.data,
-                                )
-                            )
-                        else:
-                            # 如果没有运行的事件循环，直接运行
-                            asyncio.run(
-                                realtime_callback(
-                                    event.event_type,
-                                    event.data.get("agent_name", ""),
-                                    event.data,
-                                )
-                            )
-                    except Exception as e:
-                        print(f"实时回调执行异常: {e}")
-
-                # 临时替换事件处理方法
-                event_handler.handle_event = enhanced_handle_event
+                async def deliver_event(event: AgentEvent):
+                    await realtime_callback(
+                        event.event_type,
+                        event.data.get("agent_name", ""),
+                        event.data,
+                    )
 
-            # 构建查询
-            query = self._build_agent_query(agent, user_message, conversation_history)
+                event_bridge = AgentEventBridge(
+                    loop=asyncio.get_running_loop(),
+                    consumer=deliver_event,
+                    max_size=settings.AGENT_EVENT_BRIDGE_MAX_SIZE,
+                    policy=settings.AGENT_EVENT_BRIDGE_OVERFLOW_POLICY,
+                )
+                event_bridge.start()
+                event_handler.realtime_sink = event_bridge.push
 
             # 使用AutoAgent处理查询
-            print(f"🔍 处理实时查询: {user_message}")
-            print(f"📋 使用智能体: {agent.name}")
-            print(f"📡 实时推送: {'启用' if realtime_callback else '禁用'}")
+            logger.info(
+                "处理实时查询",
+                extra={
+                    "session_id": session_id,
+                    "agent_name": agent.name,
+                    "query_chars": len(query),
+                    "realtime": realtime_callback is not None,
+                },
+            )
 
             try:
-                result = api.process_query(query)
+                try:
+                    result = await self._execute_query(
+                        session_id, api, event_handler, query, cancel_token, user_id
+                    )
+                finally:
+                    # 等本轮AutoAgent事件全部推送完，再推送后续的结果或错误
+                    if event_bridge is not None:
+                        event_handler.realtime_sink = None
+                        await event_bridge.aclose()
+            except AgentExecutorBusyError:
+                raise
             except Exception as autoagent_error:
                 # AutoAgent处理异常时的备用响应
-                print(f"⚠️ AutoAgent处理异常，使用备用响应: {autoagent_error}")
+                logger.warning("AutoAgent处理异常，使用备用响应: %s", autoagent_error)
 
                 # 如果有实时回调，推送错误事件
                 if realtime_callback:
@@ -457,16 +966,47 @@ class AgentDialogueService:
                     "realtime_events": True,
                 }
 
+            if cancel_token is not None and cancel_token.cancelled:
+                cancelled_result = self._cancelled_result(
+                    event_handler, cancel_token, agent, session_id
+                )
+                cancelled_result["realtime_events"] = True
+                if cancelled_result["deadline_exceeded"] and realtime_callback:
+                    try:
+                        await realtime_callback(
+                            DEADLINE_EXCEEDED,
+                            agent.name,
+                            {
+                                "partial_response_chars": len(
+                                    cancelled_result["response"]
+                                ),
+                                "timestamp": datetime.now().isoformat(),
+                            },
+                        )
+                    except Exception:
+                        pass
+                if team_branches is not None:
+                    cancelled_result["team_branches"] = team_branches
+                return cancelled_result
+
             if result.get("success"):
+                self.remember_session_state(session_id, result)
+
                 # 获取事件信息
                 events = event_handler.get_current_session_events()
                 events_summary = event_handler.get_events_summary()
 
-                print(f"✅ 实时查询处理成功，智能体: {result.get('agent_name')}")
-                print(f"📊 事件数量: {len(events)}")
-                print(f"📊 事件类型分布: {events_summary.get('event_types', {})}")
+                logger.info(
+                    "实时查询处理成功",
+                    extra={
+                        "session_id": session_id,
+                        "agent_name": result.get("agent_name"),
+                        "event_count": len(events),
+                        "event_types": events_summary.get("event_types", {}),
+                    },
+                )
 
-                return {
+                dialogue_result = {
                     "success": True,
                     "response": result.get("result", ""),
                     "raw_result": result.get("raw_result", ""),
@@ -478,8 +1018,15 @@ class AgentDialogueService:
                     "context_variables": result.get("context_variables", {}),
                     "realtime_events": True,
                 }
+                if team_branches is not None:
+                    dialogue_result["team_branches"] = team_branches
+                if cache_key is not None:
+                    response_cache.put(cache_key, dialogue_result)
+                return dialogue_result
             else:
-                print(f"❌ AutoAgent实时处理失败: {result.get('error', '未知错误')}")
+                logger.error(
+                    "AutoAgent实时处理失败: %s", result.get("error", "未知错误")
+                )
 
                 # 如果有实时回调，推送失败事件
                 if realtime_callback:
@@ -503,8 +1050,18 @@ class AgentDialogueService:
                     "realtime_events": True,
                 }
 
+        except AgentExecutorBusyError as e:
+            logger.warning("执行器繁忙，拒绝实时请求: %s", session_id)
+            return {
+                "success": False,
+                "error": str(e),
+                "busy": True,
+                "events": [],
+                "session_id": session_id,
+                "realtime_events": True,
+            }
         except Exception as e:
-            print(f"❌ 实时对话处理异常: {str(e)}")
+            logger.exception("实时对话处理异常: %s", e)
 
             # 如果有实时回调，推送异常事件
             if realtime_callback:
@@ -527,60 +1084,77 @@ class AgentDialogueService:
                 "session_id": session_id,
                 "realtime_events": True,
             }
+        finally:
+            if event_bridge is not None:
+                event_handler.realtime_sink = None
+                await event_bridge.aclose()
+            if api is not None:
+                self.release_instance(session_id, event_handler)
 
     def get_available_agents(self, session_id: str) -> list[str]:
         """获取可用的智能体列表"""
-        if session_id in self.autoagent_instances:
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
             try:
-                api = self.autoagent_instances[session_id]
-                return api.get_available_agents()
+                return entry.api.get_available_agents()
             except Exception as e:
-                print(f"获取可用智能体失败: {e}")
+                logger.warning("获取可用智能体失败: %s", e)
                 return []
         return []
 
     def reset_session(self, agent: Agent, session_id: str):
         """重置会话状态"""
-        if session_id in self.autoagent_instances:
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
             try:
-                api = self.autoagent_instances[session_id]
-                api.reset_session()
-                print(f"🔄 重置会话: {session_id}")
+                entry.api.reset_session()
+                logger.info("重置会话: %s", session_id)
             except Exception as e:
-                print(f"重置会话失败: {e}")
+                logger.warning("重置会话失败: %s", e)
 
-        if session_id in self.event_handlers:
-            self.event_handlers[session_id].clear_current_session()
+            entry.event_handler.clear_current_session()
+            entry.session_state = None
+        if settings.AUTOAGENT_SNAPSHOT_ENABLED:
+            session_store.submit(session_store.save_snapshot, session_id, None)
 
     def cleanup_session(self, session_id: str):
         """清理会话资源"""
-        if session_id in self.autoagent_instances:
-            del self.autoagent_instances[session_id]
-            print(f"🧹 清理会话资源: {session_id}")
-
-        if session_id in self.event_handlers:
-            del self.event_handlers[session_id]
+        if self.instance_pool.remove(session_id) is not None:
+            logger.info("清理会话资源: %s", session_id)
+        self.team_orchestrator.cleanup(session_id)
+        session_store.submit(session_store.discard, session_id)
 
     def get_session_events(self, session_id: str) -> list[dict[str, Any]]:
         """获取会话事件"""
-        if session_id in self.event_handlers:
-            return self.event_handlers[session_id].get_current_session_events()
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
+            return entry.event_handler.get_current_session_events()
         return []
 
     def clear_session_events(self, session_id: str):
         """清除会话事件"""
-        if session_id in self.event_handlers:
-            self.event_handlers[session_id].clear_current_session()
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
+            entry.event_handler.clear_current_session()
 
     def get_session_events_summary(self, session_id: str) -> dict[str, Any]:
         """获取会话事件摘要"""
-        if session_id in self.event_handlers:
-            return self.event_handlers[session_id].get_events_summary()
+        entry = self.instance_pool.peek(session_id)
+        if entry is not None:
+            return entry.event_handler.get_events_summary()
         return {"total_events": 0, "event_types": {}, "timeline": []}
 
-    def get_session_statistics(self, session_id: str) -> dict[str, Any]:
+    async def get_session_statistics(self, session_id: str) -> dict[str, Any]:
         """获取会话统计信息，参考api_usage_example的监控功能"""
-        if session_id not in self.event_handlers:
+        entry = self.instance_pool.peek(session_id)
+        if entry is None:
+            # 会话不在本进程时，使用持有该会话的进程写入的统计
+            state = await session_store.call(session_store.get, session_id)
+            if state and state.get("events_summary"):
+                statistics = dict(state["events_summary"])
+                statistics["session_id"] = session_id
+                statistics["worker_id"] = state.get("worker_id")
+                return statistics
             return {
                 "total_events": 0,
                 "tool_calls": 0,
@@ -589,65 +1163,114 @@ class AgentDialogueService:
                 "errors": 0,
             }
 
-        events = self.event_handlers[session_id].events_log
+        return self._local_session_statistics(entry)
 
-        tool_calls = len([e for e in events if e.event_type == "tool_call_start"])
-        agent_switches = len([e for e in events if e.event_type == "agent_switch"])
-        tasks_completed = len([e for e in events if e.event_type == "task_complete"])
-        errors = len(
-            [e for e in events if e.event_type in ["query_error", "tool_call_error"]]
-        )
-
-        # 获取使用的工具列表
-        tools_used = {
-            e.data.get("tool_name", "")
-            for e in events
-            if e.event_type == "tool_call_start" and e.data.get("tool_name")
-        }
-
-        return {
-            "total_events": len(events),
-            "tool_calls": tool_calls,
-            "agent_switches": agent_switches,
-            "tasks_completed": tasks_completed,
-            "errors": errors,
-            "tools_used": tools_used,
-            "session_id": session_id,
-        }
+    @staticmethod
+    def _local_session_statistics(entry: PooledInstance) -> dict[str, Any]:
+        statistics = entry.event_handler.get_statistics()
+        statistics["session_id"] = entry.session_id
+        return statistics
 
     def get_all_sessions_summary(self) -> dict[str, Any]:
         """获取所有会话的摘要信息"""
-        active_sessions = list(self.autoagent_instances.keys())
+        active_sessions = self.instance_pool.session_ids()
 
         summary = {"total_active_sessions": len(active_sessions), "sessions": {}}
 
         for session_id in active_sessions:
-            summary["sessions"][session_id] = self.get_session_statistics(session_id)
+            entry = self.instance_pool.peek(session_id)
+            if entry is not None:
+                summary["sessions"][session_id] = self._local_session_statistics(entry)
 
         return summary
 
     def export_session_events(self, session_id: str, format: str = "json") -> str:
         """导出会话事件，用于调试和分析"""
-        if session_id not in self.event_handlers:
+        entry = self.instance_pool.peek(session_id)
+        if entry is None:
             return "" if format == "json" else "No events found"
 
-        events = self.event_handlers[session_id].events_log
+        events = entry.event_handler.event_store.iter_full_history()
 
         if format == "json":
             import json
 
-            return json.dumps(
-                [event.to_dict() for event in events], ensure_ascii=False, indent=2
-            )
+            return json.dumps(list(events), ensure_ascii=False, indent=2, default=str)
         else:
             # 简单的文本格式
             lines = []
             for event in events:
-                lines.append(f"[{event.timestamp}] {event.event_type}: {event.data}")
+                lines.append(
+                    f"[{event['timestamp']}] {event['event_type']}: {event['data']}"
+                )
             return "\n".join(lines)
 
-    # ...existing code...
+    def get_runtime_stats(self) -> dict[str, Any]:
+        """获取服务运行指标，用于容量规划和监控"""
+        return {
+            "active_sessions": len(self.instance_pool),
+            "executor": agent_executor.get_stats(),
+            "instance_pool": self.instance_pool.get_stats(),
+            "warm_pool": self.warm_pool.get_stats(),
+            "port_leases": self.port_leases.get_stats(),
+            "response_cache": response_cache.get_stats(),
+            "tool_cache": tool_result_cache.get_stats(),
+            "ws_payloads": payload_store.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+            "admission": admission_controller.get_stats(),
+            "session_store": session_store.get_stats(),
+            "team": self.team_orchestrator.get_stats(),
+            "snapshots": {
+                "enabled": settings.AUTOAGENT_SNAPSHOT_ENABLED,
+                "saved": self.snapshots_saved,
+                "restored": self.snapshots_restored,
+                "failures": self.snapshot_failures,
+            },
+        }
 
 
 # 全局服务实例
 agent_dialogue_service = AgentDialogueService()
+
+
+def _collect_instance_counts() -> dict[tuple[str, ...], float]:
+    pool_stats = agent_dialogue_service.instance_pool.get_stats()
+    return {
+        ("in_use",): pool_stats["in_use"],
+        ("idle",): pool_stats["size"] - pool_stats["in_use"],
+        ("warm",): agent_dialogue_service.warm_pool.get_stats()["ready"],
+    }
+
+
+# 会话和实例相关的运行指标，抓取时取值
+metrics_registry.gauge(
+    "alma_active_sessions",
+    "Sessions with a resident AutoAgent instance",
+    lambda: len(agent_dialogue_service.instance_pool),
+)
+metrics_registry.gauge(
+    "alma_autoagent_instances",
+    "AutoAgent instances by state",
+    _collect_instance_counts,
+    ("state",),
+)
+metrics_registry.gauge(
+    "alma_executor_running",
+    "AutoAgent calls running in the executor",
+    lambda: agent_executor.running,
+)
+metrics_registry.gauge(
+    "alma_executor_queue_depth",
+    "AutoAgent calls waiting for an executor slot",
+    lambda: agent_executor.queue_depth,
+)
+metrics_registry.gauge(
+    "alma_admission_running",
+    "Chat turns admitted and running",
+    lambda: admission_controller.running,
+)
+metrics_registry.gauge(
+    "alma_admission_queued",
+    "Chat turns waiting in the admission queue",
+    lambda: admission_controller.get_stats()["queued"],
+)
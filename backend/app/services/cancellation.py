@@ -0,0 +1,96 @@
+"""
+智能体运行的协作式取消
+取消令牌在事件循环中触发，在执行器线程中AutoAgent的事件回调里检查
+"""
+
+import threading
+import time
+
+from app.core.config import settings
+
+# AutoAgent在这些事件之后才会发起新的模型调用或工具调用，在此处检查取消
+CANCEL_CHECKPOINT_EVENT_TYPES = frozenset({"ai_thinking_start", "tool_call_start"})
+
+# 超过截止时间时的取消原因
+DEADLINE_EXCEEDED = "deadline_exceeded"
+
+
+class AgentRunCancelled(Exception):
+    """智能体运行已被取消"""
+
+
+class CancelToken:
+    """
+    线程安全的取消令牌，可以在任意线程触发和检查
+
+    - 指定parent时，父令牌取消后子令牌也视为已取消，子令牌单独取消不影响父令牌
+    - 指定deadline（time.monotonic()时刻）时，超过截止时间后视为以 deadline_exceeded 取消
+    """
+
+    def __init__(
+        self, parent: "CancelToken | None" = None, deadline: float | None = None
+    ):
+        self._event = threading.Event()
+        self._reason: str | None = None
+        self.parent = parent
+        self.deadline = deadline
+
+    def cancel(self, reason: str = "cancelled"):
+        """触发取消，重复调用时保留第一次的原因"""
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+            return True
+        return self.parent is not None and self.parent.cancelled
+
+    @property
+    def reason(self) -> str | None:
+        if self._event.is_set() or self.parent is None:
+            return self._reason
+        return self.parent.reason
+
+    def remaining(self) -> float | None:
+        """距离截止时间的秒数，取自身和父令牌中较早的截止时间，没有截止时间时返回None"""
+        remaining = None
+        if self.deadline is not None:
+            remaining = max(0.0, self.deadline - time.monotonic())
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining()
+            if parent_remaining is not None:
+                remaining = (
+                    parent_remaining
+                    if remaining is None
+                    else min(remaining, parent_remaining)
+                )
+        return remaining
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 AgentRunCancelled"""
+        if self.cancelled:
+            raise AgentRunCancelled(self.reason)
+
+
+def resolve_deadline(requested_ms: float | None = None) -> float | None:
+    """
+    计算一次对话的截止时间
+
+    请求指定了时限（毫秒）时使用该时限，否则使用服务端默认值，都不超过服务端上限；
+    返回time.monotonic()时刻，没有时限时返回None
+    """
+    seconds = settings.CHAT_DEFAULT_DEADLINE_SECONDS
+    if requested_ms is not None and requested_ms > 0:
+        seconds = requested_ms / 1000
+    if settings.CHAT_MAX_DEADLINE_SECONDS > 0:
+        seconds = (
+            min(seconds, settings.CHAT_MAX_DEADLINE_SECONDS)
+            if seconds > 0
+            else settings.CHAT_MAX_DEADLINE_SECONDS
+        )
+    return time.monotonic() + seconds if seconds > 0 else None
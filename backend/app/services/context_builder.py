@@ -0,0 +1,264 @@
+"""
+对话上下文构建
+按token预算组装历史对话，较早的轮次折叠为按对话持久化的滚动摘要
+"""
+
+import re
+import uuid
+from datetime import datetime, timezone
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.db.repository import get_conversation_summary, upsert_conversation_summary
+from app.models import Agent, ConversationSummary, Message
+
+_CJK_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+ROLE_LABELS = {"user": "用户", "assistant": "助手"}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符按1个token计，其余字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def _as_utc(value: datetime) -> datetime:
+    """数据库读出的时间可能不带时区，统一按UTC比较"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本，使其估算token数不超过max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+class SummaryUpdate:
+    """构建上下文时新折叠进摘要的结果，由调用方在一轮对话中保存一次"""
+
+    __slots__ = (
+        "conversation_id",
+        "summary",
+        "summarized_until",
+        "summarized_count",
+        "summarized_message_id",
+    )
+
+    def __init__(
+        self,
+        conversation_id: uuid.UUID,
+        summary: str,
+        summarized_until: datetime,
+        summarized_count: int,
+        summarized_message_id: uuid.UUID,
+    ):
+        self.conversation_id = conversation_id
+        self.summary = summary
+        self.summarized_until = summarized_until
+        self.summarized_count = summarized_count
+        self.summarized_message_id = summarized_message_id
+
+
+class ContextBuilder:
+    """
+    上下文组装引擎
+
+    - 角色信息和当前消息必须保留，剩余预算分给历史对话
+    - 从最新的消息开始完整放入，放不下的较早消息折叠进滚动摘要
+    - 摘要按对话持久化，每轮只追加新滑出窗口的消息，不重新摘要全部历史
+    - 已摘要的消息按最后一条摘要消息的ID划界，不再放入历史对话，也不会重复摘要
+    - 构建过程只读取数据库，新的摘要由调用方通过 save_summary 保存
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        summary_token_budget: int,
+        summary_line_chars: int,
+    ):
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.summary_line_chars = summary_line_chars
+
+    def _format_message(self, message: Message) -> str | None:
+        label = ROLE_LABELS.get(message.role)
+        if label is None:
+            return None
+        return f"{label}: {message.content}"
+
+    def _summarize_message(self, message: Message) -> str | None:
+        """把单条消息压缩为摘要中的一行"""
+        label = ROLE_LABELS.get(message.role)
+        if label is None:
+            return None
+        content = _WHITESPACE_PATTERN.sub(" ", message.content).strip()
+        if len(content) > self.summary_line_chars:
+            content = content[: self.summary_line_chars] + "…"
+        return f"- {label}: {content}"
+
+    def _fit_summary(self, lines: list[str]) -> list[str]:
+        """摘要超出预算时丢弃最早的行"""
+        while lines and estimate_tokens("\n".join(lines)) > self.summary_token_budget:
+            lines.pop(0)
+        return lines
+
+    @staticmethod
+    def _summarized_prefix(
+        db_summary: ConversationSummary | None, history: list[Message]
+    ) -> int:
+        """history 开头已折叠进摘要的消息数"""
+        if db_summary is None:
+            return 0
+        if db_summary.summarized_message_id is not None:
+            for index, message in enumerate(history):
+                if message.message_id == db_summary.summarized_message_id:
+                    return index + 1
+        if db_summary.summarized_until is None:
+            return 0
+        # 旧摘要只记录了时间，或最后一条摘要消息不在本次加载的历史中
+        summarized_until = _as_utc(db_summary.summarized_until)
+        count = 0
+        for message in history:
+            if _as_utc(message.timestamp) > summarized_until:
+                break
+            count += 1
+        return count
+
+    def _fold_summary(
+        self,
+        db_summary: ConversationSummary | None,
+        new_messages: list[Message],
+    ) -> tuple[str, SummaryUpdate | None]:
+        """把新滑出窗口的消息追加到摘要，返回当前摘要和需要保存的更新"""
+        summary = db_summary.summary if db_summary else ""
+        if not new_messages:
+            return summary, None
+
+        lines = summary.splitlines() if summary else []
+        for message in new_messages:
+            line = self._summarize_message(message)
+            if line:
+                lines.append(line)
+        summary = "\n".join(self._fit_summary(lines))
+
+        last_message = new_messages[-1]
+        return summary, SummaryUpdate(
+            conversation_id=last_message.conversation_id,
+            summary=summary,
+            summarized_until=_as_utc(last_message.timestamp),
+            summarized_count=(db_summary.summarized_count if db_summary else 0)
+            + len(new_messages),
+            summarized_message_id=last_message.message_id,
+        )
+
+    def save_summary(self, session: Session, update: SummaryUpdate):
+        """保存 compose 产生的摘要更新"""
+        upsert_conversation_summary(
+            session=session,
+            conversation_id=update.conversation_id,
+            summary=update.summary,
+            summarized_until=update.summarized_until,
+            summarized_count=update.summarized_count,
+            summarized_message_id=update.summarized_message_id,
+        )
+
+    def build(
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
+    ) -> str:
+        """构建发送给AutoAgent的查询，不保存摘要"""
+        return self.compose(session, agent, user_message, conversation_history)[0]
+
+    def compose(
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
+    ) -> tuple[str, SummaryUpdate | None]:
+        """
+        构建发送给AutoAgent的查询
+
+        Returns:
+            (查询, 摘要更新)，有新消息折叠进摘要时摘要更新不为None
+        """
+        header_parts = [f"你是{agent.name}。", f"你的指令：{agent.instruction}"]
+        if agent.team:
+            header_parts.append(f"你所属的团队：{', '.join(agent.team)}")
+        footer_parts = [
+            f"\n当前用户消息: {user_message}",
+            "\n请根据你的角色和指令回复用户。",
+        ]
+
+        fixed_tokens = estimate_tokens("\n".join(header_parts + footer_parts))
+        history_budget = max(0, self.token_budget - fixed_tokens)
+
+        history = sorted(conversation_history, key=lambda message: message.timestamp)
+        db_summary = None
+        if history:
+            db_summary = get_conversation_summary(
+                session=session, conversation_id=history[0].conversation_id
+            )
+        # 已摘要的消息只以摘要的形式出现
+        history = history[self._summarized_prefix(db_summary, history) :]
+
+        # 从最新的消息向前放入，为摘要预留预算
+        recent_budget = max(0, history_budget - self.summary_token_budget)
+        recent_lines: list[str] = []
+        used_tokens = 0
+        split_index = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            line = self._format_message(history[index])
+            if line is None:
+                split_index = index
+                continue
+            line_tokens = estimate_tokens(line)
+            if used_tokens + line_tokens > recent_budget:
+                if not recent_lines and recent_budget > 0:
+                    # 最近一条消息单独超出预算时截断放入
+                    recent_lines.append(truncate_to_tokens(line, recent_budget))
+                    split_index = index
+                break
+            recent_lines.append(line)
+            used_tokens += line_tokens
+            split_index = index
+        recent_lines.reverse()
+
+        summary, summary_update = self._fold_summary(db_summary, history[:split_index])
+
+        query_parts = list(header_parts)
+        if summary:
+            query_parts.append("\n更早的对话摘要：")
+            query_parts.append(summary)
+        if recent_lines:
+            query_parts.append("\n历史对话：")
+            query_parts.extend(recent_lines)
+        query_parts.extend(footer_parts)
+
+        return "\n".join(query_parts), summary_update
+
+
+# 全局上下文构建器实例
+context_builder = ContextBuilder(
+    token_budget=settings.CONTEXT_TOKEN_BUDGET,
+    summary_token_budget=settings.CONTEXT_SUMMARY_TOKEN_BUDGET,
+    summary_line_chars=settings.CONTEXT_SUMMARY_LINE_CHARS,
+)
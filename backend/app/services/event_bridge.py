@@ -0,0 +1,157 @@
+"""
+AutoAgent事件桥
+把执行器线程中的AutoAgent回调安全地转交给事件循环，支持有界缓冲和慢消费处理
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, Literal
+
+logger = logging.getLogger(__name__)
+
+# 客户端较慢时可以丢弃或合并的低价值事件
+LOW_VALUE_EVENT_TYPES = frozenset({"ai_thinking_start", "tool_call_start"})
+
+OverflowPolicy = Literal["block", "drop", "coalesce"]
+
+
+class AgentEventBridge:
+    """
+    线程安全的有界事件通道
+
+    - push() 可以在任意线程调用，通过 call_soon_threadsafe 唤醒事件循环
+    - 每个会话一个消费协程，按写入顺序依次调用 consumer
+    - 缓冲区满时按 policy 处理：
+      block    阻塞生产者线程，直到消费者腾出空间
+      drop     丢弃低价值事件（新到的或缓冲区中最旧的），没有可丢弃的则阻塞
+      coalesce 同类低价值事件只保留最新一条，否则按 drop 处理
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        consumer: Callable[[Any], Awaitable[None]],
+        max_size: int,
+        policy: OverflowPolicy = "coalesce",
+    ):
+        self.max_size = max_size
+        self.policy = policy
+
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._consumer = consumer
+        self._items: deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        # 统计计数
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+
+    def start(self):
+        """启动消费协程，需要在事件循环线程中调用"""
+        if self._task is None:
+            self._task = self._loop.create_task(self._consume())
+
+    def _remove_oldest_low_value(self, event_type: str | None = None) -> bool:
+        for index, item in enumerate(self._items):
+            if item.event_type in LOW_VALUE_EVENT_TYPES and (
+                event_type is None or item.event_type == event_type
+            ):
+                del self._items[index]
+                return True
+        return False
+
+    def _make_room(self, event: Any) -> Literal["enqueue", "drop", "block"]:
+        """缓冲区已满时决定如何处理新事件"""
+        if self.policy == "block":
+            return "block"
+
+        is_low_value = event.event_type in LOW_VALUE_EVENT_TYPES
+        if self.policy == "coalesce" and is_low_value:
+            if self._remove_oldest_low_value(event.event_type):
+                self.coalesced += 1
+                return "enqueue"
+
+        if is_low_value:
+            self.dropped += 1
+            return "drop"
+        if self._remove_oldest_low_value():
+            self.dropped += 1
+            return "enqueue"
+        return "block"
+
+    def push(self, event: Any) -> bool:
+        """写入事件，返回事件是否被接收"""
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.max_size:
+                action = self._make_room(event)
+                if action == "drop":
+                    return False
+                if action == "block":
+                    # 在事件循环线程中阻塞会导致死锁，此时允许临时超出上限
+                    if threading.get_ident() != self._loop_thread_id:
+                        self.blocked += 1
+                        while len(self._items) >= self.max_size and not self._closed:
+                            self._cond.wait()
+                        if self._closed:
+                            return False
+            self._items.append(event)
+
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            return False
+        return True
+
+    async def _consume(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                with self._cond:
+                    if not self._items:
+                        finished = self._closed
+                        break
+                    event = self._items.popleft()
+                    self._cond.notify()
+                try:
+                    await self._consumer(event)
+                    self.delivered += 1
+                except Exception:
+                    logger.exception("实时事件推送异常")
+            if finished:
+                return
+
+    async def aclose(self):
+        """停止接收新事件，等待已缓冲的事件全部推送完毕"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._wakeup.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取事件桥统计信息"""
+        with self._cond:
+            pending = len(self._items)
+        return {
+            "pending": pending,
+            "max_size": self.max_size,
+            "policy": self.policy,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "blocked": self.blocked,
+        }
@@ -0,0 +1,214 @@
+"""
+AutoAgent事件存储
+按事件数和字节数限制的缓冲区保存最近的事件，维护按类型的计数，可选把溢出的旧事件写入磁盘
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+from collections.abc import Iterator
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# 统计信息中单独计数的事件类型
+ERROR_EVENT_TYPES = frozenset({"query_error", "tool_call_error"})
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算事件数据占用的字节数，字符串按长度计算，不做完整编码"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, list | tuple):
+        return sum(estimate_size(item) for item in value)
+    return 8
+
+
+class EventRecord:
+    """单条事件记录"""
+
+    __slots__ = ("sequence", "event_type", "timestamp", "data", "size")
+
+    def __init__(
+        self, sequence: int, event_type: str, timestamp: Any, data: dict, size: int
+    ):
+        self.sequence = sequence
+        self.event_type = event_type
+        self.timestamp = timestamp
+        self.data = data
+        self.size = size
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "event_type": self.event_type,
+            "timestamp": self.timestamp,
+            "agent_name": self.data.get("agent_name", ""),
+            "data": self.data,
+        }
+
+
+class SessionEventStore:
+    """
+    会话级事件存储
+
+    - 缓冲区按事件数和估算字节数限制，超出任一上限时移出最旧的事件，单会话内存有上限
+    - 写入时维护总数、按类型计数和使用过的工具，统计查询为O(1)
+    - 配置了 spill_path 时，被移出的旧事件以JSON Lines追加到磁盘，保留完整历史；
+      关闭时删除该文件
+    - 事件在执行器线程写入、在事件循环中读取，所有操作都需要加锁
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        spill_path: str | None = None,
+        max_bytes: int | None = None,
+    ):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._buffer: deque[EventRecord] = deque()
+        self._bytes = 0
+        self._spill_file = None
+
+        # 会话累计统计
+        self.total_events = 0
+        self.spilled_events = 0
+        self.event_type_counts: dict[str, int] = {}
+        self.tools_used: set[str] = set()
+
+        # 当前一轮对话的统计
+        self._turn_start_sequence = 0
+        self.turn_event_type_counts: dict[str, int] = {}
+
+    def append(self, event_type: str, timestamp: Any, data: dict) -> EventRecord:
+        """写入一条事件"""
+        with self._lock:
+            self.total_events += 1
+            record = EventRecord(
+                self.total_events, event_type, timestamp, data, estimate_size(data)
+            )
+            self._buffer.append(record)
+            self._bytes += record.size
+            # 最新的事件即使单独超出字节上限也保留
+            while len(self._buffer) > self.capacity or (
+                self.max_bytes is not None
+                and self._bytes > self.max_bytes
+                and len(self._buffer) > 1
+            ):
+                self._evict_oldest()
+
+            self.event_type_counts[event_type] = (
+                self.event_type_counts.get(event_type, 0) + 1
+            )
+            self.turn_event_type_counts[event_type] = (
+                self.turn_event_type_counts.get(event_type, 0) + 1
+            )
+            if event_type == "tool_call_start" and data.get("tool_name"):
+                self.tools_used.add(data["tool_name"])
+            return record
+
+    def _evict_oldest(self):
+        record = self._buffer.popleft()
+        self._bytes -= record.size
+        if self.spill_path:
+            self._spill(record)
+
+    def _spill(self, record: EventRecord):
+        try:
+            if self._spill_file is None:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+            self._spill_file.write(
+                json.dumps(record.to_dict(), ensure_ascii=False, default=str) + "\n"
+            )
+            self.spilled_events += 1
+        except OSError as e:
+            logger.warning("事件写入磁盘失败: %s", e)
+
+    def _records(self) -> list[EventRecord]:
+        """按时间顺序返回缓冲区中的事件，调用方需持有锁"""
+        return list(self._buffer)
+
+    def start_turn(self):
+        """开始新一轮对话，之后的事件计入当前轮"""
+        with self._lock:
+            self._turn_start_sequence = self.total_events
+            self.turn_event_type_counts = {}
+
+    def current_turn_events(self) -> list[EventRecord]:
+        """当前一轮对话中仍保留在缓冲区的事件"""
+        with self._lock:
+            return [
+                record
+                for record in self._records()
+                if record.sequence > self._turn_start_sequence
+            ]
+
+    def retained_events(self) -> list[EventRecord]:
+        """缓冲区中保留的全部事件"""
+        with self._lock:
+            return self._records()
+
+    def iter_full_history(self) -> Iterator[dict[str, Any]]:
+        """完整历史：先读取磁盘上溢出的事件，再读取缓冲区中的事件"""
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_file.flush()
+            records = self._records()
+        if self.spill_path and os.path.exists(self.spill_path):
+            with open(self.spill_path, encoding="utf-8") as spill_file:
+                for line in spill_file:
+                    yield json.loads(line)
+        for record in records:
+            yield record.to_dict()
+
+    def get_turn_summary(self) -> dict[str, Any]:
+        """当前一轮对话的事件摘要"""
+        with self._lock:
+            turn_total = self.total_events - self._turn_start_sequence
+            return {
+                "total_events": turn_total,
+                "event_types": dict(self.turn_event_type_counts),
+                "timeline": [
+                    (record.timestamp, record.event_type)
+                    for record in self._records()
+                    if record.sequence > self._turn_start_sequence
+                ],
+            }
+
+    def get_statistics(self) -> dict[str, Any]:
+        """会话累计统计，不扫描事件"""
+        with self._lock:
+            counts = self.event_type_counts
+            return {
+                "total_events": self.total_events,
+                "tool_calls": counts.get("tool_call_start", 0),
+                "agent_switches": counts.get("agent_switch", 0),
+                "tasks_completed": counts.get("task_complete", 0),
+                "errors": sum(counts.get(t, 0) for t in ERROR_EVENT_TYPES),
+                "tools_used": set(self.tools_used),
+                "retained_events": len(self._buffer),
+                "retained_bytes": self._bytes,
+                "spilled_events": self.spilled_events,
+            }
+
+    def close(self):
+        """关闭并删除溢出文件，实例淘汰或清理后不再需要其事件历史"""
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            if self.spill_path:
+                try:
+                    os.remove(self.spill_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("删除事件溢出文件失败: %s", e)
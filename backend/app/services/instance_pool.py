@@ -0,0 +1,219 @@
+"""
+AutoAgent实例池
+按会话缓存AutoAgentAPI实例，基于LRU和空闲超时进行淘汰
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class PooledInstance:
+    """实例池中的一项，包含AutoAgent实例及其事件处理器"""
+
+    __slots__ = (
+        "session_id",
+        "api",
+        "event_handler",
+        "created_at",
+        "last_used",
+        "in_use",
+        "port",
+        "session_state",
+    )
+
+    def __init__(
+        self, session_id: str, api: Any, event_handler: Any, port: int | None = None
+    ):
+        self.session_id = session_id
+        self.api = api
+        self.event_handler = event_handler
+        # 实例租用的端口，淘汰时释放
+        self.port = port
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # 正在使用该实例的请求数，使用中的实例不会被淘汰
+        self.in_use = 0
+        # 最近一次查询返回的消息和上下文变量，淘汰时保存为快照
+        self.session_state: dict[str, Any] | None = None
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class AutoAgentInstancePool:
+    """
+    会话级AutoAgent实例池
+
+    - 超过最大实例数时淘汰最久未使用的空闲实例
+    - 后台清理任务定期淘汰空闲时间超过TTL的实例
+    - 淘汰时依次调用注册的回调，便于释放端口等外部资源
+    """
+
+    def __init__(
+        self,
+        max_instances: int,
+        idle_ttl: float,
+        reap_interval: float,
+    ):
+        self.max_instances = max_instances
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+
+        self._entries: OrderedDict[str, PooledInstance] = OrderedDict()
+        self._evict_callbacks: list[Callable[[PooledInstance, str], None]] = []
+        self._reaper_task: asyncio.Task | None = None
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.detached = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def session_ids(self) -> list[str]:
+        return list(self._entries.keys())
+
+    def add_evict_callback(self, callback: Callable[[PooledInstance, str], None]):
+        """注册淘汰回调，参数为被淘汰的实例和淘汰原因"""
+        self._evict_callbacks.append(callback)
+
+    def get(self, session_id: str) -> PooledInstance | None:
+        """获取实例并刷新其LRU位置，计入命中/未命中统计"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry.touch()
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def peek(self, session_id: str) -> PooledInstance | None:
+        """只读查看实例，不影响LRU顺序和统计"""
+        return self._entries.get(session_id)
+
+    def put(
+        self, session_id: str, api: Any, event_handler: Any, port: int | None = None
+    ) -> PooledInstance:
+        """放入新实例，必要时淘汰最久未使用的空闲实例"""
+        entry = PooledInstance(session_id, api, event_handler, port)
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        self._evict_overflow(keep=session_id)
+        return entry
+
+    def remove(self, session_id: str, reason: str = "cleanup") -> PooledInstance | None:
+        """移除指定会话的实例"""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._notify_evicted(entry, reason)
+        return entry
+
+    def detach(self, session_id: str) -> PooledInstance | None:
+        """
+        把实例移出实例池但不调用淘汰回调，用于仍在运行、不能再被复用的实例
+
+        调用方负责在实例真正空闲后释放其资源
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.detached += 1
+        return entry
+
+    def acquire(self, session_id: str):
+        """标记实例正在使用"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.in_use += 1
+
+    def release(self, session_id: str):
+        """标记实例使用结束"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.in_use = max(0, entry.in_use - 1)
+            entry.touch()
+
+    def _evict_overflow(self, keep: str | None = None):
+        if len(self._entries) <= self.max_instances:
+            return
+        # 从最久未使用的一端开始，跳过正在使用的实例和刚放入的实例
+        for session_id in list(self._entries.keys()):
+            if len(self._entries) <= self.max_instances:
+                break
+            entry = self._entries[session_id]
+            if entry.in_use or session_id == keep:
+                continue
+            del self._entries[session_id]
+            self.evictions += 1
+            self._notify_evicted(entry, "lru")
+
+    def reap_expired(self) -> list[str]:
+        """淘汰空闲时间超过TTL的实例，返回被淘汰的会话ID"""
+        now = time.monotonic()
+        expired = [
+            session_id
+            for session_id, entry in self._entries.items()
+            if not entry.in_use and now - entry.last_used > self.idle_ttl
+        ]
+        for session_id in expired:
+            entry = self._entries.pop(session_id)
+            self.expirations += 1
+            self._notify_evicted(entry, "idle")
+        return expired
+
+    def _notify_evicted(self, entry: PooledInstance, reason: str):
+        for callback in self._evict_callbacks:
+            try:
+                callback(entry, reason)
+            except Exception:
+                logger.exception("实例淘汰回调执行异常")
+
+    async def _reap_loop(self):
+        try:
+            while True:
+                await asyncio.sleep(self.reap_interval)
+                expired = self.reap_expired()
+                if expired:
+                    logger.info("清理空闲AutoAgent实例: %d 个", len(expired))
+        except asyncio.CancelledError:
+            pass
+
+    def start_reaper(self):
+        """启动后台清理任务，需要在事件循环中调用"""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reap_loop())
+
+    async def stop_reaper(self):
+        """停止后台清理任务"""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            await asyncio.gather(self._reaper_task, return_exceptions=True)
+            self._reaper_task = None
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取实例池统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_instances": self.max_instances,
+            "idle_ttl_seconds": self.idle_ttl,
+            "in_use": sum(1 for entry in self._entries.values() if entry.in_use),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "detached": self.detached,
+        }
@@ -0,0 +1,168 @@
+"""
+超大事件字段的限制与转存
+推送给前端的事件中，超过大小上限的字段被截断；转存策略下完整内容暂存在服务端，前端按需获取
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.core.config import settings
+from app.services.ws_serialization import json_serializer
+
+
+def _field_size(value: Any) -> int:
+    """字段的大致大小（字符数），字符串直接取长度，其他类型按JSON编码后的长度计算"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict | list):
+        return len(json_serializer.dumps(value))
+    return 0
+
+
+def _preview(value: Any, max_chars: int) -> str:
+    text = value if isinstance(value, str) else json_serializer.dumps(value)
+    return text[:max_chars]
+
+
+class OffloadedPayloadStore:
+    """
+    转存的超大字段
+
+    - 以随机ID索引，过期或总字符数超过上限时淘汰最早转存的内容
+    - 记录转存时连接认证的用户，只有该用户可以获取；没有认证用户的内容不转存
+    - 会话断开时可按会话清除
+    """
+
+    def __init__(self, max_chars: int, ttl: float):
+        self.max_chars = max_chars
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # payload_id -> (过期时间, 会话ID, 字段名, 内容, 大小, 所属用户ID)
+        self._entries: OrderedDict[str, tuple[float, str, str, Any, int, str]] = (
+            OrderedDict()
+        )
+        self._total_size = 0
+
+        # 统计计数
+        self.offloaded = 0
+        self.truncated = 0
+        self.evictions = 0
+        self.fetches = 0
+
+    def put(
+        self, session_id: str, field: str, value: Any, size: int, owner_id: str
+    ) -> str:
+        """转存字段内容，返回payload_id"""
+        payload_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._entries[payload_id] = (
+                time.monotonic() + self.ttl,
+                session_id,
+                field,
+                value,
+                size,
+                str(owner_id),
+            )
+            self._total_size += size
+            self.offloaded += 1
+            self._evict()
+        return payload_id
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            payload_id, entry = next(iter(self._entries.items()))
+            if entry[0] > now and self._total_size <= self.max_chars:
+                break
+            del self._entries[payload_id]
+            self._total_size -= entry[4]
+            self.evictions += 1
+
+    def get(self, payload_id: str, owner_id: Any) -> dict[str, Any] | None:
+        """获取转存的内容，不存在、已过期或不属于owner_id时返回None"""
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(payload_id)
+            if entry is None or entry[5] != str(owner_id):
+                return None
+            self.fetches += 1
+            return {
+                "payload_id": payload_id,
+                "session_id": entry[1],
+                "field": entry[2],
+                "value": entry[3],
+            }
+
+    def drop_session(self, session_id: str):
+        """清除会话转存的内容"""
+        with self._lock:
+            for payload_id in [
+                key for key, entry in self._entries.items() if entry[1] == session_id
+            ]:
+                self._total_size -= self._entries.pop(payload_id)[4]
+
+    def limit_event_data(
+        self, session_id: str, data: dict[str, Any], owner_id: str | None
+    ) -> dict[str, Any]:
+        """
+        按配置的策略处理事件数据中的超大字段，返回处理后的副本，原数据不变，
+        owner_id 为连接经访问令牌认证的用户，转存的内容只能由该用户获取
+
+        - truncate: 超大字段替换为开头部分，truncated_fields 记录原始大小
+        - offload: 在截断的基础上转存完整内容，offloaded_fields 记录获取地址；
+          owner_id 为None（连接未认证）时没有人能证明自己是所属用户，按truncate处理
+        """
+        policy = settings.WS_OVERSIZED_FIELD_POLICY
+        max_chars = settings.WS_EVENT_FIELD_MAX_CHARS
+        if policy == "none":
+            return data
+        if owner_id is None:
+            policy = "truncate"
+
+        limited = None
+        for field, value in data.items():
+            size = _field_size(value)
+            if size <= max_chars:
+                continue
+            if limited is None:
+                limited = dict(data)
+                limited["truncated_fields"] = {}
+                if policy == "offload":
+                    limited["offloaded_fields"] = {}
+            limited[field] = _preview(value, max_chars)
+            limited["truncated_fields"][field] = size
+            if policy == "offload":
+                payload_id = self.put(session_id, field, value, size, owner_id)
+                limited["offloaded_fields"][field] = {
+                    "payload_id": payload_id,
+                    "url": f"{settings.API_V1_STR}/ws/payloads/{payload_id}",
+                    "size": size,
+                }
+            else:
+                self.truncated += 1
+        return limited if limited is not None else data
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取转存统计信息"""
+        with self._lock:
+            return {
+                "policy": settings.WS_OVERSIZED_FIELD_POLICY,
+                "entries": len(self._entries),
+                "total_size": self._total_size,
+                "max_chars": self.max_chars,
+                "offloaded": self.offloaded,
+                "truncated": self.truncated,
+                "evictions": self.evictions,
+                "fetches": self.fetches,
+            }
+
+
+# 全局转存实例
+payload_store = OffloadedPayloadStore(
+    max_chars=settings.WS_OFFLOAD_MAX_CHARS,
+    ttl=settings.WS_OFFLOAD_TTL_SECONDS,
+)
@@ -0,0 +1,209 @@
+"""
+AutoAgent端口租约管理
+在配置的端口范围内为AutoAgent实例分配端口，释放后的端口通过空闲列表复用
+同一台机器上的多个工作进程各自使用端口范围中互不重叠的一段
+"""
+
+import logging
+import os
+import socket
+import threading
+from collections import deque
+from typing import IO, Any
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 本进程占用的端口分段锁文件，进程退出时由系统释放锁
+_slot_lock_file: IO | None = None
+
+
+class PortExhaustedError(Exception):
+    """端口范围内没有可用端口"""
+
+
+def split_port_range(
+    port_start: int, port_end: int, index: int, slots: int
+) -> tuple[int, int]:
+    """把端口范围等分为slots段，返回第index段，最后一段包含余下的端口"""
+    size = (port_end - port_start + 1) // slots
+    if size < 1:
+        raise ValueError(f"端口范围{port_start}-{port_end}不足以分为{slots}段")
+    start = port_start + index * size
+    end = port_end if index == slots - 1 else start + size - 1
+    return start, end
+
+
+def claim_worker_slot(
+    port_start: int, port_end: int, slots: int, lock_dir: str
+) -> int | None:
+    """
+    在本机上为当前工作进程占用一个端口分段，返回分段序号
+
+    通过对锁文件加非阻塞排他锁占用分段，锁随进程退出释放；所有分段都被占用
+    或平台不支持文件锁时返回None
+    """
+    global _slot_lock_file
+    if fcntl is None:
+        return None
+    os.makedirs(lock_dir, exist_ok=True)
+    for index in range(slots):
+        path = os.path.join(
+            lock_dir, f"alma_autoagent_ports_{port_start}_{port_end}_{index}.lock"
+        )
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        _slot_lock_file = lock_file
+        return index
+    return None
+
+
+def resolve_worker_port_range(
+    port_start: int,
+    port_end: int,
+    slots: int,
+    worker_index: int | None,
+    lock_dir: str,
+) -> tuple[int, int, int | None]:
+    """
+    当前工作进程使用的端口范围
+
+    配置了 worker_index 时直接使用对应分段，否则在本机上占用一个空闲分段；
+    只有一段或无法占用分段时使用整个范围，仅依靠端口占用检查避免冲突
+
+    Returns:
+        (起始端口, 结束端口, 分段序号)
+    """
+    if slots <= 1:
+        return port_start, port_end, None
+    index = worker_index
+    if index is None:
+        index = claim_worker_slot(port_start, port_end, slots, lock_dir)
+    if index is None or not 0 <= index < slots:
+        logger.warning(
+            "无法为工作进程分配独立的AutoAgent端口分段，使用整个端口范围 %d-%d",
+            port_start,
+            port_end,
+        )
+        return port_start, port_end, None
+    start, end = split_port_range(port_start, port_end, index, slots)
+    return start, end, index
+
+
+class PortLeaseManager:
+    """
+    端口租约管理器
+
+    - 优先复用空闲列表中已释放的端口，其次按顺序分配新端口
+    - 可选地检查端口是否已被其他进程占用，被占用的端口会被跳过
+    - 实例创建在执行器线程中进行，所有操作都需要加锁
+    """
+
+    def __init__(
+        self,
+        port_start: int,
+        port_end: int,
+        check_available: bool = True,
+        worker_slot: int | None = None,
+    ):
+        if port_end < port_start:
+            raise ValueError(f"端口范围无效: {port_start}-{port_end}")
+        self.port_start = port_start
+        self.port_end = port_end
+        self.check_available = check_available
+        # 本进程使用的端口分段序号，None表示使用整个范围
+        self.worker_slot = worker_slot
+
+        self._lock = threading.Lock()
+        self._next_port = port_start
+        self._free_ports: deque[int] = deque()
+        # 端口 -> 持有者（会话ID或预热实例名）
+        self._leases: dict[int, str] = {}
+
+        # 统计计数
+        self.total_leased = 0
+        self.reused = 0
+        self.skipped_in_use = 0
+
+    @staticmethod
+    def _is_port_free(port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(("127.0.0.1", port))
+            except OSError:
+                return False
+        return True
+
+    def _next_candidate(self) -> int | None:
+        if self._free_ports:
+            self.reused += 1
+            return self._free_ports.popleft()
+        if self._next_port <= self.port_end:
+            port = self._next_port
+            self._next_port += 1
+            return port
+        return None
+
+    def lease(self, owner: str) -> int:
+        """为owner分配一个端口"""
+        with self._lock:
+            # 被占用的端口最多尝试一轮，避免在端口耗尽时死循环
+            skipped: list[int] = []
+            try:
+                while True:
+                    port = self._next_candidate()
+                    if port is None:
+                        raise PortExhaustedError(
+                            f"AutoAgent端口已耗尽({self.port_start}-{self.port_end})，"
+                            f"当前租约数: {len(self._leases)}"
+                        )
+                    if self.check_available and not self._is_port_free(port):
+                        self.skipped_in_use += 1
+                        skipped.append(port)
+                        continue
+                    self._leases[port] = owner
+                    self.total_leased += 1
+                    return port
+            finally:
+                # 被其他进程占用的端口放回空闲列表末尾，之后再尝试
+                self._free_ports.extend(skipped)
+
+    def release(self, port: int):
+        """释放端口，放回空闲列表"""
+        with self._lock:
+            if self._leases.pop(port, None) is not None:
+                self._free_ports.append(port)
+
+    def reassign(self, port: int, owner: str):
+        """变更端口持有者，例如预热实例绑定到会话时"""
+        with self._lock:
+            if port in self._leases:
+                self._leases[port] = owner
+
+    def get_owner(self, port: int) -> str | None:
+        with self._lock:
+            return self._leases.get(port)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取端口租约统计信息"""
+        with self._lock:
+            capacity = self.port_end - self.port_start + 1
+            return {
+                "port_range": f"{self.port_start}-{self.port_end}",
+                "worker_slot": self.worker_slot,
+                "capacity": capacity,
+                "leased": len(self._leases),
+                "free_list": len(self._free_ports),
+                "never_used": self.port_end - self._next_port + 1,
+                "total_leased": self.total_leased,
+                "reused": self.reused,
+                "skipped_in_use": self.skipped_in_use,
+            }
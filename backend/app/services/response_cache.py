@@ -0,0 +1,124 @@
+"""
+智能体回复缓存
+对完全相同的查询复用之前的AutoAgent结果，按TTL和容量淘汰
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.core.config import settings
+from app.models import Agent, Model
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本，忽略首尾和连续空白的差异"""
+    return _WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+def agent_instruction_version(agent: Agent) -> str:
+    """根据智能体的指令和团队计算版本号，指令变化后旧缓存自动失效"""
+    content = json.dumps(
+        [agent.name, agent.instruction, agent.team or []], ensure_ascii=False
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    精确匹配的回复缓存
+
+    - 键为 (agent_id, 指令版本, 规范化查询, 模型) 的哈希
+    - 超过容量时淘汰最久未使用的条目，过期条目在读取时删除
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(agent: Agent, query: str, model: Model | None = None) -> str:
+        """计算缓存键"""
+        content = json.dumps(
+            [
+                str(agent.agent_id),
+                agent_instruction_version(agent),
+                normalize_query(query),
+                str(model.model_id) if model else None,
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """读取缓存，返回副本，未命中或已过期时返回None"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(value)
+
+    def put(self, key: str, value: dict[str, Any]):
+        """写入缓存"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def is_response_cache_enabled(agent: Agent) -> bool:
+    """全局开关和智能体开关都打开时才使用回复缓存"""
+    return settings.RESPONSE_CACHE_ENABLED and bool(agent.response_cache_enabled)
+
+
+# 全局回复缓存实例
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
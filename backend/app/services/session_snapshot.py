@@ -0,0 +1,64 @@
+"""
+AutoAgent会话快照
+把实例的对话消息和上下文变量压缩保存，实例被淘汰后可以在新实例上恢复
+"""
+
+import json
+import logging
+import zlib
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# 快照格式版本，格式变化后旧快照不再恢复
+SNAPSHOT_VERSION = 1
+
+# 恢复时写回AutoAgentAPI实例的属性
+SNAPSHOT_ATTRIBUTES = ("messages", "context_variables")
+
+
+def dump_snapshot(messages: list[Any], context_variables: dict[str, Any]) -> bytes:
+    """序列化并压缩会话状态，无法序列化的对象转为字符串"""
+    content = json.dumps(
+        {
+            "version": SNAPSHOT_VERSION,
+            "messages": messages,
+            "context_variables": context_variables,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return zlib.compress(content.encode(), level=6)
+
+
+def load_snapshot(data: bytes) -> dict[str, Any] | None:
+    """解压并解析快照，格式不匹配或损坏时返回None"""
+    try:
+        snapshot = json.loads(zlib.decompress(data))
+    except (zlib.error, ValueError) as e:
+        logger.warning("会话快照损坏，已忽略: %s", e)
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def restore_snapshot(api: Any, snapshot: dict[str, Any]) -> bool:
+    """
+    把快照写回AutoAgent实例，只设置实例上已有的属性，返回是否有属性被恢复
+
+    AutoAgentAPI没有公开恢复会话的接口，实例上没有这些属性时快照不起作用，记录警告
+    """
+    restored = []
+    for attribute in SNAPSHOT_ATTRIBUTES:
+        if attribute in snapshot and hasattr(api, attribute):
+            setattr(api, attribute, snapshot[attribute])
+            restored.append(attribute)
+    if not restored:
+        logger.warning(
+            "AutoAgent实例(%s)上没有可恢复的属性 %s，会话快照未生效",
+            type(api).__name__,
+            ", ".join(SNAPSHOT_ATTRIBUTES),
+        )
+    return bool(restored)
@@ -0,0 +1,412 @@
+"""
+会话状态存储
+把会话归属、事件摘要和事件序号放到进程外，多个工作进程可以共享会话状态
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.db.repository import (
+    allocate_session_sequence,
+    bind_session_state_worker,
+    clear_session_state,
+    get_session_state,
+    get_session_state_snapshot,
+    release_session_state_worker,
+    update_session_state_snapshot,
+    update_session_state_summary,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_worker_id() -> str:
+    """当前工作进程的标识，未配置时使用 主机名:进程号"""
+    return settings.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionStateStore(ABC):
+    """
+    会话状态存储接口
+
+    - bind/release 记录会话的AutoAgent实例由哪个工作进程持有，作为粘性路由的依据
+    - 事件序号按块申请，块内的序号在本进程内分配，跨进程保持单调递增
+    - discard 在会话结束时删除其全部状态
+    - blocking 为True的存储在事件循环中通过 call/submit/next_sequence_async 访问，
+      实际读写在本进程唯一的存储线程中按提交顺序执行，不阻塞事件循环
+    """
+
+    # 访问存储是否会阻塞（如访问数据库）
+    blocking = False
+
+    def __init__(self, worker_id: str, sequence_block_size: int):
+        self.worker_id = worker_id
+        self.sequence_block_size = sequence_block_size
+
+        self._sequence_lock = threading.Lock()
+        # 每个会话在本进程内可用的序号区间 [next, end]
+        self._sequence_blocks: dict[str, list[int]] = {}
+        # 事件循环中申请序号块时按会话排队，保证序号按申请顺序分配
+        self._allocation_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._executor: ThreadPoolExecutor | None = None
+
+        # 统计计数
+        self.sequence_blocks_allocated = 0
+        self.write_failures = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # 单线程执行，同一进程对存储的读写保持提交顺序
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="session-store"
+            )
+        return self._executor
+
+    async def call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在事件循环中调用存储方法并等待结果，阻塞的存储在存储线程中执行"""
+        if not self.blocking:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(func, *args)
+        )
+
+    def submit(self, func: Callable[..., Any], *args: Any):
+        """
+        提交不需要等待结果的写入，失败时只记录日志，不影响对话
+
+        阻塞的存储在存储线程中按提交顺序执行，调用方立即返回
+        """
+        if not self.blocking:
+            self._run_write(func, *args)
+            return
+        self._get_executor().submit(self._run_write, func, *args)
+
+    def _run_write(self, func: Callable[..., Any], *args: Any):
+        try:
+            func(*args)
+        except Exception as e:
+            self.write_failures += 1
+            logger.warning("会话状态存储写入失败: %s", e)
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict[str, Any] | None:
+        """获取会话状态，不存在时返回None"""
+
+    @abstractmethod
+    def bind(self, session_id: str, port: int | None = None):
+        """记录本进程持有会话的AutoAgent实例"""
+
+    @abstractmethod
+    def release(self, session_id: str):
+        """本进程释放会话的AutoAgent实例"""
+
+    @abstractmethod
+    def update_events_summary(self, session_id: str, events_summary: dict[str, Any]):
+        """保存会话的事件摘要"""
+
+    @abstractmethod
+    def save_snapshot(self, session_id: str, snapshot: bytes | None):
+        """保存会话快照，传入None时清除"""
+
+    @abstractmethod
+    def load_snapshot(self, session_id: str) -> bytes | None:
+        """读取会话快照"""
+
+    @abstractmethod
+    def _allocate_sequence_block(self, session_id: str, count: int) -> int:
+        """申请count个序号，返回申请到的最大序号"""
+
+    def _take_sequence(self, session_id: str) -> int | None:
+        """从本进程缓存的序号块中取下一个序号，块已用完时返回None"""
+        block = self._sequence_blocks.get(session_id)
+        if block is None or block[0] > block[1]:
+            return None
+        sequence = block[0]
+        block[0] += 1
+        return sequence
+
+    def _install_sequence_block(self, session_id: str, end: int) -> int:
+        """缓存新申请的序号块，返回块中的第一个序号"""
+        start = end - self.sequence_block_size + 1
+        self._sequence_blocks[session_id] = [start + 1, end]
+        self.sequence_blocks_allocated += 1
+        return start
+
+    def next_sequence(self, session_id: str) -> int:
+        """分配会话的下一个事件序号，块用完时同步申请新块"""
+        with self._sequence_lock:
+            sequence = self._take_sequence(session_id)
+            if sequence is None:
+                end = self._allocate_sequence_block(
+                    session_id, self.sequence_block_size
+                )
+                sequence = self._install_sequence_block(session_id, end)
+            return sequence
+
+    async def next_sequence_async(self, session_id: str) -> int:
+        """在事件循环中分配会话的下一个事件序号，申请新块时在存储线程中访问存储"""
+        if not self.blocking:
+            return self.next_sequence(session_id)
+        lock = self._allocation_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._allocation_locks[session_id] = lock
+        async with lock:
+            with self._sequence_lock:
+                sequence = self._take_sequence(session_id)
+            if sequence is None:
+                end = await self.call(
+                    self._allocate_sequence_block, session_id, self.sequence_block_size
+                )
+                with self._sequence_lock:
+                    sequence = self._install_sequence_block(session_id, end)
+            return sequence
+
+    @abstractmethod
+    def discard(self, session_id: str):
+        """
+        会话结束时删除其状态和快照，事件序号保留
+
+        客户端可能带着之前收到的序号重连同一会话，序号从1重新开始会被客户端当作已收到而丢弃
+        """
+
+    def forget_sequences(self, session_id: str):
+        """丢弃本进程缓存的序号块，会话迁移到其他进程前调用"""
+        with self._sequence_lock:
+            self._sequence_blocks.pop(session_id, None)
+
+    def get_owner(self, session_id: str) -> str | None:
+        """持有会话的工作进程，用于粘性路由提示"""
+        state = self.get(session_id)
+        return state.get("worker_id") if state else None
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取存储统计信息"""
+        return {
+            "backend": type(self).__name__,
+            "worker_id": self.worker_id,
+            "cached_sequence_blocks": len(self._sequence_blocks),
+            "sequence_blocks_allocated": self.sequence_blocks_allocated,
+            "write_failures": self.write_failures,
+        }
+
+
+class InMemorySessionStateStore(SessionStateStore):
+    """
+    进程内存储，适用于单工作进程部署
+
+    快照按保存时间排列，超过 snapshot_ttl 秒或总大小超过 snapshot_max_bytes 时淘汰最早的快照
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        sequence_block_size: int,
+        snapshot_ttl: float = 2 * 60 * 60,
+        snapshot_max_bytes: int = 64 * 1024 * 1024,
+    ):
+        super().__init__(worker_id, sequence_block_size)
+        self.snapshot_ttl = snapshot_ttl
+        self.snapshot_max_bytes = snapshot_max_bytes
+        self._lock = threading.Lock()
+        self._states: dict[str, dict[str, Any]] = {}
+        # 会话ID -> (保存时间, 快照)
+        self._snapshots: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._snapshot_bytes = 0
+        self.snapshots_expired = 0
+
+    def _state(self, session_id: str) -> dict[str, Any]:
+        state = self._states.get(session_id)
+        if state is None:
+            state = {
+                "session_id": session_id,
+                "worker_id": None,
+                "port": None,
+                "event_sequence": 0,
+                "events_summary": None,
+            }
+            self._states[session_id] = state
+        return state
+
+    def get(self, session_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            state = self._states.get(session_id)
+            return dict(state) if state else None
+
+    def bind(self, session_id: str, port: int | None = None):
+        with self._lock:
+            state = self._state(session_id)
+            state["worker_id"] = self.worker_id
+            state["port"] = port
+
+    def release(self, session_id: str):
+        """
+        释放会话，没有分配过事件序号的会话直接删除状态
+
+        已分配序号的会话仍可能有WebSocket连接在推送消息，保留序号避免重新从1开始，
+        其余状态在会话结束调用 discard 时删除
+        """
+        with self._lock:
+            state = self._states.get(session_id)
+            if state and state["worker_id"] == self.worker_id:
+                if state["event_sequence"] == 0:
+                    del self._states[session_id]
+                else:
+                    state["worker_id"] = None
+                    state["port"] = None
+        self.forget_sequences(session_id)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            state = self._states.pop(session_id, None)
+            if state and state["event_sequence"] > 0:
+                self._state(session_id)["event_sequence"] = state["event_sequence"]
+            self._drop_snapshot(session_id)
+        self.forget_sequences(session_id)
+
+    def update_events_summary(self, session_id: str, events_summary: dict[str, Any]):
+        with self._lock:
+            self._state(session_id)["events_summary"] = events_summary
+
+    def _drop_snapshot(self, session_id: str):
+        item = self._snapshots.pop(session_id, None)
+        if item is not None:
+            self._snapshot_bytes -= len(item[1])
+
+    def _trim_snapshots(self):
+        expire_before = time.monotonic() - self.snapshot_ttl
+        while self._snapshots:
+            session_id, (saved_at, _) = next(iter(self._snapshots.items()))
+            if (
+                saved_at >= expire_before
+                and self._snapshot_bytes <= self.snapshot_max_bytes
+            ):
+                break
+            self._drop_snapshot(session_id)
+            self.snapshots_expired += 1
+
+    def save_snapshot(self, session_id: str, snapshot: bytes | None):
+        with self._lock:
+            self._drop_snapshot(session_id)
+            if snapshot is not None:
+                self._snapshots[session_id] = (time.monotonic(), snapshot)
+                self._snapshot_bytes += len(snapshot)
+            self._trim_snapshots()
+
+    def load_snapshot(self, session_id: str) -> bytes | None:
+        with self._lock:
+            self._trim_snapshots()
+            item = self._snapshots.get(session_id)
+            return item[1] if item else None
+
+    def _allocate_sequence_block(self, session_id: str, count: int) -> int:
+        with self._lock:
+            state = self._state(session_id)
+            state["event_sequence"] += count
+            return state["event_sequence"]
+
+    def get_stats(self) -> dict[str, Any]:
+        stats = super().get_stats()
+        stats["sessions"] = len(self._states)
+        stats["snapshots"] = len(self._snapshots)
+        stats["snapshot_bytes"] = self._snapshot_bytes
+        stats["snapshots_expired"] = self.snapshots_expired
+        return stats
+
+
+class PostgresSessionStateStore(SessionStateStore):
+    """基于Postgres的存储，多个工作进程或多台机器共享，事件循环中的访问在存储线程中执行"""
+
+    blocking = True
+
+    def __init__(self, engine: Any, worker_id: str, sequence_block_size: int):
+        super().__init__(worker_id, sequence_block_size)
+        self.engine = engine
+
+    def get(self, session_id: str) -> dict[str, Any] | None:
+        with Session(self.engine) as session:
+            state = get_session_state(session=session, session_id=session_id)
+            return state.model_dump(exclude={"snapshot"}) if state else None
+
+    def bind(self, session_id: str, port: int | None = None):
+        with Session(self.engine) as session:
+            bind_session_state_worker(
+                session=session,
+                session_id=session_id,
+                worker_id=self.worker_id,
+                port=port,
+            )
+
+    def release(self, session_id: str):
+        with Session(self.engine) as session:
+            release_session_state_worker(
+                session=session, session_id=session_id, worker_id=self.worker_id
+            )
+        self.forget_sequences(session_id)
+
+    def discard(self, session_id: str):
+        with Session(self.engine) as session:
+            clear_session_state(
+                session=session, session_id=session_id, worker_id=self.worker_id
+            )
+        self.forget_sequences(session_id)
+
+    def update_events_summary(self, session_id: str, events_summary: dict[str, Any]):
+        with Session(self.engine) as session:
+            update_session_state_summary(
+                session=session, session_id=session_id, events_summary=events_summary
+            )
+
+    def save_snapshot(self, session_id: str, snapshot: bytes | None):
+        with Session(self.engine) as session:
+            update_session_state_snapshot(
+                session=session, session_id=session_id, snapshot=snapshot
+            )
+
+    def load_snapshot(self, session_id: str) -> bytes | None:
+        with Session(self.engine) as session:
+            return get_session_state_snapshot(session=session, session_id=session_id)
+
+    def _allocate_sequence_block(self, session_id: str, count: int) -> int:
+        with Session(self.engine) as session:
+            return allocate_session_sequence(
+                session=session, session_id=session_id, count=count
+            )
+
+
+def create_session_store() -> SessionStateStore:
+    """根据配置创建会话状态存储"""
+    worker_id = get_worker_id()
+    if settings.SESSION_STORE_BACKEND == "postgres":
+        from app.db.session import engine
+
+        return PostgresSessionStateStore(
+            engine, worker_id, settings.SESSION_SEQUENCE_BLOCK_SIZE
+        )
+    return InMemorySessionStateStore(
+        worker_id,
+        settings.SESSION_SEQUENCE_BLOCK_SIZE,
+        snapshot_ttl=settings.AUTOAGENT_SNAPSHOT_TTL_SECONDS,
+        snapshot_max_bytes=settings.AUTOAGENT_SNAPSHOT_MAX_BYTES,
+    )
+
+
+# 全局会话状态存储实例
+session_store = create_session_store()
@@ -0,0 +1,65 @@
+"""
+单飞请求合并
+同一个键的请求在执行期间只运行一次，后到的调用方等待并共享同一个结果
+"""
+
+import asyncio
+import hashlib
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+def message_digest(message: str) -> str:
+    """计算消息内容的哈希，用于识别重复提交"""
+    return hashlib.sha256(message.strip().encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    进行中请求的合并器
+
+    - 首个调用方创建任务，之后同键的调用方直接等待该任务
+    - 所有调用方都通过 shield 等待，单个调用方取消不会中断共享的任务
+    - 任务结束后立即移除，之后的同键请求会重新执行
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+        # 统计计数
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 标记异常已被读取，调用方都已取消时避免未读取异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    async def run(
+        self,
+        key: Hashable,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> tuple[Any, bool]:
+        """执行或加入同键的请求，返回 (结果, 是否为合并的调用)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task), shared
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取合并统计信息"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,374 @@
+"""
+团队智能体编排
+把团队智能体收到的请求并行分派给各成员智能体，成员结果汇总后由团队智能体生成最终回复
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import chat_stage_seconds
+from app.db.repository import get_active_agents_by_user, get_system_agents
+from app.models import Agent, Message
+from app.services.agent_executor import agent_executor
+from app.services.cancellation import CancelToken
+from app.services.context_builder import context_builder
+from app.services.event_bridge import AgentEventBridge
+
+if TYPE_CHECKING:
+    from app.services.agent_service import AgentDialogueService, AutoAgentEventHandler
+
+logger = logging.getLogger(__name__)
+
+# 成员分支实例的会话ID为 {会话ID}{分隔符}{成员名}
+BRANCH_SESSION_SEPARATOR = "#team:"
+
+# 汇总时各分支状态的说明
+BRANCH_STATUS_LABELS = {
+    "completed": "已完成",
+    "timeout": "超时，以下为部分结果",
+    "cancelled": "已取消，以下为部分结果",
+    "failed": "执行失败",
+    "skipped": "未执行",
+}
+
+RealtimeCallback = Callable[[str, str, dict[str, Any]], Awaitable[None]]
+
+
+def branch_session_id(session_id: str, member_name: str) -> str:
+    """成员分支使用的AutoAgent实例会话ID"""
+    return f"{session_id}{BRANCH_SESSION_SEPARATOR}{member_name}"
+
+
+class TeamOrchestrator:
+    """
+    团队智能体的并行分派
+
+    - 每个成员在独立的AutoAgent实例上运行，同时运行的分支数受max_parallel限制，
+      且不超过执行器的单用户并发上限，避免分支在执行器中排队时耗掉超时时间
+    - 分支超时后触发该分支的取消令牌，不再等待，使用已产生的部分回复
+    - 分支的实时事件带上 branch/branch_index 标记，与其他分支的事件交错推送
+    - 所有分支结束后把结果拼入用户消息，交给团队智能体汇总
+    """
+
+    def __init__(
+        self,
+        service: "AgentDialogueService",
+        max_parallel: int,
+        branch_timeout: float,
+        result_max_chars: int,
+    ):
+        self.service = service
+        self.max_parallel = max_parallel
+        self.branch_timeout = branch_timeout
+        self.result_max_chars = result_max_chars
+
+        # 统计计数
+        self.runs = 0
+        self.branch_status_counts: dict[str, int] = {}
+
+    def member_names(self, agent: Agent) -> list[str]:
+        """团队成员名，去掉重复项和团队智能体自身"""
+        names: list[str] = []
+        for name in agent.team or []:
+            name = name.strip()
+            if name and name != agent.name and name not in names:
+                names.append(name)
+        return names
+
+    def parallel_limit(self) -> int:
+        """同时运行的分支数，分支与团队智能体共用同一用户的执行器名额"""
+        return max(1, min(self.max_parallel, agent_executor.max_concurrent_per_user))
+
+    def should_fan_out(self, agent: Agent) -> bool:
+        """是否对该智能体使用并行分派"""
+        return settings.AGENT_TEAM_FANOUT_ENABLED and bool(self.member_names(agent))
+
+    def _resolve_members(self, session: Session, agent: Agent) -> list[Agent]:
+        """按名称找到成员智能体，优先使用同一用户的智能体，找不到时按名称临时创建"""
+        candidates: list[Agent] = []
+        if session is not None:
+            if agent.user_id is not None:
+                candidates.extend(
+                    get_active_agents_by_user(session=session, user_id=agent.user_id)
+                )
+            candidates.extend(get_system_agents(session=session))
+
+        by_name: dict[str, Agent] = {}
+        for candidate in candidates:
+            by_name.setdefault(candidate.name, candidate)
+
+        members = []
+        for name in self.member_names(agent):
+            member = by_name.get(name)
+            if member is None:
+                member = Agent(
+                    name=name,
+                    instruction=f"你是{agent.name}团队的成员{name}，请从该角色的专业角度处理任务。",
+                )
+            members.append(member)
+        return members
+
+    def _branch_message(self, agent: Agent, user_message: str) -> str:
+        return (
+            f"{user_message}\n\n"
+            f"（你正在作为{agent.name}团队的成员独立处理该请求，"
+            f"你的结果会交给{agent.name}汇总。）"
+        )
+
+    def _merge_message(
+        self, agent: Agent, user_message: str, branches: list[dict[str, Any]]
+    ) -> str:
+        """把各分支结果拼入用户消息，交给团队智能体汇总"""
+        parts = [
+            user_message,
+            f"\n以下是{agent.name}团队成员对该请求的处理结果，请综合这些结果回复用户：",
+        ]
+        for branch in branches:
+            label = BRANCH_STATUS_LABELS.get(branch["status"], branch["status"])
+            text = branch["response"] or branch.get("error") or "（无结果）"
+            if len(text) > self.result_max_chars:
+                text = text[: self.result_max_chars] + "…"
+            parts.append(f"\n【{branch['member']}】（{label}）\n{text}")
+        return "\n".join(parts)
+
+    async def _emit(
+        self,
+        realtime_callback: RealtimeCallback | None,
+        event_type: str,
+        agent_name: str,
+        data: dict[str, Any],
+    ):
+        if realtime_callback is None:
+            return
+        data["timestamp"] = datetime.now().isoformat()
+        try:
+            await realtime_callback(event_type, agent_name, data)
+        except Exception:
+            logger.exception("实时事件推送异常")
+
+    def _finish_branch(self, branch_id: str, event_handler: "AutoAgentEventHandler"):
+        """分支的AutoAgent调用真正结束后归还实例"""
+        self.service.release_instance(branch_id, event_handler)
+
+    def _count_status(self, status: str):
+        self.branch_status_counts[status] = self.branch_status_counts.get(status, 0) + 1
+
+    async def _run_branch(
+        self,
+        index: int,
+        member: Agent,
+        query: str,
+        session_id: str,
+        user_id: Any,
+        cancel_token: CancelToken | None,
+        realtime_callback: RealtimeCallback | None,
+        semaphore: asyncio.Semaphore,
+    ) -> dict[str, Any]:
+        """运行单个成员分支，返回分支结果"""
+        tags = {"branch": member.name, "branch_index": index}
+        branch = {
+            "member": member.name,
+            "branch_index": index,
+            "status": "completed",
+            "response": "",
+            "error": None,
+            "duration": 0.0,
+        }
+
+        async with semaphore:
+            started_at = time.monotonic()
+            branch_id = branch_session_id(session_id, member.name)
+            branch_token = CancelToken(parent=cancel_token)
+
+            entry = self.service.instance_pool.peek(branch_id)
+            if branch_token.cancelled:
+                branch["status"] = "cancelled"
+                self._count_status("cancelled")
+                return branch
+            if entry is not None and entry.in_use:
+                # 上一次超时的分支还没有在检查点停下
+                branch["status"] = "skipped"
+                branch["error"] = "该成员上一次的任务仍在运行"
+                self._count_status("skipped")
+                return branch
+
+            await self._emit(
+                realtime_callback, "team_branch_start", member.name, {**tags}
+            )
+
+            event_handler = None
+            event_bridge = None
+            run_task = None
+            try:
+                api, event_handler = await self.service.acquire_instance(
+                    branch_id, user_id
+                )
+                event_handler.clear_current_session()
+
+                if realtime_callback is not None:
+
+                    async def deliver_event(event):
+                        await realtime_callback(
+                            event.event_type,
+                            event.data.get("agent_name", member.name),
+                            {**event.data, **tags},
+                        )
+
+                    event_bridge = AgentEventBridge(
+                        loop=asyncio.get_running_loop(),
+                        consumer=deliver_event,
+                        max_size=settings.AGENT_EVENT_BRIDGE_MAX_SIZE,
+                        policy=settings.AGENT_EVENT_BRIDGE_OVERFLOW_POLICY,
+                    )
+                    event_bridge.start()
+                    event_handler.realtime_sink = event_bridge.push
+
+                run_task = asyncio.ensure_future(
+                    agent_executor.run(
+                        self.service.run_query,
+                        api,
+                        event_handler,
+                        query,
+                        branch_token,
+                        user_id=user_id,
+                    )
+                )
+                # 分支超时不超过整个对话的截止时间
+                timeout = self.branch_timeout
+                remaining = branch_token.remaining()
+                if remaining is not None:
+                    timeout = min(timeout, remaining)
+                done, _ = await asyncio.wait({run_task}, timeout=timeout)
+
+                if not done:
+                    # 分支线程在下一个检查点停止，这里不再等待
+                    branch_token.cancel("branch_timeout")
+                    branch["status"] = "timeout"
+                    branch["response"] = event_handler.get_partial_response()
+                else:
+                    result = run_task.result()
+                    if result.get("cancelled"):
+                        branch["status"] = "cancelled"
+                        branch["response"] = event_handler.get_partial_response()
+                    elif result.get("success"):
+                        branch["response"] = result.get("result", "")
+                        self.service.remember_session_state(branch_id, result)
+                    else:
+                        branch["status"] = "failed"
+                        branch["error"] = result.get("error", "成员智能体处理失败")
+            except asyncio.CancelledError:
+                branch_token.cancel("cancelled")
+                raise
+            except Exception as e:
+                logger.warning("团队成员分支执行失败: %s (%s)", member.name, e)
+                branch["status"] = "failed"
+                branch["error"] = str(e)
+            finally:
+                if event_bridge is not None:
+                    event_handler.realtime_sink = None
+                    await event_bridge.aclose()
+                if event_handler is not None:
+                    if run_task is None or run_task.done():
+                        self._finish_branch(branch_id, event_handler)
+                    else:
+
+                        def finish_later(task: asyncio.Task, handler=event_handler):
+                            # 标记异常已被读取，分支已被放弃时避免未读取异常的警告
+                            if not task.cancelled():
+                                task.exception()
+                            self._finish_branch(branch_id, handler)
+
+                        run_task.add_done_callback(finish_later)
+
+            branch["duration"] = round(time.monotonic() - started_at, 3)
+            self._count_status(branch["status"])
+            await self._emit(
+                realtime_callback,
+                "team_branch_complete",
+                member.name,
+                {
+                    **tags,
+                    "status": branch["status"],
+                    "duration": branch["duration"],
+                    "response_chars": len(branch["response"]),
+                },
+            )
+            return branch
+
+    async def fan_out(
+        self,
+        session: Session,
+        agent: Agent,
+        user_message: str,
+        conversation_history: list[Message],
+        session_id: str,
+        user_id: Any = None,
+        cancel_token: CancelToken | None = None,
+        realtime_callback: RealtimeCallback | None = None,
+    ) -> tuple[str, list[dict[str, Any]]]:
+        """
+        并行运行所有成员分支
+
+        Returns:
+            (交给团队智能体汇总的消息, 各分支结果)
+        """
+        self.runs += 1
+        members = self._resolve_members(session, agent)
+        branch_message = self._branch_message(agent, user_message)
+        semaphore = asyncio.Semaphore(self.parallel_limit())
+
+        logger.info(
+            "团队并行分派",
+            extra={
+                "session_id": session_id,
+                "agent_name": agent.name,
+                "members": [member.name for member in members],
+            },
+        )
+
+        with chat_stage_seconds.time("team_fanout"):
+            branches = await asyncio.gather(
+                *[
+                    self._run_branch(
+                        index,
+                        member,
+                        context_builder.build(
+                            session, member, branch_message, conversation_history
+                        ),
+                        session_id,
+                        user_id,
+                        cancel_token,
+                        realtime_callback,
+                        semaphore,
+                    )
+                    for index, member in enumerate(members)
+                ]
+            )
+        return self._merge_message(agent, user_message, branches), branches
+
+    def cleanup(self, session_id: str):
+        """移除会话下空闲的成员分支实例"""
+        prefix = f"{session_id}{BRANCH_SESSION_SEPARATOR}"
+        for branch_id in self.service.instance_pool.session_ids():
+            if branch_id.startswith(prefix):
+                entry = self.service.instance_pool.peek(branch_id)
+                if entry is not None and not entry.in_use:
+                    self.service.instance_pool.remove(branch_id)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取团队编排统计信息"""
+        return {
+            "enabled": settings.AGENT_TEAM_FANOUT_ENABLED,
+            "max_parallel": self.max_parallel,
+            "parallel_limit": self.parallel_limit(),
+            "branch_timeout": self.branch_timeout,
+            "runs": self.runs,
+            "branches": dict(self.branch_status_counts),
+        }
@@ -0,0 +1,314 @@
+"""
+工具结果缓存
+对开启了缓存的确定性工具，相同参数的调用跨会话复用之前的结果，按TTL和容量淘汰
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics_registry
+from app.db.repository import get_cacheable_tools
+
+logger = logging.getLogger(__name__)
+
+# AutoAgent传给工具的会话上下文，不参与缓存键
+IGNORED_ARGUMENTS = frozenset({"context_variables"})
+
+# 可以缓存的结果类型，其他类型（如带上下文更新的Result对象）不缓存
+CACHEABLE_RESULT_TYPES = (str, int, float, bool, list, dict)
+
+# 工具缓存命中和未命中次数
+tool_cache_requests_total = metrics_registry.counter(
+    "alma_tool_cache_requests_total",
+    "Tool result cache lookups by tool and result",
+    ("tool", "result"),
+)
+
+
+def canonicalize_arguments(
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    signature: inspect.Signature | None = None,
+) -> str:
+    """
+    把工具参数转为规范的JSON文本
+
+    按函数签名把位置参数转为关键字参数并补齐默认值，字典键排序，
+    JSON字符串形式的参数先解析，保证相同参数的不同写法得到同一个键
+    """
+    if signature is not None:
+        try:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            args, kwargs = (), dict(bound.arguments)
+        except TypeError:
+            pass
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            stripped = value.strip()
+            if stripped[:1] in ("{", "["):
+                try:
+                    return json.loads(stripped)
+                except ValueError:
+                    pass
+        return value
+
+    content = {
+        "args": [normalize(value) for value in args],
+        "kwargs": {
+            key: normalize(value)
+            for key, value in kwargs.items()
+            if key not in IGNORED_ARGUMENTS
+        },
+    }
+    return json.dumps(
+        content, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+
+
+class ToolCachePolicy:
+    """单个工具的缓存策略"""
+
+    __slots__ = ("version", "ttl")
+
+    def __init__(self, version: int, ttl: float):
+        self.version = version
+        self.ttl = ttl
+
+
+class ToolResultCache:
+    """
+    工具结果缓存
+
+    - 键为 (工具名, 规范化参数, 工具版本) 的哈希
+    - 只缓存Tool.is_cacheable为True的工具，策略从数据库定期刷新
+    - 超过容量时淘汰最久未使用的条目，超过大小上限的结果不缓存
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        default_ttl: float,
+        max_result_bytes: int,
+        refresh_interval: float,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_result_bytes = max_result_bytes
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._policies: dict[str, ToolCachePolicy] = {}
+        self._refresh_task: asyncio.Task | None = None
+        self._wrapped_tools: set[str] = set()
+
+        # 统计计数，按工具记录命中和未命中
+        self.tool_hits: dict[str, int] = {}
+        self.tool_misses: dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.skipped = 0
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: str, version: int) -> str:
+        """计算缓存键"""
+        content = json.dumps([tool_name, arguments, version], ensure_ascii=False)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def set_policies(self, policies: dict[str, ToolCachePolicy]):
+        """替换全部工具的缓存策略"""
+        self._policies = policies
+
+    def policy(self, tool_name: str) -> ToolCachePolicy | None:
+        """工具的缓存策略，未开启缓存时返回None"""
+        return self._policies.get(tool_name)
+
+    def load_policies(self, session: Session):
+        """从数据库加载开启了缓存的工具"""
+        self.set_policies(
+            {
+                tool.name: ToolCachePolicy(
+                    version=tool.version,
+                    ttl=tool.cache_ttl_seconds or self.default_ttl,
+                )
+                for tool in get_cacheable_tools(session=session)
+            }
+        )
+
+    def _record(self, tool_name: str, hit: bool):
+        counts = self.tool_hits if hit else self.tool_misses
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+        tool_cache_requests_total.inc(tool_name, "hit" if hit else "miss")
+
+    def get(self, key: str, tool_name: str) -> tuple[bool, Any]:
+        """读取缓存，返回 (是否命中, 结果副本)"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() > item[0]:
+                del self._entries[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self._record(tool_name, False)
+                return False, None
+            self._entries.move_to_end(key)
+            self._record(tool_name, True)
+            return True, copy.deepcopy(item[1])
+
+    def put(self, key: str, value: Any, ttl: float):
+        """写入缓存，结果类型不可缓存或超过大小上限时跳过"""
+        if not isinstance(value, CACHEABLE_RESULT_TYPES):
+            self.skipped += 1
+            return
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode())
+        if size > self.max_result_bytes:
+            self.skipped += 1
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def wrap(self, tool_name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """包装工具函数，开启了缓存的工具先查缓存，未命中时调用原函数并写入缓存"""
+
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            signature = None
+
+        @functools.wraps(func)
+        def cached_tool(*args: Any, **kwargs: Any) -> Any:
+            policy = self.policy(tool_name)
+            if policy is None:
+                return func(*args, **kwargs)
+            key = self.make_key(
+                tool_name,
+                canonicalize_arguments(args, kwargs, signature),
+                policy.version,
+            )
+            hit, result = self.get(key, tool_name)
+            if hit:
+                return result
+            result = func(*args, **kwargs)
+            self.put(key, result, policy.ttl)
+            return result
+
+        cached_tool.__wrapped_by_tool_cache__ = True
+        return cached_tool
+
+    def install(self) -> int:
+        """
+        包装AutoAgent工具注册表中的工具，返回包装的工具数
+
+        AutoAgent未提供工具注册表或没有可包装的工具时跳过并记录警告，不影响对话；
+        此时工具调用不会经过缓存
+        """
+        try:
+            from autoagent.registry import registry
+        except ImportError:
+            logger.warning("AutoAgent未提供工具注册表，工具结果缓存不会生效")
+            return 0
+
+        tools = getattr(registry, "tools", None)
+        if not isinstance(tools, dict):
+            logger.warning("AutoAgent工具注册表格式不支持，工具结果缓存不会生效")
+            return 0
+
+        wrapped = 0
+        for tool_name, func in list(tools.items()):
+            if not callable(func) or getattr(func, "__wrapped_by_tool_cache__", False):
+                continue
+            tools[tool_name] = self.wrap(tool_name, func)
+            self._wrapped_tools.add(tool_name)
+            wrapped += 1
+        if wrapped == 0:
+            logger.warning(
+                "AutoAgent工具注册表中没有可包装的工具，工具结果缓存不会生效"
+            )
+        else:
+            logger.info("工具结果缓存已包装 %d 个工具", wrapped)
+        return wrapped
+
+    def _refresh_policies(self):
+        from app.db.session import engine
+
+        with Session(engine) as session:
+            self.load_policies(session)
+
+    async def _refresh_loop(self):
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self._refresh_policies)
+                except Exception as e:
+                    logger.warning("刷新工具缓存策略失败: %s", e)
+                await asyncio.sleep(self.refresh_interval)
+        except asyncio.CancelledError:
+            pass
+
+    def start_refresher(self):
+        """启动定期刷新缓存策略的后台任务，需要在事件循环中调用"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresher(self):
+        """停止后台刷新任务"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计信息，包含每个工具的命中率"""
+        with self._lock:
+            tools = {}
+            for tool_name in set(self.tool_hits) | set(self.tool_misses):
+                hits = self.tool_hits.get(tool_name, 0)
+                misses = self.tool_misses.get(tool_name, 0)
+                tools[tool_name] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": hits / (hits + misses),
+                }
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "default_ttl_seconds": self.default_ttl,
+                "cacheable_tools": sorted(self._policies),
+                "wrapped_tools": len(self._wrapped_tools),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "skipped": self.skipped,
+                "tools": tools,
+            }
+
+
+# 全局工具结果缓存实例
+tool_result_cache = ToolResultCache(
+    max_entries=settings.TOOL_CACHE_MAX_ENTRIES,
+    default_ttl=settings.TOOL_CACHE_DEFAULT_TTL_SECONDS,
+    max_result_bytes=settings.TOOL_CACHE_MAX_RESULT_BYTES,
+    refresh_interval=settings.TOOL_CACHE_POLICY_REFRESH_SECONDS,
+)
@@ -0,0 +1,146 @@
+"""
+AutoAgent预热实例池
+在后台提前创建并初始化AutoAgent实例，新会话直接取用，降低首条消息延迟
+"""
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from app.services.agent_executor import agent_executor
+
+logger = logging.getLogger(__name__)
+
+# 预热任务在执行器中使用的用户标识，受单用户并发上限约束
+WARM_POOL_USER = "__warm_pool__"
+
+
+class WarmInstancePool:
+    """
+    预热实例池
+
+    - factory 为同步函数，返回已初始化的实例元组，在执行器线程中调用
+    - take() 取走一个预热实例后异步补充，池为空时由调用方冷启动创建
+    - on_discard 在预热实例未被使用就被丢弃时调用，用于释放端口等资源
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], tuple[Any, ...]],
+        target_size: int,
+        on_discard: Callable[[tuple[Any, ...]], None] | None = None,
+    ):
+        self.factory = factory
+        self.target_size = target_size
+        self.on_discard = on_discard
+
+        self._ready: deque[tuple[Any, ...]] = deque()
+        self._creating = 0
+        self._refill_task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+        # 统计计数
+        self.warm_hits = 0
+        self.cold_misses = 0
+        self.created = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def take(self) -> tuple[Any, ...] | None:
+        """取出一个预热实例，没有可用实例时返回None"""
+        if self._ready:
+            self.warm_hits += 1
+            instance = self._ready.popleft()
+        else:
+            self.cold_misses += 1
+            instance = None
+        self.schedule_refill()
+        return instance
+
+    def schedule_refill(self):
+        """在后台补充实例到目标数量"""
+        if self.target_size <= 0:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        try:
+            while len(self._ready) + self._creating < self.target_size:
+                self._creating += 1
+                try:
+                    instance = await agent_executor.run(
+                        self.factory, user_id=WARM_POOL_USER
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning("预热AutoAgent实例失败: %s", e)
+                    return
+                finally:
+                    self._creating -= 1
+
+                self._ready.append(instance)
+                self.created += 1
+                self._changed.set()
+        except asyncio.CancelledError:
+            pass
+
+    async def wait_until_ready(self, min_size: int, timeout: float) -> bool:
+        """等待池中实例数达到min_size，超时返回False"""
+        min_size = min(min_size, self.target_size)
+
+        async def wait():
+            while len(self._ready) < min_size:
+                self._changed.clear()
+                if self._refill_task is None or self._refill_task.done():
+                    # 补充任务因失败提前结束时重新调度
+                    self.schedule_refill()
+                await self._changed.wait()
+
+        try:
+            await asyncio.wait_for(wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def start(self, block: bool = False, min_size: int = 0, timeout: float = 60):
+        """启动预热，block为True时等待达到最小实例数"""
+        self.schedule_refill()
+        if block and min_size > 0:
+            if await self.wait_until_ready(min_size, timeout):
+                logger.info("AutoAgent预热池就绪: %d 个实例", len(self._ready))
+            else:
+                logger.warning(
+                    "AutoAgent预热池启动超时，当前 %d 个实例", len(self._ready)
+                )
+
+    async def stop(self):
+        """停止后台补充任务并丢弃预热实例"""
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+        while self._ready:
+            instance = self._ready.popleft()
+            if self.on_discard is not None:
+                self.on_discard(instance)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取预热池统计信息"""
+        takes = self.warm_hits + self.cold_misses
+        return {
+            "ready": len(self._ready),
+            "creating": self._creating,
+            "target_size": self.target_size,
+            "warm_hits": self.warm_hits,
+            "cold_misses": self.cold_misses,
+            "warm_hit_ratio": self.warm_hits / takes if takes else 0.0,
+            "created": self.created,
+            "failed": self.failed,
+        }
@@ -0,0 +1,78 @@
+"""
+WebSocket消息重放缓冲
+保留每个会话最近推送的带序号消息，客户端断线重连后可以从上次收到的序号继续接收
+"""
+
+import time
+from collections import deque
+from typing import Any
+
+
+class ReplayBuffer:
+    """
+    单个会话的重放缓冲，只在事件循环线程中使用
+
+    按消息数、总大小和保留时间三者限制，超出任一上限时淘汰最早的消息
+    """
+
+    def __init__(self, max_messages: int, max_bytes: int, ttl: float):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # (序号, 写入时间, 消息, 大小)
+        self._items: deque[tuple[int, float, dict[str, Any], int]] = deque()
+        self._bytes = 0
+        self.last_sequence = 0
+        # 已淘汰消息中的最大序号，客户端收到的序号小于它时无法完整重放
+        self.evicted_through = 0
+
+        # 统计计数
+        self.evicted = 0
+        self.replayed = 0
+
+    def _trim(self):
+        expire_before = time.monotonic() - self.ttl
+        while self._items and (
+            len(self._items) > self.max_messages
+            or self._bytes > self.max_bytes
+            or self._items[0][1] < expire_before
+        ):
+            sequence, _, _, size = self._items.popleft()
+            self._bytes -= size
+            self.evicted_through = max(self.evicted_through, sequence)
+            self.evicted += 1
+
+    def append(self, sequence: int, message: dict[str, Any], size: int):
+        """记录一条已分配序号的消息"""
+        if self.last_sequence == 0:
+            # 缓冲建立前的消息（会话清理前推送的）无法重放，与已淘汰的消息同样处理
+            self.evicted_through = max(self.evicted_through, sequence - 1)
+        self._items.append((sequence, time.monotonic(), message, size))
+        self._bytes += size
+        self.last_sequence = max(self.last_sequence, sequence)
+        self._trim()
+
+    def since(self, last_sequence: int) -> tuple[list[dict[str, Any]], bool]:
+        """
+        序号大于 last_sequence 的消息
+
+        Returns:
+            (按序号排列的消息, 是否完整)，中间有消息已被淘汰时不完整，客户端需要重新加载对话；
+            缓冲在会话清理后重建时，早于重建的消息和超过缓冲最大序号的 last_sequence 同样不完整
+        """
+        self._trim()
+        messages = [item[2] for item in self._items if item[0] > last_sequence]
+        self.replayed += len(messages)
+        complete = self.evicted_through <= last_sequence <= self.last_sequence
+        return messages, complete
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓冲统计信息"""
+        return {
+            "messages": len(self._items),
+            "bytes": self._bytes,
+            "last_sequence": self.last_sequence,
+            "evicted": self.evicted,
+            "replayed": self.replayed,
+        }
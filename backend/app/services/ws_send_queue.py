@@ -0,0 +1,166 @@
+"""
+WebSocket发送队列
+每个连接一个有界队列，按消息数和编码后的字节数限制，客户端消费过慢时按策略丢弃、合并或断开
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Literal
+
+from app.services.event_bridge import LOW_VALUE_EVENT_TYPES
+
+SendQueueOverflowPolicy = Literal["drop_oldest", "coalesce", "disconnect"]
+
+# 可以丢弃的低优先级消息类型，agent_event 只有低价值事件可以丢弃
+LOW_PRIORITY_MESSAGE_TYPES = frozenset({"status_update", "heartbeat"})
+
+
+def is_low_priority(message: dict[str, Any]) -> bool:
+    """消息在队列满时是否可以丢弃"""
+    message_type = message.get("type")
+    if message_type in LOW_PRIORITY_MESSAGE_TYPES:
+        return True
+    return (
+        message_type == "agent_event"
+        and message.get("event_type") in LOW_VALUE_EVENT_TYPES
+    )
+
+
+class SlowConsumerError(Exception):
+    """客户端消费过慢，发送队列无法容纳新消息"""
+
+
+class BoundedSendQueue:
+    """
+    有界发送队列，只在事件循环线程中使用
+
+    队列中保存消息及其编码后的数据（文本帧按字符数计算大小），消息数或字节数超过上限时按 policy 处理：
+      drop_oldest 丢弃最早的低优先级消息，新消息本身是低优先级且没有可丢弃的消息时丢弃新消息
+      coalesce    新消息是status_update时先移除队列中的status_update，否则按 drop_oldest 处理
+      disconnect  直接断开
+    没有可丢弃的消息时抛出 SlowConsumerError，由调用方断开连接，保证内存有上限
+    """
+
+    def __init__(
+        self,
+        max_messages: int,
+        max_bytes: int,
+        policy: SendQueueOverflowPolicy = "coalesce",
+    ):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+
+        self._items: deque[tuple[dict[str, Any], bytes | str]] = deque()
+        self._bytes = 0
+        self._not_empty = asyncio.Event()
+
+        # 统计计数
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_watermark = 0
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    def _is_full(self, incoming_size: int) -> bool:
+        return (
+            len(self._items) >= self.max_messages
+            or self._bytes + incoming_size > self.max_bytes
+        )
+
+    def _remove(self, index: int):
+        _, data = self._items[index]
+        del self._items[index]
+        self._bytes -= len(data)
+
+    def _remove_oldest_low_priority(self) -> bool:
+        for index, (message, _) in enumerate(self._items):
+            if is_low_priority(message):
+                self._remove(index)
+                return True
+        return False
+
+    def _coalesce_status_updates(self) -> bool:
+        indexes = [
+            index
+            for index, (message, _) in enumerate(self._items)
+            if message.get("type") == "status_update"
+        ]
+        for index in reversed(indexes):
+            self._remove(index)
+        self.coalesced += len(indexes)
+        return bool(indexes)
+
+    def put_nowait(self, message: dict[str, Any], data: bytes | str) -> bool:
+        """
+        写入消息，返回消息是否入队
+
+        Raises:
+            SlowConsumerError: 队列已满且无法腾出空间
+        """
+        size = len(data)
+        if self._is_full(size):
+            if self.policy == "disconnect":
+                raise SlowConsumerError("发送队列已满")
+            if self.policy == "coalesce" and message.get("type") == "status_update":
+                self._coalesce_status_updates()
+            while self._is_full(size) and self._remove_oldest_low_priority():
+                self.dropped += 1
+            if self._is_full(size):
+                if is_low_priority(message):
+                    self.dropped += 1
+                    return False
+                raise SlowConsumerError("发送队列已满且没有可丢弃的消息")
+
+        self._items.append((message, data))
+        self._bytes += size
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, len(self._items))
+        self._not_empty.set()
+        return True
+
+    def get_nowait(self) -> tuple[dict[str, Any], bytes | str]:
+        """取出最早的消息及其编码后的数据"""
+        message, data = self._items.popleft()
+        self._bytes -= len(data)
+        if not self._items:
+            self._not_empty.clear()
+        return message, data
+
+    def drain(self) -> list[tuple[dict[str, Any], bytes | str]]:
+        """取出队列中的全部消息"""
+        items = list(self._items)
+        self._items.clear()
+        self._bytes = 0
+        self._not_empty.clear()
+        return items
+
+    async def get(self) -> tuple[dict[str, Any], bytes | str]:
+        """等待并取出最早的消息"""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取队列统计信息"""
+        return {
+            "depth": len(self._items),
+            "bytes": self._bytes,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "high_watermark": self.high_watermark,
+        }
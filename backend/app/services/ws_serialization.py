@@ -0,0 +1,227 @@
+"""
+WebSocket消息编码
+客户端在握手时通过子协议选择编码：二进制的MessagePack/CBOR，或JSON
+
+MessagePack、CBOR和orjson都是可选依赖，未安装时对应编码不可用，JSON退回标准库实现
+"""
+
+import json
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class MessageDecodeError(ValueError):
+    """客户端消息无法解码"""
+
+
+class WebSocketSerializer:
+    """
+    WebSocket消息编码器
+
+    - subprotocol 为握手时协商的子协议名
+    - binary 为True时以二进制帧发送，否则以文本帧发送
+    - dumps_batch 把已编码的消息直接拼成 event_batch 帧，不再重新编码每条消息
+    """
+
+    name = ""
+    subprotocol = ""
+    binary = False
+
+    def dumps(self, message: dict[str, Any]) -> bytes | str:
+        raise NotImplementedError
+
+    def dumps_batch(self, parts: list[bytes | str]) -> bytes | str:
+        """把已编码的消息合并为 {"type": "event_batch", "count": N, "events": [...]}"""
+        raise NotImplementedError
+
+    def loads(self, data: bytes | str) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+class JsonSerializer(WebSocketSerializer):
+    """JSON文本帧，安装了orjson时使用orjson编码"""
+
+    name = "json"
+    subprotocol = "alma.json"
+    binary = False
+
+    def __init__(self):
+        if orjson is not None:
+            self._dumps = self._orjson_dumps
+        else:
+            self._dumps = self._stdlib_dumps
+
+    @staticmethod
+    def _orjson_dumps(message: dict[str, Any]) -> str:
+        try:
+            return orjson.dumps(
+                message, default=str, option=orjson.OPT_NON_STR_KEYS
+            ).decode()
+        except TypeError:
+            # orjson不支持超过64位的整数等少数情况，退回标准库
+            return json.dumps(message, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _stdlib_dumps(message: dict[str, Any]) -> str:
+        return json.dumps(message, ensure_ascii=False, default=str)
+
+    def dumps(self, message: dict[str, Any]) -> str:
+        return self._dumps(message)
+
+    def dumps_batch(self, parts: list[bytes | str]) -> str:
+        return (
+            f'{{"type":"event_batch","count":{len(parts)},"events":['
+            + ",".join(parts)
+            + "]}"
+        )
+
+    def loads(self, data: bytes | str) -> dict[str, Any]:
+        try:
+            if orjson is not None:
+                return orjson.loads(data)
+            return json.loads(data)
+        except ValueError as e:
+            raise MessageDecodeError("无效的JSON格式") from e
+
+
+class MsgpackSerializer(WebSocketSerializer):
+    """MessagePack二进制帧"""
+
+    name = "msgpack"
+    subprotocol = "alma.msgpack"
+    binary = True
+
+    def dumps(self, message: dict[str, Any]) -> bytes:
+        return msgpack.packb(message, default=str, use_bin_type=True)
+
+    def dumps_batch(self, parts: list[bytes | str]) -> bytes:
+        packer = msgpack.Packer(use_bin_type=True)
+        header = (
+            packer.pack_map_header(3)
+            + packer.pack("type")
+            + packer.pack("event_batch")
+            + packer.pack("count")
+            + packer.pack(len(parts))
+            + packer.pack("events")
+            + packer.pack_array_header(len(parts))
+        )
+        return header + b"".join(parts)
+
+    def loads(self, data: bytes | str) -> dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise MessageDecodeError("无效的MessagePack数据") from e
+
+
+class CborSerializer(WebSocketSerializer):
+    """CBOR二进制帧"""
+
+    name = "cbor"
+    subprotocol = "alma.cbor"
+    binary = True
+
+    @staticmethod
+    def _default(encoder: Any, value: Any):
+        encoder.encode(str(value))
+
+    def dumps(self, message: dict[str, Any]) -> bytes:
+        # 应用中的无时区时间由 datetime.now() 产生，按本地时区编码
+        return cbor2.dumps(
+            message, default=self._default, timezone=datetime.now().astimezone().tzinfo
+        )
+
+    @staticmethod
+    def _array_header(length: int) -> bytes:
+        """CBOR定长数组（主类型4）的头部"""
+        if length < 24:
+            return bytes([0x80 | length])
+        for additional, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+            if length < 1 << (size * 8):
+                return bytes([0x80 | additional]) + length.to_bytes(size, "big")
+        raise ValueError("CBOR数组过长")
+
+    def dumps_batch(self, parts: list[bytes | str]) -> bytes:
+        header = (
+            b"\xa3"
+            + cbor2.dumps("type")
+            + cbor2.dumps("event_batch")
+            + cbor2.dumps("count")
+            + cbor2.dumps(len(parts))
+            + cbor2.dumps("events")
+            + self._array_header(len(parts))
+        )
+        return header + b"".join(parts)
+
+    def loads(self, data: bytes | str) -> dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            return cbor2.loads(data)
+        except Exception as e:
+            raise MessageDecodeError("无效的CBOR数据") from e
+
+
+# 可用的编码器，依赖未安装的二进制编码不注册
+_FACTORIES: list[tuple[Any, Callable[[], WebSocketSerializer]]] = [
+    (msgpack, MsgpackSerializer),
+    (cbor2, CborSerializer),
+]
+
+# 全局编码器实例，按子协议名索引
+json_serializer = JsonSerializer()
+serializers: dict[str, WebSocketSerializer] = {
+    json_serializer.subprotocol: json_serializer
+}
+for module, factory in _FACTORIES:
+    if module is not None:
+        serializer = factory()
+        serializers[serializer.subprotocol] = serializer
+
+
+def select_serializer(
+    requested: list[str],
+) -> tuple[WebSocketSerializer, str | None]:
+    """
+    按客户端提供的子协议顺序选择第一个可用的编码
+
+    Returns:
+        (编码器, 握手时回复的子协议)，客户端未提供可用子协议时使用JSON且不回复子协议
+    """
+    for subprotocol in requested:
+        serializer = serializers.get(subprotocol)
+        if serializer is None:
+            continue
+        if serializer.binary and not settings.WS_BINARY_ENCODINGS_ENABLED:
+            continue
+        return serializer, subprotocol
+    return json_serializer, None
+
+
+def get_available_encodings() -> list[str]:
+    """当前可用的子协议"""
+    return [
+        subprotocol
+        for subprotocol, serializer in serializers.items()
+        if not serializer.binary or settings.WS_BINARY_ENCODINGS_ENABLED
+    ]
@@ -0,0 +1 @@
+"""后端性能基准测试，不属于应用代码，也不随应用打包"""
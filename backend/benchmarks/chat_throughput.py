@@ -0,0 +1,491 @@
+"""
+对话吞吐基准测试
+
+用AutoAgent替身代替真实智能体，在同一进程中启动FastAPI应用（使用配置中的Postgres），
+按指定并发驱动 POST /api/v1/chat/ 和 /api/v1/ws/ws/{session_id}，
+输出延迟分位数、每秒请求数、每秒事件数和每个会话占用的内存
+
+每个会话占用的内存由本进程常驻内存的增量除以新增会话数得到，本进程同时运行压测客户端，
+客户端的连接、缓冲和统计数据也计入其中，该指标偏大，只适合与相同参数的基线对比
+
+    python -m benchmarks.chat_throughput --mode both --concurrency 16 --requests 200
+    python -m benchmarks.chat_throughput --scenario default --save-baseline
+
+基线保存在 benchmarks/baselines/{scenario}.json，存在基线时自动对比，
+指标劣化超过容差时以非零状态码退出
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from benchmarks import fake_autoagent
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# 对比基线的指标，值为True表示越大越好
+COMPARED_METRICS = {
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "requests_per_sec": True,
+    "events_per_sec": True,
+    "memory_per_session_kb": False,
+}
+
+BENCHMARK_AGENT_NAME = "BenchmarkAgent"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def current_rss_kb() -> float:
+    """当前进程的常驻内存（KB），不支持/proc时退回峰值内存"""
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class BenchmarkServer:
+    """在后台线程中运行的uvicorn服务，与压测客户端使用不同的事件循环"""
+
+    def __init__(self, host: str, port: int):
+        import uvicorn
+
+        from app.main import app
+
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host=host, port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(
+            target=self.server.run, name="benchmark-server", daemon=True
+        )
+
+    def start(self, timeout: float = 60.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("基准测试服务启动失败")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+def prepare_database() -> tuple[uuid.UUID, uuid.UUID]:
+    """确保超级用户和基准测试用的系统智能体存在，返回 (用户ID, 智能体ID)"""
+    from sqlmodel import Session, select
+
+    from app.core.config import settings
+    from app.db.repository import create_agent, get_user_by_email
+    from app.db.session import engine
+    from app.models import Agent
+    from app.schemas import AgentCreate
+
+    with Session(engine) as session:
+        user = get_user_by_email(session=session, email=settings.FIRST_SUPERUSER)
+        if user is None:
+            raise RuntimeError(
+                "超级用户不存在，请先运行 scripts/prestart.sh 初始化数据库"
+            )
+        agent = session.exec(
+            select(Agent)
+            .where(Agent.name == BENCHMARK_AGENT_NAME)
+            .where(Agent.is_system_agent)
+        ).first()
+        if agent is None:
+            agent = create_agent(
+                session=session,
+                agent_create=AgentCreate(
+                    name=BENCHMARK_AGENT_NAME,
+                    instruction="基准测试使用的智能体",
+                    is_system_agent=True,
+                ),
+                user_id=user.user_id,
+            )
+        return user.user_id, agent.agent_id
+
+
+async def login(client: Any) -> str:
+    from app.core.config import settings
+
+    response = await client.post(
+        "/api/v1/login/access-token",
+        data={
+            "username": settings.FIRST_SUPERUSER,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        },
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+class RunStats:
+    """单个场景的原始测量值"""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.first_event_latencies: list[float] = []
+        self.errors: dict[str, int] = {}
+        self.frames = 0
+
+    def error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+async def run_http(
+    base_url: str,
+    agent_id: uuid.UUID,
+    concurrency: int,
+    total: int,
+    timeout: float,
+    stats: RunStats,
+):
+    """并发调用 POST /api/v1/chat/，每个请求新建一个对话"""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        token = await login(client)
+        headers = {"Authorization": f"Bearer {token}"}
+        counter = iter(range(total))
+
+        async def worker():
+            for index in counter:
+                started_at = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/api/v1/chat/",
+                        headers=headers,
+                        json={
+                            "message": f"benchmark {index}",
+                            "agent_id": str(agent_id),
+                        },
+                    )
+                except httpx.HTTPError as e:
+                    stats.error(type(e).__name__)
+                    continue
+                if response.status_code != 200:
+                    stats.error(f"http_{response.status_code}")
+                    continue
+                stats.latencies.append(time.perf_counter() - started_at)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+async def run_websocket(
+    ws_url: str,
+    user_id: uuid.UUID,
+    agent_id: uuid.UUID,
+    concurrency: int,
+    total: int,
+    timeout: float,
+    stats: RunStats,
+    batch: bool = False,
+):
+    """并发通过WebSocket发送对话，每个对话使用独立的连接和会话"""
+    import websockets
+
+    counter = iter(range(total))
+    run_id = uuid.uuid4().hex[:8]
+
+    async def chat_once(index: int):
+        session_id = f"bench-{run_id}-{index}"
+        async with websockets.connect(
+            f"{ws_url}/api/v1/ws/ws/{session_id}?batch={str(batch).lower()}",
+            max_size=None,
+        ) as websocket:
+            # 等待连接确认
+            while (
+                json.loads(await websocket.recv()).get("type") != "connection_success"
+            ):
+                pass
+            started_at = time.perf_counter()
+            first_event_at = None
+            await websocket.send(
+                json.dumps(
+                    {
+                        "type": "chat",
+                        "message": f"benchmark {index}",
+                        "agent_id": str(agent_id),
+                        "user_id": str(user_id),
+                    }
+                )
+            )
+            finished = False
+            while not finished:
+                frame = json.loads(await websocket.recv())
+                stats.frames += 1
+                messages = [frame]
+                if frame.get("type") == "event_batch":
+                    messages = frame["events"]
+                for message in messages:
+                    message_type = message.get("type")
+                    if first_event_at is None and message_type == "agent_event":
+                        first_event_at = time.perf_counter()
+                    if message_type == "chat_complete":
+                        finished = True
+                    elif message_type in ("chat_error", "chat_cancelled", "error"):
+                        stats.error(message_type)
+                        return
+            finished_at = time.perf_counter()
+            stats.latencies.append(finished_at - started_at)
+            if first_event_at is not None:
+                stats.first_event_latencies.append(first_event_at - started_at)
+
+    async def worker():
+        for index in counter:
+            try:
+                await asyncio.wait_for(chat_once(index), timeout)
+            except asyncio.TimeoutError:
+                stats.error("timeout")
+            except Exception as e:
+                stats.error(type(e).__name__)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+def summarize(
+    stats: RunStats,
+    elapsed: float,
+    events: int,
+    sessions: int,
+    rss_delta_kb: float,
+) -> dict[str, Any]:
+    """把原始测量值汇总为报告指标"""
+    latencies_ms = [value * 1000 for value in stats.latencies]
+    completed = len(latencies_ms)
+    result = {
+        "completed": completed,
+        "errors": dict(stats.errors),
+        "elapsed_sec": round(elapsed, 3),
+        "requests_per_sec": round(completed / elapsed, 2) if elapsed else 0.0,
+        "events_per_sec": round(events / elapsed, 1) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies_ms, 0.50), 1),
+        "latency_p95_ms": round(percentile(latencies_ms, 0.95), 1),
+        "latency_p99_ms": round(percentile(latencies_ms, 0.99), 1),
+        "latency_mean_ms": round(statistics.fmean(latencies_ms), 1)
+        if latencies_ms
+        else 0.0,
+        "sessions": sessions,
+        "memory_per_session_kb": round(rss_delta_kb / sessions, 1) if sessions else 0.0,
+    }
+    if stats.first_event_latencies:
+        first_ms = [value * 1000 for value in stats.first_event_latencies]
+        result["first_event_p50_ms"] = round(percentile(first_ms, 0.50), 1)
+        result["first_event_p95_ms"] = round(percentile(first_ms, 0.95), 1)
+    if stats.frames:
+        result["frames_per_sec"] = round(stats.frames / elapsed, 1)
+    return result
+
+
+async def run_mode(
+    mode: str,
+    args: argparse.Namespace,
+    user_id: uuid.UUID,
+    agent_id: uuid.UUID,
+) -> dict[str, Any]:
+    from app.services.agent_service import agent_dialogue_service
+
+    base_url = f"http://{args.host}:{args.port}"
+    stats = RunStats()
+
+    sessions_before = len(agent_dialogue_service.instance_pool)
+    rss_before = current_rss_kb()
+    events_before = fake_autoagent.get_counters()["events"]
+    started_at = time.perf_counter()
+
+    if mode == "http":
+        await run_http(
+            base_url, agent_id, args.concurrency, args.requests, args.timeout, stats
+        )
+    else:
+        await run_websocket(
+            f"ws://{args.host}:{args.port}",
+            user_id,
+            agent_id,
+            args.concurrency,
+            args.requests,
+            args.timeout,
+            stats,
+            batch=args.ws_batch,
+        )
+
+    elapsed = time.perf_counter() - started_at
+    events = fake_autoagent.get_counters()["events"] - events_before
+    sessions = len(agent_dialogue_service.instance_pool) - sessions_before
+    return summarize(stats, elapsed, events, sessions, current_rss_kb() - rss_before)
+
+
+def compare_with_baseline(
+    results: dict[str, dict[str, Any]], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """返回劣化超过容差的指标说明"""
+    regressions = []
+    for mode, metrics in results.items():
+        baseline_metrics = baseline.get("results", {}).get(mode)
+        if not baseline_metrics:
+            continue
+        for name, higher_is_better in COMPARED_METRICS.items():
+            current = metrics.get(name)
+            previous = baseline_metrics.get(name)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(
+                    f"{mode}.{name}: {previous} -> {current} ({change:+.1%})"
+                )
+    return regressions
+
+
+def print_report(results: dict[str, dict[str, Any]], baseline: dict[str, Any] | None):
+    for mode, metrics in results.items():
+        print(f"\n[{mode}]")
+        previous = (baseline or {}).get("results", {}).get(mode, {})
+        for name, value in metrics.items():
+            line = f"  {name:<24}{value}"
+            if name in previous and isinstance(value, int | float) and previous[name]:
+                line += f"  (基线 {previous[name]}, {value / previous[name] - 1:+.1%})"
+            print(line)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="对话吞吐基准测试")
+    parser.add_argument("--mode", choices=("http", "ws", "both"), default="both")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=100, help="每种模式的请求总数")
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="单个请求的超时（秒）"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=200.0, help="替身单次运行耗时"
+    )
+    parser.add_argument(
+        "--tool-calls", type=int, default=6, help="替身单次运行的工具调用次数"
+    )
+    parser.add_argument(
+        "--tool-output-chars",
+        type=int,
+        default=2000,
+        help="替身每次工具调用的结果字符数",
+    )
+    parser.add_argument("--output-chars", type=int, default=2000, help="替身回复字符数")
+    parser.add_argument("--init-latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--ws-batch", action="store_true", help="WebSocket连接开启批量推送"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", default="default", help="基线名称")
+    parser.add_argument("--save-baseline", action="store_true", help="保存为新基线")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="允许的指标劣化比例"
+    )
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    profile = fake_autoagent.FakeAgentProfile(
+        latency_ms=args.latency_ms,
+        tool_calls=args.tool_calls,
+        tool_output_chars=args.tool_output_chars,
+        output_chars=args.output_chars,
+        init_latency_ms=args.init_latency_ms,
+    )
+    # 替身必须在导入app之前安装
+    fake_autoagent.install(profile)
+
+    user_id, agent_id = prepare_database()
+    server = BenchmarkServer(args.host, args.port)
+    server.start()
+
+    modes = ["http", "ws"] if args.mode == "both" else [args.mode]
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        for mode in modes:
+            results[mode] = asyncio.run(run_mode(mode, args, user_id, agent_id))
+    finally:
+        server.stop()
+
+    report = {
+        "scenario": args.scenario,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "ws_batch": args.ws_batch,
+            "profile": vars(profile),
+        },
+        "results": results,
+        "notes": {
+            "memory_per_session_kb": "进程常驻内存增量/新增会话数，含同进程压测客户端的内存",
+        },
+    }
+
+    baseline_path = BASELINE_DIR / f"{args.scenario}.json"
+    baseline = None
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        if baseline.get("config") != report["config"]:
+            print(
+                f"基线 {baseline_path.name} 的压测参数不同，不做对比", file=sys.stderr
+            )
+            baseline = None
+
+    print_report(results, baseline)
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        baseline_path.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"\n已保存基线: {baseline_path}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n相对基线劣化超过容差的指标:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
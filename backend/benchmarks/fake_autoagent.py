@@ -0,0 +1,178 @@
+"""
+基准测试用的AutoAgent替身
+按配置的延迟、工具调用次数和输出大小模拟一次智能体运行，不调用大模型，用于单独测量后端自身的开销；
+产生的事件与AutoAgent相同：每轮 ai_thinking_start、tool_call_start、tool_call_complete，
+最后是完整的 ai_response，AutoAgent不产生增量文本事件
+
+install() 需要在导入 app 之前调用，把替身注册为 autoagent.api 模块
+"""
+
+import itertools
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+
+@dataclass
+class FakeAgentProfile:
+    """替身的运行参数"""
+
+    # 一次process_query的总耗时（毫秒），平均分摊到各轮模型调用之间
+    latency_ms: float = 200.0
+    # 每次运行的工具调用次数，每次调用前有一轮模型调用
+    tool_calls: int = 6
+    # 每次工具调用返回结果的字符数
+    tool_output_chars: int = 2000
+    # 最终回复的字符数
+    output_chars: int = 2000
+    # 实例初始化耗时（毫秒）
+    init_latency_ms: float = 50.0
+
+
+# 全局替身参数，install时设置
+profile = FakeAgentProfile()
+
+_counter_lock = threading.Lock()
+_events_emitted = 0
+_queries_processed = 0
+_instances_created = itertools.count(1)
+
+
+def get_counters() -> dict[str, int]:
+    """替身累计产生的事件数和处理的请求数"""
+    with _counter_lock:
+        return {"events": _events_emitted, "queries": _queries_processed}
+
+
+class AgentEvent:
+    """与autoagent.api.AgentEvent相同的事件结构"""
+
+    def __init__(self, event_type: str, data: dict[str, Any]):
+        self.event_type = event_type
+        self.data = data
+        self.timestamp = datetime.now().isoformat()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "event_type": self.event_type,
+            "timestamp": self.timestamp,
+            "data": self.data,
+        }
+
+
+class FakeAutoAgentAPI:
+    """实现后端用到的AutoAgentAPI接口"""
+
+    agent_name = "BenchmarkAgent"
+
+    def __init__(
+        self,
+        container_name: str | None = None,
+        port: int | None = None,
+        local_env: bool = True,
+        **_kwargs: Any,
+    ):
+        self.container_name = container_name
+        self.port = port
+        self.local_env = local_env
+        self.instance_id = next(_instances_created)
+        self.messages: list[dict[str, Any]] = []
+        self.context_variables: dict[str, Any] = {}
+        self._callbacks: list = []
+
+    def add_event_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def _emit(self, event_type: str, data: dict[str, Any]):
+        global _events_emitted
+        with _counter_lock:
+            _events_emitted += 1
+        event = AgentEvent(event_type, data)
+        for callback in self._callbacks:
+            callback(event)
+
+    def initialize(self):
+        time.sleep(profile.init_latency_ms / 1000)
+        self._emit("initialization_complete", {"available_agents": [self.agent_name]})
+
+    def process_query(self, query: str) -> dict[str, Any]:
+        global _queries_processed
+        self._emit("query_start", {"query": query[:200]})
+
+        tool_calls = max(profile.tool_calls, 0)
+        # 每次工具调用前一轮模型调用，最后一轮生成回复
+        interval = profile.latency_ms / 1000 / (tool_calls + 1)
+        tool_output = ("r" * profile.tool_output_chars)[: profile.tool_output_chars]
+        output = ("基准" * (profile.output_chars // 2 + 1))[: profile.output_chars]
+
+        for turn in range(1, tool_calls + 1):
+            self._emit(
+                "ai_thinking_start", {"agent_name": self.agent_name, "turn": turn}
+            )
+            time.sleep(interval)
+            tool_name = f"benchmark_tool_{turn % 3}"
+            self._emit(
+                "tool_call_start",
+                {
+                    "agent_name": self.agent_name,
+                    "tool_name": tool_name,
+                    "arguments": {"query": query[:50], "turn": turn},
+                },
+            )
+            self._emit(
+                "tool_call_complete",
+                {
+                    "agent_name": self.agent_name,
+                    "tool_name": tool_name,
+                    "result": tool_output,
+                },
+            )
+
+        self._emit(
+            "ai_thinking_start",
+            {"agent_name": self.agent_name, "turn": tool_calls + 1},
+        )
+        time.sleep(interval)
+        self._emit("ai_response", {"agent_name": self.agent_name, "content": output})
+        self._emit("query_complete", {"agent_name": self.agent_name})
+
+        self.messages.append({"role": "user", "content": query})
+        self.messages.append({"role": "assistant", "content": output})
+        with _counter_lock:
+            _queries_processed += 1
+        return {
+            "success": True,
+            "result": output,
+            "agent_name": self.agent_name,
+            "messages": self.messages,
+            "context_variables": self.context_variables,
+        }
+
+    def get_available_agents(self) -> list[str]:
+        return [self.agent_name]
+
+    def reset_session(self):
+        self.messages = []
+        self.context_variables = {}
+
+
+def install(new_profile: FakeAgentProfile | None = None):
+    """把替身注册为autoagent.api模块，需在导入app之前调用"""
+    global profile
+    if new_profile is not None:
+        profile = new_profile
+    if "app.services.agent_service" in sys.modules:
+        raise RuntimeError("需要在导入app.services.agent_service之前安装AutoAgent替身")
+
+    package = types.ModuleType("autoagent")
+    package.__path__ = []
+    module = types.ModuleType("autoagent.api")
+    module.AutoAgentAPI = FakeAutoAgentAPI
+    module.AgentEvent = AgentEvent
+    package.api = module
+    sys.modules["autoagent"] = package
+    sys.modules["autoagent.api"] = module
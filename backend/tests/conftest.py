@@ -0,0 +1,24 @@
+"""
+测试公共配置
+服务模块在导入时读取配置并引用AutoAgent，这里在导入 app 之前补齐必填配置，
+并安装基准测试使用的AutoAgent替身，单元测试不启动真实的智能体
+"""
+
+import os
+
+for name, value in {
+    "PROJECT_NAME": "alma-test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "postgres",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "changethis",
+}.items():
+    os.environ.setdefault(name, value)
+
+from benchmarks import fake_autoagent  # noqa: E402
+
+fake_autoagent.install(
+    fake_autoagent.FakeAgentProfile(
+        latency_ms=0, tool_calls=1, tool_output_chars=10, init_latency_ms=0
+    )
+)
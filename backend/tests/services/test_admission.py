@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    TokenBucket,
+)
+from app.services.cancellation import DEADLINE_EXCEEDED
+
+
+def make_controller(**overrides) -> AdmissionController:
+    options = {
+        "max_concurrent": 1,
+        "max_queue": 10,
+        "queue_timeout": 5.0,
+        "user_rate": 0,
+        "user_burst": 1,
+        "provider_rate": 0,
+        "provider_burst": 1,
+    }
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event, **kwargs):
+    async with controller.admit("holder", **kwargs):
+        await release.wait()
+
+
+def test_token_bucket_refills_over_time() -> None:
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated_at
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == 0
+    bucket.refund()
+    bucket.refund()
+    assert bucket.is_full(now + 0.1)
+
+
+def test_user_bucket_rejects_after_burst() -> None:
+    controller = make_controller(max_concurrent=10, user_rate=60, user_burst=2)
+
+    async def main():
+        for _ in range(2):
+            async with controller.admit("alice"):
+                pass
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("alice"):
+                pass
+        # 其他用户不受影响
+        async with controller.admit("bob"):
+            pass
+        return exc_info.value
+
+    error = asyncio.run(main())
+    assert error.reason == "user_rate_limited"
+    assert error.retry_after > 0
+
+
+def test_provider_bucket_is_shared_by_users() -> None:
+    controller = make_controller(max_concurrent=10, provider_rate=60, provider_burst=1)
+
+    async def main():
+        async with controller.admit("alice", provider="openai"):
+            pass
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("bob", provider="openai"):
+                pass
+        async with controller.admit("bob", provider="anthropic"):
+            pass
+        return exc_info.value
+
+    assert asyncio.run(main()).reason == "provider_rate_limited"
+
+
+def test_queue_full_rejects_without_taking_a_token() -> None:
+    controller = make_controller(max_queue=0, user_rate=60, user_burst=5)
+
+    async def main():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("alice"):
+                pass
+        release.set()
+        await holder
+        return exc_info.value
+
+    assert asyncio.run(main()).reason == "queue_full"
+    # 只有占用名额的请求扣减过令牌
+    assert controller.get_stats()["user_buckets"] == 1
+
+
+def test_queue_timeout_refunds_tokens() -> None:
+    controller = make_controller(queue_timeout=0.05, user_rate=60, user_burst=5)
+
+    async def main():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("alice"):
+                pass
+        release.set()
+        await holder
+        return exc_info.value
+
+    assert asyncio.run(main()).reason == "queue_timeout"
+    assert controller._user_buckets["alice"].tokens == pytest.approx(5, abs=0.01)
+    assert controller.get_stats()["queued"] == 0
+
+
+def test_expired_deadline_is_rejected_before_queueing() -> None:
+    controller = make_controller()
+
+    async def main():
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("alice", queue_timeout=0):
+                pass
+        return exc_info.value
+
+    assert asyncio.run(main()).reason == DEADLINE_EXCEEDED
+    assert controller.get_stats()["rejected_deadline"] == 1
+
+
+def test_deadline_reached_while_queued() -> None:
+    controller = make_controller(queue_timeout=5.0)
+
+    async def main():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with controller.admit("alice", queue_timeout=0.05):
+                pass
+        release.set()
+        await holder
+        return exc_info.value
+
+    assert asyncio.run(main()).reason == DEADLINE_EXCEEDED
+
+
+def run_queue(controller: AdmissionController, requests: list[tuple]) -> list[str]:
+    """占满名额后依次排队，释放后返回获得名额的顺序"""
+    order: list[str] = []
+
+    async def request(name: str, user_id: str, weight: float):
+        async with controller.admit(user_id, weight=weight):
+            order.append(name)
+
+    async def main():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        tasks = []
+        for name, user_id, weight in requests:
+            tasks.append(asyncio.create_task(request(name, user_id, weight)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+
+    asyncio.run(main())
+    return order
+
+
+def test_fair_queue_interleaves_users() -> None:
+    order = run_queue(
+        make_controller(),
+        [
+            ("a1", "alice", 1.0),
+            ("a2", "alice", 1.0),
+            ("a3", "alice", 1.0),
+            ("b1", "bob", 1.0),
+        ],
+    )
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_fair_queue_gives_heavier_users_a_larger_share() -> None:
+    order = run_queue(
+        make_controller(),
+        [
+            ("a1", "alice", 1.0),
+            ("a2", "alice", 1.0),
+            ("s1", "admin", 2.0),
+            ("s2", "admin", 2.0),
+        ],
+    )
+    assert order == ["s1", "a1", "s2", "a2"]
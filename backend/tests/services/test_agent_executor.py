@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.agent_executor import AgentExecutor, AgentExecutorBusyError
+
+
+def test_run_returns_result_from_worker_thread() -> None:
+    executor = AgentExecutor(max_workers=2, max_concurrent_per_user=2, max_queue_size=4)
+
+    async def main():
+        return await executor.run(threading.current_thread)
+
+    try:
+        thread = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert thread.name.startswith("autoagent")
+    assert executor.get_stats()["completed"] == 1
+
+
+def test_per_user_semaphore_limits_concurrency() -> None:
+    executor = AgentExecutor(max_workers=4, max_concurrent_per_user=1, max_queue_size=8)
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+    release = threading.Event()
+
+    def work():
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        release.wait(5)
+        with lock:
+            running["now"] -= 1
+
+    async def main():
+        tasks = [
+            asyncio.create_task(executor.run(work, user_id="alice")) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        # 同一用户只有一个任务在运行，其余在等待
+        assert executor.get_stats()["queue_depth"] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert running["peak"] == 1
+    assert executor.get_stats()["active_users"] == 0
+
+
+def test_global_semaphore_limits_concurrency_across_users() -> None:
+    executor = AgentExecutor(max_workers=1, max_concurrent_per_user=4, max_queue_size=8)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(executor.run(release.wait, 5, user_id="alice"))
+        second = asyncio.create_task(executor.run(release.wait, 5, user_id="bob"))
+        await asyncio.sleep(0.05)
+        stats = executor.get_stats()
+        assert stats["running"] == 1
+        assert stats["queue_depth"] == 1
+        release.set()
+        await asyncio.gather(first, second)
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert executor.get_stats()["completed"] == 2
+
+
+def test_rejects_when_queue_is_full() -> None:
+    executor = AgentExecutor(max_workers=1, max_concurrent_per_user=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(AgentExecutorBusyError):
+            await executor.run(release.wait, 5)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert executor.get_stats()["rejected"] == 1
+
+
+def test_cancelled_waiter_frees_its_queue_slot() -> None:
+    executor = AgentExecutor(max_workers=1, max_concurrent_per_user=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert executor.get_stats()["queue_depth"] == 0
+        release.set()
+        await running
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_failed_task_is_counted_and_raised() -> None:
+    executor = AgentExecutor(max_workers=1, max_concurrent_per_user=1, max_queue_size=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(executor.run(fail))
+    finally:
+        executor.shutdown()
+    assert executor.get_stats()["failed"] == 1
@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import context_builder as context_builder_module
+from app.services.context_builder import (
+    ContextBuilder,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+
+CONVERSATION_ID = uuid.uuid4()
+AGENT = SimpleNamespace(name="助手", instruction="回答问题", team=None)
+
+
+def make_history(count: int, chars: int = 40) -> list[SimpleNamespace]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            message_id=uuid.uuid4(),
+            conversation_id=CONVERSATION_ID,
+            role="user" if index % 2 == 0 else "assistant",
+            content=f"m{index} " + "x" * chars,
+            timestamp=start + timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def stored_summary(monkeypatch) -> list:
+    """替换数据库中的对话摘要，列表中放入一项即为已有摘要"""
+    summaries: list = []
+    monkeypatch.setattr(
+        context_builder_module,
+        "get_conversation_summary",
+        lambda session, conversation_id: summaries[0] if summaries else None,
+    )
+    return summaries
+
+
+def test_estimate_tokens_counts_cjk_per_character() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好") == 2
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_truncate_to_tokens_respects_budget() -> None:
+    text = "x" * 400
+    truncated = truncate_to_tokens(text, 10)
+    assert truncated.endswith("…")
+    assert estimate_tokens(truncated) <= 10
+    assert truncate_to_tokens("short", 10) == "short"
+
+
+@pytest.mark.usefixtures("stored_summary")
+def test_all_history_fits_within_budget() -> None:
+    builder = ContextBuilder(
+        token_budget=4000, summary_token_budget=200, summary_line_chars=50
+    )
+    history = make_history(4)
+    query, update = builder.compose(None, AGENT, "hello", history)
+    assert update is None
+    assert "更早的对话摘要" not in query
+    assert all(message.content in query for message in history)
+
+
+@pytest.mark.usefixtures("stored_summary")
+def test_older_messages_fold_into_summary_within_budget() -> None:
+    builder = ContextBuilder(
+        token_budget=200, summary_token_budget=40, summary_line_chars=10
+    )
+    history = make_history(20)
+    query, update = builder.compose(None, AGENT, "hello", history)
+
+    assert estimate_tokens(query) <= 200
+    # 最新的消息完整保留，最早的消息只出现在摘要中
+    assert history[-1].content in query
+    assert history[0].content not in query
+    assert update is not None
+    assert estimate_tokens(update.summary) <= 40
+    assert update.conversation_id == CONVERSATION_ID
+    folded = update.summarized_count
+    assert update.summarized_message_id == history[folded - 1].message_id
+
+
+def test_summarized_messages_are_not_folded_again(stored_summary) -> None:
+    builder = ContextBuilder(
+        token_budget=200, summary_token_budget=40, summary_line_chars=10
+    )
+    history = make_history(20)
+    _, first = builder.compose(None, AGENT, "hello", history)
+    stored_summary.append(
+        SimpleNamespace(
+            summary=first.summary,
+            summarized_until=first.summarized_until,
+            summarized_count=first.summarized_count,
+            summarized_message_id=first.summarized_message_id,
+        )
+    )
+
+    # 没有新消息滑出窗口时不产生摘要更新
+    query, second = builder.compose(None, AGENT, "hello", history)
+    assert second is None
+    assert first.summary in query
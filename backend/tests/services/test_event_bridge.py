@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+
+from app.services.event_bridge import AgentEventBridge
+
+
+@dataclass
+class Event:
+    event_type: str
+    name: str = ""
+
+
+def run_bridge(policy: str, events: list[Event], max_size: int = 2) -> tuple:
+    """在消费协程启动前写入事件，再取出全部已缓冲的事件"""
+    delivered: list[str] = []
+
+    async def consumer(event: Event):
+        delivered.append(event.name or event.event_type)
+
+    async def main():
+        bridge = AgentEventBridge(
+            asyncio.get_running_loop(), consumer, max_size=max_size, policy=policy
+        )
+        accepted = [bridge.push(event) for event in events]
+        bridge.start()
+        await bridge.aclose()
+        return bridge, accepted
+
+    bridge, accepted = asyncio.run(main())
+    return bridge, accepted, delivered
+
+
+def test_drop_policy_drops_new_low_value_events() -> None:
+    bridge, accepted, delivered = run_bridge(
+        "drop",
+        [
+            Event("ai_response", "r1"),
+            Event("ai_response", "r2"),
+            Event("tool_call_start"),
+        ],
+    )
+    assert accepted == [True, True, False]
+    assert delivered == ["r1", "r2"]
+    assert bridge.get_stats()["dropped"] == 1
+
+
+def test_drop_policy_evicts_buffered_low_value_for_important_events() -> None:
+    bridge, accepted, delivered = run_bridge(
+        "drop",
+        [
+            Event("ai_thinking_start"),
+            Event("ai_response", "r1"),
+            Event("ai_response", "r2"),
+        ],
+    )
+    assert accepted == [True, True, True]
+    assert delivered == ["r1", "r2"]
+    assert bridge.get_stats()["dropped"] == 1
+
+
+def test_coalesce_policy_keeps_latest_event_of_a_type() -> None:
+    bridge, accepted, delivered = run_bridge(
+        "coalesce",
+        [
+            Event("ai_thinking_start", "t1"),
+            Event("tool_call_start", "s1"),
+            Event("ai_thinking_start", "t2"),
+        ],
+    )
+    assert accepted == [True, True, True]
+    assert delivered == ["s1", "t2"]
+    stats = bridge.get_stats()
+    assert stats["coalesced"] == 1
+    assert stats["dropped"] == 0
+
+
+def test_block_policy_waits_for_consumer_from_worker_thread() -> None:
+    delivered: list[str] = []
+    gate = asyncio.Event()
+
+    async def consumer(event: Event):
+        await gate.wait()
+        delivered.append(event.name)
+
+    async def main():
+        bridge = AgentEventBridge(
+            asyncio.get_running_loop(), consumer, max_size=1, policy="block"
+        )
+        bridge.start()
+
+        def produce():
+            for index in range(3):
+                bridge.push(Event("ai_thinking_start", f"t{index}"))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        await asyncio.sleep(0.1)
+        # 消费者卡住时生产者线程被阻塞，缓冲区不超过上限
+        assert producer.is_alive()
+        assert bridge.get_stats()["pending"] <= 1
+        gate.set()
+        await asyncio.to_thread(producer.join, 5)
+        await bridge.aclose()
+        return bridge
+
+    bridge = asyncio.run(main())
+    assert delivered == ["t0", "t1", "t2"]
+    assert bridge.get_stats()["blocked"] >= 1
+
+
+def test_push_after_close_is_rejected() -> None:
+    async def consumer(event: Event):
+        pass
+
+    async def main():
+        bridge = AgentEventBridge(asyncio.get_running_loop(), consumer, max_size=4)
+        bridge.start()
+        await bridge.aclose()
+        return bridge.push(Event("ai_response"))
+
+    assert asyncio.run(main()) is False
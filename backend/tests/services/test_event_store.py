@@ -0,0 +1,53 @@
+from app.services.event_store import SessionEventStore
+
+
+def test_ring_buffer_keeps_latest_events_and_full_counts() -> None:
+    store = SessionEventStore(capacity=3)
+    for index in range(5):
+        store.append("tool_call_start", index, {"tool_name": f"tool_{index % 2}"})
+
+    assert [record.timestamp for record in store.retained_events()] == [2, 3, 4]
+    stats = store.get_statistics()
+    assert stats["total_events"] == 5
+    assert stats["tool_calls"] == 5
+    assert stats["tools_used"] == {"tool_0", "tool_1"}
+    assert stats["retained_events"] == 3
+
+
+def test_byte_limit_evicts_oldest_but_keeps_newest() -> None:
+    store = SessionEventStore(capacity=100, max_bytes=25)
+    store.append("ai_response", 0, {"content": "a" * 10})
+    store.append("ai_response", 1, {"content": "b" * 10})
+    assert len(store.retained_events()) == 1
+
+    # 单条事件超出字节上限时仍然保留
+    store.append("ai_response", 2, {"content": "c" * 100})
+    assert [record.timestamp for record in store.retained_events()] == [2]
+
+
+def test_turn_summary_only_counts_current_turn() -> None:
+    store = SessionEventStore(capacity=10)
+    store.append("query_start", 0, {})
+    store.append("query_error", 1, {})
+    store.start_turn()
+    store.append("query_start", 2, {})
+
+    summary = store.get_turn_summary()
+    assert summary["total_events"] == 1
+    assert summary["event_types"] == {"query_start": 1}
+    assert [record.timestamp for record in store.current_turn_events()] == [2]
+    assert store.get_statistics()["errors"] == 1
+
+
+def test_spilled_events_form_full_history_and_are_deleted_on_close(tmp_path) -> None:
+    spill_path = tmp_path / "events" / "session.jsonl"
+    store = SessionEventStore(capacity=2, spill_path=str(spill_path))
+    for index in range(4):
+        store.append("ai_response", index, {"content": str(index)})
+
+    history = list(store.iter_full_history())
+    assert [event["timestamp"] for event in history] == [0, 1, 2, 3]
+    assert store.get_statistics()["spilled_events"] == 2
+
+    store.close()
+    assert not spill_path.exists()
@@ -0,0 +1,110 @@
+import asyncio
+
+from app.services.instance_pool import AutoAgentInstancePool
+from app.services.warm_pool import WarmInstancePool
+
+
+def make_pool(max_instances: int = 2, idle_ttl: float = 60) -> tuple:
+    pool = AutoAgentInstancePool(
+        max_instances=max_instances, idle_ttl=idle_ttl, reap_interval=60
+    )
+    evicted: list[tuple[str, str]] = []
+    pool.add_evict_callback(
+        lambda entry, reason: evicted.append((entry.session_id, reason))
+    )
+    return pool, evicted
+
+
+def test_get_counts_hits_and_misses() -> None:
+    pool, _ = make_pool()
+    pool.put("a", api=object(), event_handler=None)
+    assert pool.get("a") is not None
+    assert pool.get("b") is None
+    stats = pool.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_evicts_least_recently_used_idle_instance() -> None:
+    pool, evicted = make_pool(max_instances=2)
+    pool.put("a", api=object(), event_handler=None)
+    pool.put("b", api=object(), event_handler=None)
+    pool.get("a")
+    pool.put("c", api=object(), event_handler=None)
+    assert evicted == [("b", "lru")]
+    assert pool.session_ids() == ["a", "c"]
+
+
+def test_in_use_instances_are_not_evicted() -> None:
+    pool, evicted = make_pool(max_instances=1)
+    pool.put("a", api=object(), event_handler=None)
+    pool.acquire("a")
+    pool.put("b", api=object(), event_handler=None)
+    assert evicted == []
+    assert len(pool) == 2
+
+    pool.release("a")
+    pool.put("c", api=object(), event_handler=None)
+    assert [session_id for session_id, _ in evicted] == ["a", "b"]
+
+
+def test_reap_expired_removes_idle_instances() -> None:
+    pool, evicted = make_pool(idle_ttl=0)
+    pool.put("a", api=object(), event_handler=None)
+    pool.put("b", api=object(), event_handler=None)
+    pool.acquire("b")
+    assert pool.reap_expired() == ["a"]
+    assert evicted == [("a", "idle")]
+    assert "b" in pool
+
+
+def test_detach_skips_evict_callbacks() -> None:
+    pool, evicted = make_pool()
+    pool.put("a", api=object(), event_handler=None)
+    assert pool.detach("a") is not None
+    assert evicted == []
+    assert pool.get_stats()["detached"] == 1
+
+
+def test_warm_pool_refills_to_target_size() -> None:
+    created = iter(range(100))
+
+    async def main():
+        pool = WarmInstancePool(lambda: (next(created),), target_size=2)
+        assert await pool.wait_until_ready(2, timeout=5)
+        first = pool.take()
+        assert await pool.wait_until_ready(2, timeout=5)
+        await pool.stop()
+        return pool, first
+
+    pool, first = asyncio.run(main())
+    assert first == (0,)
+    stats = pool.get_stats()
+    assert stats["warm_hits"] == 1
+    assert stats["created"] == 3
+
+
+def test_warm_pool_take_when_empty_is_a_cold_miss() -> None:
+    async def main():
+        pool = WarmInstancePool(lambda: ("instance",), target_size=0)
+        return pool, pool.take()
+
+    pool, instance = asyncio.run(main())
+    assert instance is None
+    assert pool.get_stats()["cold_misses"] == 1
+
+
+def test_warm_pool_stop_discards_unused_instances() -> None:
+    discarded: list[tuple] = []
+
+    async def main():
+        pool = WarmInstancePool(
+            lambda: ("instance",), target_size=2, on_discard=discarded.append
+        )
+        await pool.start(block=True, min_size=2, timeout=5)
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(main())
+    assert len(pool) == 0
+    assert discarded == [("instance",), ("instance",)]
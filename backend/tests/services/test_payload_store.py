@@ -0,0 +1,31 @@
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.services.payload_store import OffloadedPayloadStore
+
+
+@pytest.fixture
+def oversized(monkeypatch) -> dict:
+    monkeypatch.setattr(settings, "WS_OVERSIZED_FIELD_POLICY", "offload")
+    return {"result": "x" * (settings.WS_EVENT_FIELD_MAX_CHARS + 10)}
+
+
+def test_offloaded_payload_is_only_visible_to_its_owner(oversized) -> None:
+    store = OffloadedPayloadStore(max_chars=10**6, ttl=60)
+    owner = uuid.uuid4()
+    data = store.limit_event_data("session", oversized, str(owner))
+
+    payload_id = data["offloaded_fields"]["result"]["payload_id"]
+    assert len(data["result"]) <= settings.WS_EVENT_FIELD_MAX_CHARS
+    assert store.get(payload_id, owner)["value"] == oversized["result"]
+    assert store.get(payload_id, uuid.uuid4()) is None
+
+
+def test_unauthenticated_connections_only_truncate(oversized) -> None:
+    store = OffloadedPayloadStore(max_chars=10**6, ttl=60)
+    data = store.limit_event_data("session", oversized, None)
+    assert "offloaded_fields" not in data
+    assert "result" in data["truncated_fields"]
+    assert store.get_stats()["offloaded"] == 0
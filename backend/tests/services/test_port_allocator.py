@@ -0,0 +1,80 @@
+import pytest
+
+from app.services import port_allocator
+from app.services.port_allocator import (
+    PortExhaustedError,
+    PortLeaseManager,
+    claim_worker_slot,
+    resolve_worker_port_range,
+    split_port_range,
+)
+
+
+def test_split_port_range_gives_remainder_to_last_slot() -> None:
+    assert split_port_range(9000, 9009, 0, 3) == (9000, 9002)
+    assert split_port_range(9000, 9009, 1, 3) == (9003, 9005)
+    assert split_port_range(9000, 9009, 2, 3) == (9006, 9009)
+
+
+def test_split_port_range_rejects_too_many_slots() -> None:
+    with pytest.raises(ValueError):
+        split_port_range(9000, 9001, 0, 3)
+
+
+@pytest.mark.skipif(port_allocator.fcntl is None, reason="需要fcntl文件锁")
+def test_flock_slices_are_exclusive(tmp_path) -> None:
+    held = []
+    try:
+        for expected in range(3):
+            assert claim_worker_slot(9000, 9029, 3, str(tmp_path)) == expected
+            # 持有锁文件，模拟仍在运行的工作进程
+            held.append(port_allocator._slot_lock_file)
+        assert claim_worker_slot(9000, 9029, 3, str(tmp_path)) is None
+
+        # 工作进程退出后其分段可以被重新占用
+        held.pop(1).close()
+        assert claim_worker_slot(9000, 9029, 3, str(tmp_path)) == 1
+        held.append(port_allocator._slot_lock_file)
+    finally:
+        for lock_file in held:
+            lock_file.close()
+
+
+def test_resolve_worker_port_range_uses_configured_index(tmp_path) -> None:
+    assert resolve_worker_port_range(9000, 9029, 3, 2, str(tmp_path)) == (
+        9020,
+        9029,
+        2,
+    )
+    assert resolve_worker_port_range(9000, 9029, 1, None, str(tmp_path)) == (
+        9000,
+        9029,
+        None,
+    )
+    # 序号超出分段数时退回整个范围
+    assert resolve_worker_port_range(9000, 9029, 3, 5, str(tmp_path)) == (
+        9000,
+        9029,
+        None,
+    )
+
+
+def test_lease_reuses_released_ports() -> None:
+    manager = PortLeaseManager(9000, 9001, check_available=False)
+    first = manager.lease("a")
+    second = manager.lease("b")
+    with pytest.raises(PortExhaustedError):
+        manager.lease("c")
+
+    manager.release(first)
+    assert manager.lease("c") == first
+    assert manager.get_owner(first) == "c"
+    assert manager.get_owner(second) == "b"
+    assert manager.get_stats()["reused"] == 1
+
+
+def test_reassign_changes_owner() -> None:
+    manager = PortLeaseManager(9000, 9000, check_available=False)
+    port = manager.lease("warm-1")
+    manager.reassign(port, "session-1")
+    assert manager.get_owner(port) == "session-1"
@@ -0,0 +1,59 @@
+import uuid
+from types import SimpleNamespace
+
+from app.services.response_cache import ResponseCache, normalize_query
+
+
+def make_agent(**overrides) -> SimpleNamespace:
+    fields = {
+        "agent_id": uuid.uuid4(),
+        "name": "助手",
+        "instruction": "回答问题",
+        "team": None,
+    }
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_normalize_query_collapses_whitespace() -> None:
+    assert normalize_query("  hello \n  world ") == "hello world"
+
+
+def test_key_ignores_whitespace_but_tracks_instruction_and_model() -> None:
+    agent = make_agent()
+    key = ResponseCache.make_key(agent, "hello  world")
+    assert ResponseCache.make_key(agent, " hello world ") == key
+
+    changed = make_agent(agent_id=agent.agent_id, instruction="换一种说法")
+    assert ResponseCache.make_key(changed, "hello world") != key
+
+    model = SimpleNamespace(model_id=uuid.uuid4())
+    assert ResponseCache.make_key(agent, "hello world", model) != key
+
+
+def test_get_returns_copies() -> None:
+    cache = ResponseCache(max_entries=4, ttl=60)
+    cache.put("key", {"result": {"content": "hi"}})
+    cached = cache.get("key")
+    cached["result"]["content"] = "changed"
+    assert cache.get("key") == {"result": {"content": "hi"}}
+
+
+def test_evicts_least_recently_used_entry() -> None:
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.put("a", {"value": 1})
+    cache.put("b", {"value": 2})
+    cache.get("a")
+    cache.put("c", {"value": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"value": 1}
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses() -> None:
+    cache = ResponseCache(max_entries=2, ttl=-1)
+    cache.put("a", {"value": 1})
+    assert cache.get("a") is None
+    stats = cache.get_stats()
+    assert stats["expirations"] == 1
+    assert stats["size"] == 0
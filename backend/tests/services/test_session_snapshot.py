@@ -0,0 +1,60 @@
+import zlib
+from types import SimpleNamespace
+
+from app.services.session_snapshot import (
+    dump_snapshot,
+    load_snapshot,
+    restore_snapshot,
+)
+from app.services.session_store import InMemorySessionStateStore
+from benchmarks.fake_autoagent import FakeAutoAgentAPI
+
+
+def test_snapshot_round_trip_restores_instance_state() -> None:
+    messages = [
+        {"role": "user", "content": "你好"},
+        {"role": "assistant", "content": "hi"},
+    ]
+    context_variables = {"user": "alice", "opaque": object()}
+    snapshot = load_snapshot(dump_snapshot(messages, context_variables))
+
+    assert snapshot["messages"] == messages
+    # 无法序列化的值转为字符串保存
+    assert isinstance(snapshot["context_variables"]["opaque"], str)
+
+    api = FakeAutoAgentAPI()
+    assert restore_snapshot(api, snapshot)
+    assert api.messages == messages
+    assert api.context_variables["user"] == "alice"
+
+
+def test_corrupt_or_outdated_snapshots_are_ignored() -> None:
+    assert load_snapshot(b"not a snapshot") is None
+    assert load_snapshot(zlib.compress(b'{"version": 0}')) is None
+
+
+def test_restore_without_known_attributes_reports_failure() -> None:
+    assert not restore_snapshot(SimpleNamespace(), {"messages": []})
+
+
+def test_store_keeps_snapshots_until_discarded() -> None:
+    store = InMemorySessionStateStore("worker", sequence_block_size=10)
+    data = dump_snapshot([{"role": "user", "content": "hi"}], {})
+    store.save_snapshot("session", data)
+    assert load_snapshot(store.load_snapshot("session"))["messages"][0]["content"] == (
+        "hi"
+    )
+
+    store.discard("session")
+    assert store.load_snapshot("session") is None
+
+
+def test_store_evicts_snapshots_over_size_limit() -> None:
+    store = InMemorySessionStateStore(
+        "worker", sequence_block_size=10, snapshot_max_bytes=10
+    )
+    store.save_snapshot("first", b"x" * 8)
+    store.save_snapshot("second", b"y" * 8)
+    assert store.load_snapshot("first") is None
+    assert store.load_snapshot("second") == b"y" * 8
+    assert store.get_stats()["snapshots_expired"] == 1
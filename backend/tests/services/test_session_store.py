@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.session_store import InMemorySessionStateStore
+
+
+class BlockingInMemoryStore(InMemorySessionStateStore):
+    """按阻塞存储的方式在存储线程中访问的进程内存储"""
+
+    blocking = True
+
+
+def test_sequences_are_allocated_in_blocks() -> None:
+    store = InMemorySessionStateStore("worker", sequence_block_size=3)
+    assert [store.next_sequence("session") for _ in range(5)] == [1, 2, 3, 4, 5]
+    assert store.get("session")["event_sequence"] == 6
+    assert store.get_stats()["sequence_blocks_allocated"] == 2
+
+
+def test_discard_keeps_sequence_counter() -> None:
+    store = InMemorySessionStateStore("worker", sequence_block_size=10)
+    store.bind("session", port=9000)
+    store.update_events_summary("session", {"total_events": 3})
+    last = max(store.next_sequence("session") for _ in range(3))
+
+    store.discard("session")
+    state = store.get("session")
+    assert state["worker_id"] is None
+    assert state["events_summary"] is None
+    assert store.next_sequence("session") > last
+
+
+def test_release_drops_sessions_without_sequences() -> None:
+    store = InMemorySessionStateStore("worker", sequence_block_size=10)
+    store.bind("idle")
+    store.release("idle")
+    assert store.get("idle") is None
+
+    store.bind("active")
+    store.next_sequence("active")
+    store.release("active")
+    assert store.get("active")["worker_id"] is None
+
+
+def test_blocking_store_allocates_in_order_off_the_event_loop() -> None:
+    store = BlockingInMemoryStore("worker", sequence_block_size=2)
+
+    async def main():
+        return await asyncio.gather(
+            *(store.next_sequence_async("session") for _ in range(7))
+        )
+
+    assert sorted(asyncio.run(main())) == list(range(1, 8))
+
+
+def test_submit_records_write_failures() -> None:
+    store = InMemorySessionStateStore("worker", sequence_block_size=10)
+
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    store.submit(fail)
+    assert store.get_stats()["write_failures"] == 1
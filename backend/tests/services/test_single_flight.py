@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.services.agent_service import agent_dialogue_service
+from app.services.single_flight import SingleFlight, message_digest
+
+
+def test_message_digest_ignores_surrounding_whitespace() -> None:
+    assert message_digest(" hello \n") == message_digest("hello")
+    assert message_digest("hello") != message_digest("hello!")
+
+
+def test_concurrent_calls_with_same_key_run_once() -> None:
+    calls = 0
+
+    async def work(value):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return value
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            *(flight.run("key", work, index) for index in range(3))
+        )
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert calls == 1
+    assert results == [(0, False), (0, True), (0, True)]
+    assert flight.get_stats() == {"in_flight": 0, "leaders": 1, "coalesced": 2}
+
+
+def test_finished_key_runs_again() -> None:
+    async def work():
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        await flight.run("key", work)
+        await flight.run("key", work)
+        return flight
+
+    assert asyncio.run(main()).leaders == 2
+
+
+def test_cancelled_follower_does_not_cancel_shared_task() -> None:
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == ("done", False)
+
+
+def test_errors_are_shared_by_all_callers() -> None:
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(
+            flight.run("key", fail), flight.run("key", fail), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        ("session", "user", "other-agent", "hello"),
+        ("session", "other-user", "agent", "hello"),
+        ("session", "user", "agent", "different"),
+    ],
+)
+def test_coalesced_turn_key_includes_user_agent_and_message(other) -> None:
+    calls = 0
+
+    async def turn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return calls
+
+    async def main():
+        return await asyncio.gather(
+            agent_dialogue_service.run_coalesced_turn(
+                "session", "user", "agent", "hello", turn
+            ),
+            agent_dialogue_service.run_coalesced_turn(*other, turn),
+        )
+
+    results = asyncio.run(main())
+    assert calls == 2
+    assert [shared for _, shared in results] == [False, False]
+
+
+def test_coalesced_turn_merges_identical_turns() -> None:
+    async def turn():
+        await asyncio.sleep(0.02)
+        return "reply"
+
+    async def main():
+        return await asyncio.gather(
+            agent_dialogue_service.run_coalesced_turn(
+                "session", "user", "agent", "hello", turn
+            ),
+            agent_dialogue_service.run_coalesced_turn(
+                "session", "user", "agent", " hello ", turn
+            ),
+        )
+
+    assert asyncio.run(main()) == [("reply", False), ("reply", True)]
@@ -0,0 +1,92 @@
+import inspect
+
+from app.services.tool_cache import (
+    ToolCachePolicy,
+    ToolResultCache,
+    canonicalize_arguments,
+)
+
+
+def make_cache(**overrides) -> ToolResultCache:
+    options = {
+        "max_entries": 4,
+        "default_ttl": 60,
+        "max_result_bytes": 1024,
+        "refresh_interval": 60,
+    }
+    options.update(overrides)
+    return ToolResultCache(**options)
+
+
+def search(query: str, limit: int = 10, context_variables: dict | None = None):
+    return {"query": query, "limit": limit, "has_context": bool(context_variables)}
+
+
+def test_canonical_arguments_ignore_spelling_and_context() -> None:
+    signature = inspect.signature(search)
+    expected = canonicalize_arguments(("hi",), {}, signature)
+    assert canonicalize_arguments((), {"query": "hi", "limit": 10}, signature) == (
+        expected
+    )
+    assert (
+        canonicalize_arguments(("hi",), {"context_variables": {"a": 1}}, signature)
+        == expected
+    )
+    assert canonicalize_arguments(('{"b": 1, "a": 2}',), {}) == (
+        canonicalize_arguments(('{"a": 2, "b": 1}',), {})
+    )
+
+
+def test_wrapped_tool_uses_cache_only_when_policy_enabled() -> None:
+    cache = make_cache()
+    calls = []
+
+    def tool(query: str):
+        calls.append(query)
+        return {"answer": query}
+
+    wrapped = cache.wrap("lookup", tool)
+    wrapped("a")
+    wrapped("a")
+    assert calls == ["a", "a"]
+
+    cache.set_policies({"lookup": ToolCachePolicy(version=1, ttl=60)})
+    assert wrapped("a") == {"answer": "a"}
+    assert wrapped("a") == {"answer": "a"}
+    assert calls == ["a", "a", "a"]
+    assert cache.get_stats()["tools"]["lookup"] == {
+        "hits": 1,
+        "misses": 1,
+        "hit_ratio": 0.5,
+    }
+
+
+def test_version_change_invalidates_results() -> None:
+    cache = make_cache()
+    calls = []
+    wrapped = cache.wrap("lookup", lambda query: calls.append(query) or query)
+
+    cache.set_policies({"lookup": ToolCachePolicy(version=1, ttl=60)})
+    wrapped("a")
+    cache.set_policies({"lookup": ToolCachePolicy(version=2, ttl=60)})
+    wrapped("a")
+    assert calls == ["a", "a"]
+
+
+def test_uncacheable_and_oversized_results_are_skipped() -> None:
+    cache = make_cache(max_result_bytes=16)
+    cache.put("object", object(), ttl=60)
+    cache.put("large", "x" * 100, ttl=60)
+    assert cache.get_stats()["skipped"] == 2
+    assert cache.get("large", "lookup") == (False, None)
+
+
+def test_expired_results_are_misses() -> None:
+    cache = make_cache()
+    cache.put("key", "value", ttl=-1)
+    assert cache.get("key", "lookup") == (False, None)
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_install_without_registry_wraps_nothing() -> None:
+    assert make_cache().install() == 0
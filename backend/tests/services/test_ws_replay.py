@@ -0,0 +1,155 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app.api.v1.endpoints import websocket_chat
+from app.api.v1.endpoints.websocket_chat import WebSocketConnectionManager
+from app.services.ws_replay import ReplayBuffer
+
+
+class FakeWebSocket:
+    """记录服务端发送的消息，代替真实的WebSocket连接"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.client = None
+        self.sent: list[dict] = []
+        self.closed = False
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes):
+        raise AssertionError("JSON连接不应发送二进制帧")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+
+
+@pytest.fixture
+def manager(monkeypatch) -> WebSocketConnectionManager:
+    """独立的连接管理器，会话清理也使用它"""
+    manager = WebSocketConnectionManager()
+    monkeypatch.setattr(websocket_chat, "manager", manager)
+    return manager
+
+
+async def wait_for_messages(websocket: FakeWebSocket, count: int):
+    for _ in range(100):
+        if len(websocket.sent) >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"只收到 {len(websocket.sent)} 条消息")
+
+
+def sequences(messages: list[dict]) -> list[int]:
+    return [message["sequence"] for message in messages]
+
+
+def test_buffer_replays_messages_after_last_sequence() -> None:
+    buffer = ReplayBuffer(max_messages=10, max_bytes=1000, ttl=60)
+    for sequence in range(1, 4):
+        buffer.append(sequence, {"sequence": sequence}, 10)
+    messages, complete = buffer.since(1)
+    assert sequences(messages) == [2, 3]
+    assert complete
+
+
+def test_buffer_reports_incomplete_after_eviction() -> None:
+    buffer = ReplayBuffer(max_messages=2, max_bytes=1000, ttl=60)
+    for sequence in range(1, 5):
+        buffer.append(sequence, {"sequence": sequence}, 10)
+    messages, complete = buffer.since(1)
+    assert sequences(messages) == [3, 4]
+    assert not complete
+    assert buffer.since(2)[1]
+
+
+def test_buffer_limits_bytes_and_age() -> None:
+    buffer = ReplayBuffer(max_messages=10, max_bytes=25, ttl=60)
+    for sequence in range(1, 4):
+        buffer.append(sequence, {"sequence": sequence}, 10)
+    assert buffer.get_stats()["messages"] == 2
+
+    expired = ReplayBuffer(max_messages=10, max_bytes=1000, ttl=-1)
+    expired.append(1, {"sequence": 1}, 10)
+    assert expired.since(0) == ([], False)
+
+
+def test_buffer_rejects_sequences_it_has_not_seen() -> None:
+    buffer = ReplayBuffer(max_messages=10, max_bytes=1000, ttl=60)
+    assert buffer.since(0) == ([], True)
+    assert buffer.since(5) == ([], False)
+
+    # 会话清理后重建的缓冲无法补发重建之前的消息
+    buffer.append(11, {"sequence": 11}, 10)
+    assert not buffer.since(5)[1]
+    assert buffer.since(10) == ([{"sequence": 11}], True)
+
+
+def test_resume_replays_messages_sent_while_disconnected(manager) -> None:
+    session_id = f"resume-{uuid.uuid4()}"
+
+    async def main():
+        first = FakeWebSocket()
+        await manager.connect(first, session_id)
+        await manager.send_message(session_id, {"type": "agent_event", "n": 1})
+        await wait_for_messages(first, 1)
+        manager.disconnect(session_id, first)
+
+        # 断开期间的消息只写入重放缓冲
+        await manager.send_message(session_id, {"type": "agent_event", "n": 2})
+        await manager.send_message(session_id, {"type": "agent_event", "n": 3})
+
+        second = FakeWebSocket()
+        await manager.connect(second, session_id)
+        result = await manager.resume(session_id, first.sent[-1]["sequence"])
+        await wait_for_messages(second, 2)
+        manager.disconnect(session_id, second)
+        await websocket_chat.teardown_session(session_id)
+        return first, second, result
+
+    first, second, result = asyncio.run(main())
+    assert result["replayed"] == 2
+    assert result["complete"]
+    assert [message["n"] for message in second.sent] == [2, 3]
+    assert sequences(first.sent + second.sent) == sorted(
+        set(sequences(first.sent + second.sent))
+    )
+
+
+def test_resume_after_teardown_is_incomplete_and_sequences_keep_growing(
+    manager,
+) -> None:
+    session_id = f"teardown-{uuid.uuid4()}"
+
+    async def main():
+        first = FakeWebSocket()
+        await manager.connect(first, session_id)
+        for index in range(3):
+            await manager.send_message(session_id, {"type": "agent_event", "n": index})
+        await wait_for_messages(first, 3)
+        manager.disconnect(session_id, first)
+        # 宽限期结束，会话被清理
+        await websocket_chat.teardown_session(session_id)
+
+        second = FakeWebSocket()
+        await manager.connect(second, session_id)
+        last_sequence = first.sent[-1]["sequence"]
+        result = await manager.resume(session_id, last_sequence)
+        await manager.send_message(session_id, {"type": "agent_event", "n": 3})
+        await wait_for_messages(second, 1)
+        manager.disconnect(session_id, second)
+        await websocket_chat.teardown_session(session_id)
+        return last_sequence, result, second
+
+    last_sequence, result, second = asyncio.run(main())
+    assert not result["complete"]
+    assert result["replayed"] == 0
+    # 新消息的序号大于客户端已收到的序号，不会被客户端当作重复消息丢弃
+    assert second.sent[0]["sequence"] > last_sequence
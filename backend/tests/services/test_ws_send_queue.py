@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.services.ws_send_queue import BoundedSendQueue, SlowConsumerError
+
+STATUS = {"type": "status_update"}
+THINKING = {"type": "agent_event", "event_type": "ai_thinking_start"}
+RESPONSE = {"type": "agent_event", "event_type": "ai_response"}
+
+
+def test_drop_oldest_drops_low_priority_messages_first() -> None:
+    queue = BoundedSendQueue(max_messages=2, max_bytes=1000, policy="drop_oldest")
+    queue.put_nowait(THINKING, "t")
+    queue.put_nowait(RESPONSE, "r1")
+    assert queue.put_nowait(RESPONSE, "r2")
+    assert [data for _, data in queue.drain()] == ["r1", "r2"]
+    assert queue.get_stats()["dropped"] == 1
+
+
+def test_low_priority_message_is_dropped_when_nothing_can_be_evicted() -> None:
+    queue = BoundedSendQueue(max_messages=1, max_bytes=1000, policy="drop_oldest")
+    queue.put_nowait(RESPONSE, "r1")
+    assert not queue.put_nowait(STATUS, "s")
+    assert queue.qsize() == 1
+
+
+def test_coalesce_keeps_only_latest_status_update() -> None:
+    queue = BoundedSendQueue(max_messages=3, max_bytes=1000, policy="coalesce")
+    queue.put_nowait(STATUS, "s1")
+    queue.put_nowait(RESPONSE, "r1")
+    queue.put_nowait(STATUS, "s2")
+    assert queue.put_nowait(STATUS, "s3")
+    assert [data for _, data in queue.drain()] == ["r1", "s3"]
+    assert queue.get_stats()["coalesced"] == 2
+
+
+def test_full_queue_of_important_messages_raises_slow_consumer() -> None:
+    queue = BoundedSendQueue(max_messages=1, max_bytes=1000, policy="coalesce")
+    queue.put_nowait(RESPONSE, "r1")
+    with pytest.raises(SlowConsumerError):
+        queue.put_nowait(RESPONSE, "r2")
+
+
+def test_disconnect_policy_raises_immediately() -> None:
+    queue = BoundedSendQueue(max_messages=1, max_bytes=1000, policy="disconnect")
+    queue.put_nowait(STATUS, "s1")
+    with pytest.raises(SlowConsumerError):
+        queue.put_nowait(STATUS, "s2")
+
+
+def test_byte_limit_counts_encoded_size() -> None:
+    queue = BoundedSendQueue(max_messages=10, max_bytes=10, policy="drop_oldest")
+    queue.put_nowait(THINKING, "x" * 6)
+    queue.put_nowait(RESPONSE, "y" * 6)
+    assert queue.queued_bytes == 6
+    assert [data for _, data in queue.drain()] == ["y" * 6]
+
+
+def test_get_waits_for_messages() -> None:
+    async def main():
+        queue = BoundedSendQueue(max_messages=2, max_bytes=1000)
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+        queue.put_nowait(RESPONSE, "r1")
+        return await asyncio.wait_for(getter, 1)
+
+    assert asyncio.run(main()) == (RESPONSE, "r1")
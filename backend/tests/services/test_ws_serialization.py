@@ -0,0 +1,105 @@
+import importlib.util
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+
+from app.api.v1.endpoints.websocket_chat import (
+    FRAME_FLAG_DEFLATE,
+    FRAME_FLAG_PLAIN,
+    WebSocketConnectionManager,
+)
+from app.core.config import settings
+from app.services.ws_serialization import (
+    CborSerializer,
+    JsonSerializer,
+    MessageDecodeError,
+    MsgpackSerializer,
+    json_serializer,
+    select_serializer,
+)
+
+MESSAGES = [
+    {"type": "event", "sequence": 1, "data": {"content": "你好"}},
+    {"type": "event", "sequence": 2, "data": {"items": [1, 2, 3]}},
+]
+
+
+BINARY_SERIALIZERS = [
+    pytest.param(
+        factory,
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec(module_name) is None,
+            reason=f"未安装{module_name}",
+        ),
+    )
+    for module_name, factory in (
+        ("msgpack", MsgpackSerializer),
+        ("cbor2", CborSerializer),
+    )
+]
+
+
+def test_json_round_trip_and_batch_frame() -> None:
+    serializer = JsonSerializer()
+    parts = [serializer.dumps(message) for message in MESSAGES]
+    assert [serializer.loads(part) for part in parts] == MESSAGES
+
+    batch = json.loads(serializer.dumps_batch(parts))
+    assert batch == {"type": "event_batch", "count": 2, "events": MESSAGES}
+
+
+def test_json_encodes_unsupported_values_as_strings() -> None:
+    timestamp = datetime(2024, 1, 1, 12, 0)
+    decoded = json_serializer.loads(json_serializer.dumps({"at": timestamp}))
+    assert decoded["at"].startswith("2024-01-01")
+
+
+def test_json_rejects_invalid_input() -> None:
+    with pytest.raises(MessageDecodeError):
+        json_serializer.loads("{not json")
+
+
+@pytest.mark.parametrize("factory", BINARY_SERIALIZERS)
+def test_binary_round_trip_and_batch_frame(factory) -> None:
+    serializer = factory()
+    parts = [serializer.dumps(message) for message in MESSAGES]
+    assert all(isinstance(part, bytes) for part in parts)
+    assert [serializer.loads(part) for part in parts] == MESSAGES
+    assert serializer.loads(serializer.dumps_batch(parts)) == {
+        "type": "event_batch",
+        "count": 2,
+        "events": MESSAGES,
+    }
+    with pytest.raises(MessageDecodeError):
+        serializer.loads(b"\xc1")
+
+
+def test_select_serializer_falls_back_to_json() -> None:
+    assert select_serializer([]) == (json_serializer, None)
+    assert select_serializer(["alma.unknown"]) == (json_serializer, None)
+    assert select_serializer(["alma.json"]) == (json_serializer, "alma.json")
+
+
+def test_binary_encodings_can_be_disabled(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "WS_BINARY_ENCODINGS_ENABLED", False)
+    assert select_serializer(["alma.msgpack", "alma.cbor"]) == (json_serializer, None)
+
+
+def test_small_frames_are_not_compressed(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "WS_COMPRESSION_THRESHOLD_BYTES", 1024)
+    frame = WebSocketConnectionManager._frame_for_compression
+    assert frame('{"type":"event"}', binary=False) == '{"type":"event"}'
+    # 二进制帧加上未压缩标志，客户端据首字节区分
+    assert frame(b"\x81\xa1a", binary=True) == FRAME_FLAG_PLAIN + b"\x81\xa1a"
+
+
+def test_large_frames_are_deflated_with_flag_byte(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "WS_COMPRESSION_THRESHOLD_BYTES", 64)
+    text = json.dumps({"content": "x" * 1000})
+    frame = WebSocketConnectionManager._frame_for_compression(text, binary=False)
+    assert isinstance(frame, bytes)
+    assert frame[:1] == FRAME_FLAG_DEFLATE
+    assert len(frame) < len(text)
+    assert zlib.decompress(frame[1:]).decode() == text
@@ -18,6 +18,7 @@ export type AgentPublic = {
   team?: Array<string> | null
   is_system_agent?: boolean
   status?: string
+  response_cache_enabled?: boolean
   agent_id: string
   model_id: string | null
   user_id: string | null